@@ -0,0 +1,40 @@
+"""
+Prompt history
+Revision ID: 0002_prompt_history
+Revises: 0001_assets
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_prompt_history"
+down_revision = "0001_assets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prompt_history",
+        sa.Column("seq", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("instance", sa.String(length=1024), nullable=False),
+        sa.Column("prompt_id", sa.String(length=255), nullable=False),
+        sa.Column("status", sa.String(length=32), nullable=True),
+        sa.Column("created_at", sa.BigInteger(), nullable=True),
+        sa.Column("completed_at", sa.BigInteger(), nullable=False),
+        sa.Column("entry", sa.JSON(), nullable=False),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("uq_prompt_history_instance_prompt_id", "prompt_history", ["instance", "prompt_id"], unique=True)
+    op.create_index("ix_prompt_history_instance_seq", "prompt_history", ["instance", "seq"])
+    op.create_index("ix_prompt_history_instance_completed_at", "prompt_history", ["instance", "completed_at"])
+    op.create_index("ix_prompt_history_instance_status_seq", "prompt_history", ["instance", "status", "seq"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prompt_history_instance_status_seq", table_name="prompt_history")
+    op.drop_index("ix_prompt_history_instance_completed_at", table_name="prompt_history")
+    op.drop_index("ix_prompt_history_instance_seq", table_name="prompt_history")
+    op.drop_index("uq_prompt_history_instance_prompt_id", table_name="prompt_history")
+    op.drop_table("prompt_history")
@@ -1,8 +1,10 @@
 from aiohttp import web
 from typing import Optional
-from folder_paths import folder_names_and_paths, get_directory_by_type
+from folder_paths import folder_names_and_paths, get_directory_by_type, set_base_directory
 from api_server.services.terminal_service import TerminalService
 import app.logger
+import hmac
+import logging
 import os
 
 class InternalRoutes:
@@ -70,6 +72,38 @@ class InternalRoutes:
             return web.json_response([entry.name for entry in sorted_files], status=200)
 
 
+        @self.routes.post('/platform/assign')
+        async def platform_assign(request: web.Request) -> web.Response:
+            """
+            Hand a pre-started (warm pool) instance over to a project by re-pointing
+            its working directories. Only enabled when launched with PLATFORM_WARM_POOL=1
+            and guarded by the PLATFORM_CALLBACK_SECRET shared with the platform.
+            """
+            if os.environ.get("PLATFORM_WARM_POOL") != "1":
+                return web.json_response({"error": "Not a pooled instance"}, status=404)
+            secret = os.environ.get("PLATFORM_CALLBACK_SECRET", "")
+            if not secret or not hmac.compare_digest(request.headers.get("X-Platform-Secret", ""), secret):
+                return web.json_response({"error": "Invalid secret"}, status=403)
+            try:
+                json_data = await request.json()
+            except ValueError:
+                return web.json_response({"error": "Invalid JSON"}, status=400)
+            base_directory = json_data.get("base_directory")
+            if not isinstance(base_directory, str) or not os.path.isabs(base_directory):
+                return web.json_response({"error": "base_directory must be an absolute path"}, status=400)
+
+            queue = self.prompt_server.prompt_queue
+            if queue is not None and queue.get_tasks_remaining() > 0:
+                return web.json_response({"error": "Instance is busy"}, status=409)
+
+            dirs = set_base_directory(base_directory)
+            project_id = json_data.get("project_id")
+            if project_id is not None:
+                os.environ["PLATFORM_PROJECT_ID"] = str(project_id)
+            os.environ["PLATFORM_WARM_POOL"] = "0"
+            logging.info(f"Instance assigned to project {project_id}: {base_directory}")
+            return web.json_response({"directories": dirs, "project_id": project_id})
+
     def get_app(self):
         if self._app is None:
             self._app = web.Application()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from typing import Any
+from sqlalchemy import JSON, BigInteger, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database.models import to_dict, Base
+
+
+class PromptHistory(Base):
+    __tablename__ = "prompt_history"
+
+    # Completion order; also the pagination cursor. Allocated by the database, so instances sharing it never collide,
+    # and never reused (AUTOINCREMENT on SQLite), so a deleted entry can't move a cursor backwards
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # The user directory of the instance that ran the prompt; instances sharing a database only see their own entries
+    instance: Mapped[str] = mapped_column(String(1024), nullable=False)
+    prompt_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    status: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    # Milliseconds since the epoch, like the create_time in a prompt's extra_data
+    created_at: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    completed_at: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    entry: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+
+    __table_args__ = (
+        Index("uq_prompt_history_instance_prompt_id", "instance", "prompt_id", unique=True),
+        Index("ix_prompt_history_instance_seq", "instance", "seq"),
+        Index("ix_prompt_history_instance_completed_at", "instance", "completed_at"),
+        Index("ix_prompt_history_instance_status_seq", "instance", "status", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+    def to_dict(self, include_none: bool = False) -> dict[str, Any]:
+        return to_dict(self, include_none=include_none)
+
+    def __repr__(self) -> str:
+        return f"<PromptHistory seq={self.seq} prompt_id={self.prompt_id} status={self.status}>"
@@ -0,0 +1,97 @@
+from typing import Any, Optional, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.history.models import PromptHistory
+
+
+def insert_entries(session: Session, instance: str, rows: Sequence[dict[str, Any]]) -> None:
+    """Insert history rows for instance; a prompt_id that is already stored is replaced by its new run."""
+    if not rows:
+        return
+    session.execute(
+        delete(PromptHistory)
+        .where(PromptHistory.instance == instance)
+        .where(PromptHistory.prompt_id.in_([r["prompt_id"] for r in rows]))
+    )
+    session.execute(sa.insert(PromptHistory), [{**r, "instance": instance} for r in rows])
+
+
+def get_seq(session: Session, instance: str, prompt_id: str) -> Optional[int]:
+    return session.execute(
+        select(PromptHistory.seq).where(PromptHistory.instance == instance, PromptHistory.prompt_id == prompt_id)
+    ).scalar()
+
+
+def get_entry(session: Session, instance: str, prompt_id: str) -> Optional[dict[str, Any]]:
+    return session.execute(
+        select(PromptHistory.entry).where(PromptHistory.instance == instance, PromptHistory.prompt_id == prompt_id)
+    ).scalar()
+
+
+def query_entries(
+    session: Session,
+    instance: str,
+    *,
+    limit: Optional[int] = None,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+    since_time: Optional[int] = None,
+    status: Optional[str] = None,
+) -> list[tuple[str, dict[str, Any]]]:
+    """
+    (prompt_id, entry) pairs in completion order. Without after_seq the newest `limit` matches are returned, otherwise
+    the first `limit` after it, so pollers can page forward from the last entry they saw.
+    """
+    stmt = select(PromptHistory.prompt_id, PromptHistory.entry).where(PromptHistory.instance == instance)
+    if after_seq is not None:
+        stmt = stmt.where(PromptHistory.seq > after_seq)
+    if before_seq is not None:
+        stmt = stmt.where(PromptHistory.seq < before_seq)
+    if since_time is not None:
+        stmt = stmt.where(PromptHistory.completed_at > since_time)
+    if status is not None:
+        stmt = stmt.where(PromptHistory.status == status)
+
+    newest_first = after_seq is None and limit is not None
+    stmt = stmt.order_by(PromptHistory.seq.desc() if newest_first else PromptHistory.seq.asc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    rows = [(r.prompt_id, r.entry) for r in session.execute(stmt)]
+    if newest_first:
+        rows.reverse()
+    return rows
+
+
+def delete_entries(session: Session, instance: str, prompt_ids: Optional[Sequence[str]]) -> None:
+    """Delete the given prompt_ids of instance, or all of its entries if None."""
+    stmt = delete(PromptHistory).where(PromptHistory.instance == instance)
+    if prompt_ids is not None:
+        stmt = stmt.where(PromptHistory.prompt_id.in_(list(prompt_ids)))
+    session.execute(stmt)
+
+
+def prune_entries(
+    session: Session, instance: str, *, max_items: Optional[int] = None, completed_before: Optional[int] = None
+) -> None:
+    """Delete the entries of instance beyond the newest max_items, and those completed before completed_before (ms)."""
+    if max_items is not None:
+        oldest_kept = session.execute(
+            select(PromptHistory.seq)
+            .where(PromptHistory.instance == instance)
+            .order_by(PromptHistory.seq.desc())
+            .offset(max_items - 1)
+            .limit(1)
+        ).scalar()
+        if oldest_kept is not None:
+            session.execute(
+                delete(PromptHistory).where(PromptHistory.instance == instance, PromptHistory.seq < oldest_kept)
+            )
+    if completed_before is not None:
+        session.execute(
+            delete(PromptHistory).where(
+                PromptHistory.instance == instance, PromptHistory.completed_at < completed_before
+            )
+        )
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import traceback
+from typing import Any, Callable, NamedTuple, Optional
+
+import folder_paths
+import nodes
+
+
+class ObjectInfo(NamedTuple):
+    body: bytes
+    etag: str
+    # Whether a model file list changed since the previous call (or this is the first one)
+    models_changed: bool
+
+
+class _Entry(NamedTuple):
+    node_class: type
+    # Serialized node_info, None if building it failed
+    json: Optional[str]
+    dependencies: frozenset
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _directory_state(directory: str) -> dict[str, Optional[float]]:
+    """Modification times of the directory and all its subdirectories."""
+    mtimes = {directory: _mtime(directory)}
+    for dirpath, subdirs, _ in os.walk(directory, followlinks=True):
+        for d in subdirs:
+            path = os.path.join(dirpath, d)
+            mtimes[path] = _mtime(path)
+    return mtimes
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ObjectInfoCache:
+    """
+    Keeps the /object_info response built.
+
+    Each node definition is serialized once, together with the folder_paths file lists and directories that were read
+    while building it. A definition is only rebuilt when one of those changes (file lists are checked through
+    folder_paths' own mtime validation, directories by the mtimes of their subdirectories) or its node class is
+    replaced. The full response, its gzip-compressed form and its ETag are kept until a definition changes.
+
+    Node classes that read files without going through folder_paths are not tracked; use invalidate() for those,
+    or --disable-object-info-cache.
+    """
+    def __init__(self, node_info: Callable[[str], dict[str, Any]]):
+        self.node_info = node_info
+        self.lock = threading.Lock()
+        self.entries: dict[str, _Entry] = {}
+        self.dependents: dict[tuple[str, str], set[str]] = {}
+        self.states: dict[tuple[str, str], Any] = {}
+        self.body: Optional[bytes] = None
+        self.gzip_body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.refreshed = False
+
+    def invalidate(self, node_classes=None):
+        """Forces the given node classes (all if None) to be rebuilt on the next request."""
+        with self.lock:
+            for name in list(self.entries) if node_classes is None else node_classes:
+                self._remove(name)
+
+    def get(self, use_gzip=False) -> ObjectInfo:
+        with self.lock:
+            models_changed = self._refresh()
+            if self.body is None:
+                self._serialize()
+            if not use_gzip:
+                return ObjectInfo(self.body, self.etag, models_changed)
+            if self.gzip_body is None:
+                self.gzip_body = gzip.compress(self.body, mtime=0)
+            # Each encoding is a different representation, so it gets its own ETag
+            return ObjectInfo(self.gzip_body, self.etag[:-1] + '-gzip"', models_changed)
+
+    def get_node(self, node_class: str) -> Optional[str]:
+        """The serialized definition of one node class, None if it is unknown or could not be built."""
+        with self.lock:
+            self._refresh()
+            entry = self.entries.get(node_class)
+            return entry.json if entry is not None else None
+
+    def _state(self, dependency, state=None):
+        """The current state of a dependency; `state` itself if it is known to be unchanged."""
+        kind, name = dependency
+        if kind == "filename_list":
+            try:
+                folder_paths.get_filename_list(name)
+            except KeyError:
+                return None
+            # Only changes when folder_paths rescans the folders
+            return folder_paths.filename_list_cache[folder_paths.map_legacy(name)][2]
+        if state is not None and all(_mtime(path) == mtime for path, mtime in state.items()):
+            return state
+        return _directory_state(name)
+
+    def _refresh(self) -> bool:
+        stale = set()
+        models_changed = not self.refreshed
+        for dependency, state in list(self.states.items()):
+            current = self._state(dependency, state)
+            if current != state:
+                self.states[dependency] = current
+                stale.update(self.dependents.get(dependency, ()))
+                models_changed = models_changed or dependency[0] == "filename_list"
+
+        mappings = nodes.NODE_CLASS_MAPPINGS
+        for name in [name for name in self.entries if name not in mappings]:
+            self._remove(name)
+        for name, node_class in mappings.items():
+            entry = self.entries.get(name)
+            if entry is None or entry.json is None or entry.node_class is not node_class:
+                stale.add(name)
+
+        if stale:
+            with folder_paths.cache_helper:
+                for name in stale:
+                    self._build(name, mappings[name])
+            for dependency in [d for d in self.states if d not in self.dependents]:
+                del self.states[dependency]
+        self.refreshed = True
+        return models_changed
+
+    def _build(self, name, node_class):
+        with folder_paths.track_dependencies() as dependencies:
+            try:
+                info = json.dumps(self.node_info(name))
+            except Exception:
+                logging.error(f"[ERROR] An error occurred while retrieving information for the '{name}' node.")
+                logging.error(traceback.format_exc())
+                info = None
+        previous = self.entries.get(name)
+        if previous is None or previous.json != info:
+            self.body = None
+        self._unlink(name)
+        self.entries[name] = _Entry(node_class, info, frozenset(dependencies))
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, set()).add(name)
+            if dependency not in self.states:
+                self.states[dependency] = self._state(dependency)
+
+    def _remove(self, name):
+        if name in self.entries:
+            self._unlink(name)
+            del self.entries[name]
+            self.body = None
+
+    def _unlink(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            return
+        for dependency in entry.dependencies:
+            names = self.dependents.get(dependency)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.dependents[dependency]
+
+    def _serialize(self):
+        # Same order and formatting as json.dumps of the whole dict
+        parts = []
+        for name in nodes.NODE_CLASS_MAPPINGS:
+            entry = self.entries.get(name)
+            if entry is not None and entry.json is not None:
+                parts.append(f"{json.dumps(name)}: {entry.json}")
+        self.body = ("{" + ", ".join(parts) + "}").encode("utf-8")
+        self.gzip_body = None
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
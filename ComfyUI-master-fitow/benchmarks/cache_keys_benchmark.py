@@ -0,0 +1,148 @@
+"""
+Benchmark for building output-cache keys (CacheKeySetInputSignature.add_keys) on synthetic graphs.
+
+Compares the memoized Merkle signatures against the previous implementation, which rebuilt and
+hashed the full ordered ancestry of every node.
+
+    python benchmarks/cache_keys_benchmark.py
+    python benchmarks/cache_keys_benchmark.py --sizes 100 300 1000 --shapes deep layered --skip-legacy
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nodes  # noqa: E402
+from comfy_execution.caching import CacheKeySetInputSignature, include_unique_id_in_input, to_hashable  # noqa: E402
+from comfy_execution.graph import DynamicPrompt  # noqa: E402
+from comfy_execution.graph_utils import is_link  # noqa: E402
+
+
+class BenchmarkNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {}}
+
+
+class NoIsChanged:
+    async def get(self, node_id):
+        return False
+
+
+class LegacyCacheKeySetInputSignature(CacheKeySetInputSignature):
+    """The pre-Merkle implementation: full ordered ancestry per node, hashed with to_hashable."""
+
+    async def get_node_signature(self, dynprompt, node_id):
+        signature = []
+        ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
+        signature.append(await self.get_legacy_immediate_signature(dynprompt, node_id, order_mapping))
+        for ancestor_id in ancestors:
+            signature.append(await self.get_legacy_immediate_signature(dynprompt, ancestor_id, order_mapping))
+        return to_hashable(signature)
+
+    async def get_legacy_immediate_signature(self, dynprompt, node_id, ancestor_order_mapping):
+        if not dynprompt.has_node(node_id):
+            return [float("NaN")]
+        node = dynprompt.get_node(node_id)
+        class_type = node["class_type"]
+        signature = [class_type, await self.is_changed_cache.get(node_id)]
+        if include_unique_id_in_input(class_type):
+            signature.append(node_id)
+        inputs = node["inputs"]
+        for key in sorted(inputs.keys()):
+            if is_link(inputs[key]):
+                (ancestor_id, ancestor_socket) = inputs[key]
+                signature.append((key, ("ANCESTOR", ancestor_order_mapping[ancestor_id], ancestor_socket)))
+            else:
+                signature.append((key, inputs[key]))
+        return signature
+
+    def get_ordered_ancestry(self, dynprompt, node_id):
+        ancestors = []
+        order_mapping = {}
+        self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
+        return ancestors, order_mapping
+
+    def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
+        if not dynprompt.has_node(node_id):
+            return
+        inputs = dynprompt.get_node(node_id)["inputs"]
+        input_keys = sorted(inputs.keys())
+        for key in input_keys:
+            if is_link(inputs[key]):
+                ancestor_id = inputs[key][0]
+                if ancestor_id not in order_mapping:
+                    ancestors.append(ancestor_id)
+                    order_mapping[ancestor_id] = len(ancestors) - 1
+                    self.get_ordered_ancestry_internal(dynprompt, ancestor_id, ancestors, order_mapping)
+
+
+def deep_graph(n):
+    """A single chain: every node depends on the previous one."""
+    prompt = {"0": {"class_type": "BenchmarkNode", "inputs": {"seed": 0}}}
+    for i in range(1, n):
+        prompt[str(i)] = {"class_type": "BenchmarkNode", "inputs": {"x": [str(i - 1), 0], "i": i}}
+    return prompt
+
+
+def wide_graph(n):
+    """n-1 independent sources fanned into one sink."""
+    prompt = {str(i): {"class_type": "BenchmarkNode", "inputs": {"seed": i}} for i in range(n - 1)}
+    prompt[str(n - 1)] = {"class_type": "BenchmarkNode", "inputs": {f"in{i}": [str(i), 0] for i in range(n - 1)}}
+    return prompt
+
+
+def layered_graph(n, width=16):
+    """Layers of `width` nodes, each depending on two nodes of the previous layer (data-generation style)."""
+    prompt = {}
+    for i in range(n):
+        layer, pos = divmod(i, width)
+        inputs = {"strength": 0.5 + pos, "text": f"prompt {i}"}
+        if layer > 0:
+            prev = (layer - 1) * width
+            inputs["a"] = [str(prev + pos), 0]
+            inputs["b"] = [str(prev + (pos + 1) % width), 0]
+        prompt[str(i)] = {"class_type": "BenchmarkNode", "inputs": inputs}
+    return prompt
+
+
+SHAPES = {"deep": deep_graph, "wide": wide_graph, "layered": layered_graph}
+
+
+async def build_keys(key_class, prompt):
+    key_set = key_class(DynamicPrompt(prompt), list(prompt.keys()), NoIsChanged())
+    start = time.perf_counter()
+    await key_set.add_keys(list(prompt.keys()))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # The legacy implementation is super-linear; sizes past ~1000 take minutes unless --skip-legacy is used
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=sorted(SHAPES))
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of N runs")
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the Merkle implementation")
+    args = parser.parse_args()
+
+    nodes.NODE_CLASS_MAPPINGS["BenchmarkNode"] = BenchmarkNode
+    # The legacy ancestry walk is recursive
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), max(args.sizes) * 4))
+
+    print(f"{'shape':<8} {'nodes':>6} {'merkle ms':>10} {'legacy ms':>10} {'speedup':>8}")  # noqa: T201
+    for shape in args.shapes:
+        for n in args.sizes:
+            prompt = SHAPES[shape](n)
+            merkle = min(asyncio.run(build_keys(CacheKeySetInputSignature, prompt)) for _ in range(args.repeat))
+            if args.skip_legacy:
+                print(f"{shape:<8} {n:>6} {merkle * 1000:>10.2f} {'-':>10} {'-':>8}")  # noqa: T201
+                continue
+            legacy = min(asyncio.run(build_keys(LegacyCacheKeySetInputSignature, prompt)) for _ in range(args.repeat))
+            print(f"{shape:<8} {n:>6} {merkle * 1000:>10.2f} {legacy * 1000:>10.2f} {legacy / merkle:>7.1f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
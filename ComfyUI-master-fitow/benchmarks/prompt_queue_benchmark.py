@@ -0,0 +1,125 @@
+"""
+Benchmark for PromptQueue operations on a large queue.
+
+Compares the indexed queue (prompt_id index, lazy deletion, cached snapshots) against the previous implementation,
+which scanned and re-heapified on every deletion and deep-copied the queue for every read.
+
+    python benchmarks/prompt_queue_benchmark.py
+    python benchmarks/prompt_queue_benchmark.py --size 100000 --deletes 10000 --skip-legacy
+"""
+import argparse
+import copy
+import heapq
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution import PromptQueue  # noqa: E402
+
+
+class NoServer:
+    def queue_updated(self):
+        pass
+
+
+class LegacyPromptQueue:
+    """The previous queue operations: linear scan + heapify per deletion, deep copies for reads."""
+
+    def __init__(self, server):
+        self.server = server
+        self.mutex = threading.RLock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.task_counter = 0
+        self.queue = []
+        self.currently_running = {}
+
+    def put(self, item):
+        with self.mutex:
+            heapq.heappush(self.queue, item)
+            self.server.queue_updated()
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        with self.not_empty:
+            item = heapq.heappop(self.queue)
+            i = self.task_counter
+            self.currently_running[i] = copy.deepcopy(item)
+            self.task_counter += 1
+            self.server.queue_updated()
+            return (item, i)
+
+    def get_current_queue(self):
+        with self.mutex:
+            return (list(self.currently_running.values()), copy.deepcopy(self.queue))
+
+    def delete_queue_item(self, function):
+        with self.mutex:
+            for x in range(len(self.queue)):
+                if function(self.queue[x]):
+                    self.queue.pop(x)
+                    heapq.heapify(self.queue)
+                    self.server.queue_updated()
+                    return True
+        return False
+
+    def delete_queue_items(self, prompt_ids):
+        # What the /queue delete handler did: one predicate scan per id
+        for prompt_id in prompt_ids:
+            self.delete_queue_item(lambda a: a[1] == prompt_id)
+
+
+def make_items(size):
+    prompt = {
+        "3": {"class_type": "KSampler", "inputs": {"seed": 0, "steps": 20, "model": ["4", 0]}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "model.safetensors"}},
+    }
+    return [(i, str(uuid.uuid4()), prompt, {"client_id": "bench"}, ["3"], {}) for i in range(size)]
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run(queue_class, items, deletes, reads, gets):
+    queue = queue_class(NoServer())
+    results = {}
+    results["put"] = timed(lambda: [queue.put(item) for item in items])
+    results["read"] = timed(lambda: [queue.get_current_queue() for _ in range(reads)])
+    # Delete from the back of the queue, like clearing the pending tail of a dataset run
+    results["delete"] = timed(lambda: queue.delete_queue_items([item[1] for item in items[-deletes:]]))
+    results["get"] = timed(lambda: [queue.get(timeout=0) for _ in range(gets)])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="number of queued prompts")
+    parser.add_argument("--deletes", type=int, default=1000, help="prompts deleted by id")
+    parser.add_argument("--reads", type=int, default=10, help="/queue reads")
+    parser.add_argument("--gets", type=int, default=1000, help="prompts taken by the worker")
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the indexed queue")
+    args = parser.parse_args()
+
+    items = make_items(args.size)
+    counts = {"put": args.size, "read": args.reads, "delete": args.deletes, "get": args.gets}
+    indexed = run(PromptQueue, items, args.deletes, args.reads, args.gets)
+    legacy = None if args.skip_legacy else run(LegacyPromptQueue, items, args.deletes, args.reads, args.gets)
+
+    print(f"{args.size} queued prompts")  # noqa: T201
+    print(f"{'operation':<10} {'count':>7} {'indexed ms':>11} {'legacy ms':>11} {'speedup':>8}")  # noqa: T201
+    for name, count in counts.items():
+        if legacy is None:
+            print(f"{name:<10} {count:>7} {indexed[name] * 1000:>11.2f} {'-':>11} {'-':>8}")  # noqa: T201
+            continue
+        speedup = legacy[name] / indexed[name] if indexed[name] > 0 else float("inf")
+        print(f"{name:<10} {count:>7} {indexed[name] * 1000:>11.2f} {legacy[name] * 1000:>11.2f} {speedup:>7.1f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -113,6 +113,12 @@ cache_group.add_argument("--cache-classic", action="store_true", help="Use the o
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
 cache_group.add_argument("--cache-none", action="store_true", help="Reduced RAM/VRAM usage at the expense of executing every node for each run.")
 cache_group.add_argument("--cache-ram", nargs='?', const=4.0, type=float, default=0, help="Use RAM pressure caching with the specified headroom threshold. If available RAM drops below the threhold the cache remove large items to free RAM. Default 4GB")
+parser.add_argument("--cache-ram-max", type=float, default=0, metavar="GB", help="Hard limit for the RAM held by cached node outputs (models, tensors) in GB. Implies --cache-ram when no other cache mode is selected.")
+parser.add_argument("--cache-vram-max", type=float, default=0, metavar="GB", help="With the RAM pressure cache, limit the VRAM held by cached node outputs in GB.")
+parser.add_argument("--cache-disk", type=str, default=None, metavar="PATH", help="Also keep node outputs (tensors and plain data) in this directory so they survive restarts. Several ComfyUI instances can share the same directory. Clear it after updating custom nodes.")
+parser.add_argument("--cache-disk-size", type=float, default=20.0, metavar="GB", help="Maximum size of the --cache-disk directory in GB. The least recently used entries are removed first.")
+parser.add_argument("--coalesce-prompts", type=int, default=0, metavar="N", help="Run up to N queued prompts that use the same workflow and differ only in KSampler seeds or CLIPTextEncode texts as one batched sampling pass.")
+parser.add_argument("--prompt-workers", type=int, default=1, metavar="N", help="Execute up to N prompts at the same time, each worker with its own node cache. Useful on CPU-only machines or for workflows that mostly wait on API nodes. Models that a worker is running are never unloaded or repatched by another one.")
 
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
@@ -172,6 +178,10 @@ parser.add_argument("--quick-test-for-ci", action="store_true", help="Quick test
 parser.add_argument("--windows-standalone-build", action="store_true", help="Windows standalone build: Enable convenient things that most people using the standalone windows build will probably enjoy (like auto opening the page on startup).")
 
 parser.add_argument("--disable-metadata", action="store_true", help="Disable saving prompt metadata in files.")
+parser.add_argument("--save-image-format", type=str, default="png", choices=["png", "webp", "jpeg"], help="Format of the images written by the SaveImage node. webp and jpeg encode much faster than png; the prompt metadata is stored as EXIF.")
+parser.add_argument("--save-image-quality", type=int, default=90, help="Quality (0-100) for --save-image-format webp and jpeg.")
+parser.add_argument("--save-image-compress-level", type=int, default=4, choices=range(10), metavar="[0-9]", help="zlib compression level for png images written by the SaveImage node. Lower is faster.")
+parser.add_argument("--save-image-workers", type=int, default=None, help="Number of threads encoding and writing saved images in the background. 0 writes them on the execution thread. Default: half the CPU cores, at most 8.")
 parser.add_argument("--disable-all-custom-nodes", action="store_true", help="Disable loading all custom nodes.")
 parser.add_argument("--whitelist-custom-nodes", type=str, nargs='+', default=[], help="Specify custom node folders to load even when --disable-all-custom-nodes is enabled.")
 parser.add_argument("--disable-api-nodes", action="store_true", help="Disable loading all api nodes. Also prevents the frontend from communicating with the internet.")
@@ -219,6 +229,7 @@ parser.add_argument(
 parser.add_argument("--user-directory", type=is_valid_directory, default=None, help="Set the ComfyUI user directory with an absolute path. Overrides --base-directory.")
 
 parser.add_argument("--enable-compress-response-body", action="store_true", help="Enable compressing response body.")
+parser.add_argument("--disable-object-info-cache", action="store_true", help="Rebuild the /object_info node definitions on every request instead of only when the model lists or directories they read change. For custom nodes whose inputs depend on files found some other way.")
 
 parser.add_argument(
     "--comfy-api-base",
@@ -231,6 +242,8 @@ database_default_path = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "user", "comfyui.db")
 )
 parser.add_argument("--database-url", type=str, default=f"sqlite:///{database_default_path}", help="Specify the database URL, e.g. for an in-memory database you can use 'sqlite:///:memory:'.")
+parser.add_argument("--history-max-items", type=int, default=0, help="Keep at most this many prompt history entries per instance in the database (0 for no limit).")
+parser.add_argument("--history-max-days", type=float, default=0, help="Remove prompt history entries older than this many days from the database (0 to keep them).")
 parser.add_argument("--disable-assets-autoscan", action="store_true", help="Disable asset scanning on startup for database synchronization.")
 
 if comfy.options.args_parsing:
@@ -26,6 +26,7 @@ import platform
 import weakref
 import gc
 import os
+import threading
 
 class VRAMState(Enum):
     DISABLED = 0    #No vram present: no need to move models to vram
@@ -462,6 +463,23 @@ except:
 
 current_loaded_models = []
 
+# Guards current_loaded_models when several prompt workers load and unload models at the same time
+models_lock = threading.RLock()
+models_released = threading.Condition(models_lock)
+# thread id -> the LoadedModels from that thread's latest load_models_gpu call, which it may still be running
+models_in_use = {}
+
+def models_in_use_by_other_threads():
+    thread_id = threading.get_ident()
+    with models_lock:
+        return [m for t, in_use in models_in_use.items() if t != thread_id for m in in_use]
+
+def release_models_in_use():
+    """Called by a prompt worker when it's done with the models it loaded, so other workers may unload or repatch them."""
+    with models_lock:
+        if models_in_use.pop(threading.get_ident(), None) is not None:
+            models_released.notify_all()
+
 def module_size(module):
     module_mem = 0
     sd = module.state_dict()
@@ -592,7 +610,7 @@ def extra_reserved_memory():
 def minimum_inference_memory():
     return (1024 * 1024 * 1024) * 0.8 + extra_reserved_memory()
 
-def free_memory(memory_required, device, keep_loaded=[]):
+def _free_memory(memory_required, device, keep_loaded=[]):
     cleanup_models_gc()
     unloaded_model = []
     can_unload = []
@@ -629,7 +647,11 @@ def free_memory(memory_required, device, keep_loaded=[]):
                 soft_empty_cache()
     return unloaded_models
 
-def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
+def free_memory(memory_required, device, keep_loaded=[]):
+    with models_lock:
+        return _free_memory(memory_required, device, keep_loaded=list(keep_loaded) + models_in_use_by_other_threads())
+
+def _load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
     cleanup_models_gc()
     global vram_state
 
@@ -716,6 +738,20 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
         current_loaded_models.insert(0, loaded_model)
     return
 
+def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
+    with models_lock:
+        requested = set(models)
+        for m in models:
+            requested.update(m.model_patches_models())
+        # The models from this thread's previous call are being replaced; waiting while holding them could deadlock
+        release_models_in_use()
+        # Repatching or unloading weights another worker is running on would corrupt its results
+        while any(x.is_clone(m.model) for x in requested for m in models_in_use_by_other_threads()):
+            models_released.wait(timeout=1.0)
+        _load_models_gpu(models, memory_required=memory_required, force_patch_weights=force_patch_weights,
+                         minimum_memory_required=minimum_memory_required, force_full_load=force_full_load)
+        models_in_use[threading.get_ident()] = [m for m in current_loaded_models if m.model in requested]
+
 def load_model_gpu(model):
     return load_models_gpu([model])
 
@@ -750,7 +786,7 @@ def cleanup_models_gc():
 
 
 
-def cleanup_models():
+def _cleanup_models():
     to_delete = []
     for i in range(len(current_loaded_models)):
         if current_loaded_models[i].real_model() is None:
@@ -760,6 +796,10 @@ def cleanup_models():
         x = current_loaded_models.pop(i)
         del x
 
+def cleanup_models():
+    with models_lock:
+        _cleanup_models()
+
 def dtype_size(dtype):
     dtype_size = 4
     if dtype == torch.float16 or dtype == torch.bfloat16:
@@ -1577,22 +1617,35 @@ class InterruptProcessingException(Exception):
 interrupt_processing_mutex = threading.RLock()
 
 interrupt_processing = False
-def interrupt_current_processing(value=True):
+# Threads with a pending interrupt aimed at them alone, used when several prompt workers run at once
+interrupted_threads = set()
+
+def interrupt_current_processing(value=True, thread_id=None):
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
+        if thread_id is not None:
+            if value:
+                interrupted_threads.add(thread_id)
+            else:
+                interrupted_threads.discard(thread_id)
+            return
         interrupt_processing = value
+        if not value:
+            interrupted_threads.discard(threading.get_ident())
 
 def processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        return interrupt_processing
+        return interrupt_processing or threading.get_ident() in interrupted_threads
 
 def throw_exception_if_processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        if interrupt_processing:
+        thread_id = threading.get_ident()
+        if interrupt_processing or thread_id in interrupted_threads:
             interrupt_processing = False
+            interrupted_threads.discard(thread_id)
             raise InterruptProcessingException()
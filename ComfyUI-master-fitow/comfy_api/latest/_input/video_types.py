@@ -1,9 +1,11 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from fractions import Fraction
-from typing import Optional, Union, IO
+from typing import Iterator, Optional, Union, IO
 import io
+import math
 import av
+import torch
 from .._util import VideoContainer, VideoCodec, VideoComponents
 
 class VideoInput(ABC):
@@ -100,6 +102,62 @@ class VideoInput(ABC):
         """
         return self.get_components().frame_rate
 
+    def iter_frames(
+        self,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        stride: int = 1,
+        chunk_size: int = 16,
+        dtype: torch.dtype = torch.float32,
+    ) -> Iterator[torch.Tensor]:
+        """
+        Iterates over the frames start_frame, start_frame + stride, ... before end_frame in chunks
+        of up to chunk_size frames, each a (n, H, W, 3) tensor. Floating point dtypes are in [0, 1],
+        torch.uint8 in [0, 255].
+
+        Default implementation slices :meth:`get_components`. File-based implementations should
+        override this to decode only the selected frames.
+        """
+        validate_frame_range(start_frame, end_frame, stride, chunk_size)
+        images = self.get_components().images[start_frame:end_frame:stride]
+        for i in range(0, images.shape[0], chunk_size):
+            chunk = images[i:i + chunk_size]
+            if dtype.is_floating_point:
+                yield chunk.to(dtype)
+            else:
+                yield (chunk * 255).clamp(0, 255).to(dtype)
+
+    def get_components_range(
+        self,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        stride: int = 1,
+    ) -> VideoComponents:
+        """
+        Returns the components of the frames start_frame, start_frame + stride, ... before end_frame.
+        The frame rate is divided by stride and the audio is cut to the time span of the selection.
+
+        Default implementation slices :meth:`get_components`. File-based implementations should
+        override this to decode only the selected frames.
+        """
+        validate_frame_range(start_frame, end_frame, stride)
+        components = self.get_components()
+        frame_count = components.images.shape[0]
+        images = components.images[start_frame:end_frame:stride]
+        audio = components.audio
+        if audio is not None and (start_frame > 0 or end_frame is not None):
+            sample_rate = audio["sample_rate"]
+            end = frame_count if end_frame is None else min(end_frame, frame_count)
+            first = math.floor(start_frame / components.frame_rate * sample_rate)
+            last = math.ceil(end / components.frame_rate * sample_rate)
+            audio = {**audio, "waveform": audio["waveform"][..., first:last]}
+        return VideoComponents(
+            images=images,
+            audio=audio,
+            frame_rate=components.frame_rate / stride,
+            metadata=components.metadata,
+        )
+
     def get_container_format(self) -> str:
         """
         Returns the container format of the video (e.g., 'mp4', 'mov', 'avi').
@@ -111,3 +169,14 @@ class VideoInput(ABC):
         source = self.get_stream_source()
         with av.open(source, mode="r") as container:
             return container.format.name
+
+
+def validate_frame_range(start_frame: int, end_frame: Optional[int], stride: int, chunk_size: int = 1):
+    if start_frame < 0:
+        raise ValueError(f"start_frame must be non-negative, got {start_frame}")
+    if end_frame is not None and end_frame < start_frame:
+        raise ValueError(f"end_frame ({end_frame}) must not be before start_frame ({start_frame})")
+    if stride < 1:
+        raise ValueError(f"stride must be at least 1, got {stride}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
@@ -2,8 +2,9 @@ from __future__ import annotations
 from av.container import InputContainer
 from av.subtitles.stream import SubtitleStream
 from fractions import Fraction
-from typing import Optional
+from typing import Iterator, Optional
 from .._input import AudioInput, VideoInput
+from .._input.video_types import validate_frame_range
 import av
 import io
 import json
@@ -52,6 +53,14 @@ def get_open_write_kwargs(
     return open_kwargs
 
 
+def frames_to_tensor(frames: list[np.ndarray], dtype: torch.dtype) -> torch.Tensor:
+    """Stack rgb24 frames into a (n, H, W, 3) tensor, scaled to [0, 1] for floating point dtypes"""
+    chunk = torch.from_numpy(np.stack(frames))
+    if dtype.is_floating_point:
+        return chunk.to(dtype).div_(255.0)
+    return chunk.to(dtype)
+
+
 class VideoFromFile(VideoInput):
     """
     Class representing video input from a file.
@@ -198,52 +207,236 @@ class VideoFromFile(VideoInput):
         with av.open(self.__file, mode='r') as container:
             return container.format.name
 
-    def get_components_internal(self, container: InputContainer) -> VideoComponents:
-        # Get video frames
-        frames = []
-        for frame in container.decode(video=0):
-            img = frame.to_ndarray(format='rgb24')  # shape: (H, W, 3)
-            img = torch.from_numpy(img) / 255.0  # shape: (H, W, 3)
-            frames.append(img)
-
-        images = torch.stack(frames) if len(frames) > 0 else torch.zeros(0, 3, 0, 0)
+    def _open(self) -> InputContainer:
+        if isinstance(self.__file, io.BytesIO):
+            self.__file.seek(0)  # Reset the BytesIO object to the beginning
+        return av.open(self.__file, mode='r')
 
-        # Get frame rate
-        video_stream = next(s for s in container.streams if s.type == 'video')
-        frame_rate = Fraction(video_stream.average_rate) if video_stream and video_stream.average_rate else Fraction(1)
+    def _decode_frames(
+        self,
+        container: InputContainer,
+        video_stream: av.VideoStream,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        stride: int = 1,
+        use_timestamps: bool = True,
+    ) -> Iterator[av.VideoFrame]:
+        """
+        Yields the decoded frames start_frame, start_frame + stride, ... before end_frame.
 
-        # Get audio if available
+        Frame indices are derived from presentation timestamps, so a non-zero start_frame seeks to the
+        keyframe preceding it instead of decoding from the beginning, and decoding stops at end_frame.
+        Streams without timestamps are decoded from the beginning and counted instead.
+        """
+        fps = Fraction(video_stream.average_rate) if video_stream.average_rate else None
+        time_base = video_stream.time_base
+        origin = video_stream.start_time or 0
+        use_timestamps = use_timestamps and fps is not None and time_base is not None
+        seeked = False
+        if use_timestamps and start_frame > 0:
+            # Aim half a frame early so rounding in the timestamps can't skip past the keyframe we need
+            target = origin + math.floor((start_frame - Fraction(1, 2)) / fps / time_base)
+            container.seek(target, stream=video_stream, backward=True, any_frame=False)
+            seeked = True
+
+        index = -1
+        for frame in container.decode(video_stream):
+            if use_timestamps and frame.pts is not None:
+                index = round((frame.pts - origin) * time_base * fps)
+            elif seeked:
+                # Without timestamps the position after a seek is unknown; count from the beginning instead
+                container.seek(0)
+                yield from self._decode_frames(container, video_stream, start_frame, end_frame, stride, use_timestamps=False)
+                return
+            else:
+                index += 1
+            if end_frame is not None and index >= end_frame:
+                break
+            if index < start_frame or (index - start_frame) % stride != 0:
+                continue
+            yield frame
+
+    def _decode_audio(
+        self,
+        container: InputContainer,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+    ) -> Optional[AudioInput]:
+        """
+        Decodes the audio between start_time and end_time (stream timestamps in seconds, open ended when
+        None), seeking to start_time instead of decoding from the beginning.
+        """
         audio = None
-        try:
-            container.seek(0)  # Reset the container to the beginning
-            for stream in container.streams:
-                if stream.type != 'audio':
-                    continue
-                assert isinstance(stream, av.AudioStream)
-                audio_frames = []
-                for packet in container.demux(stream):
-                    for frame in packet.decode():
-                        assert isinstance(frame, av.AudioFrame)
-                        audio_frames.append(frame.to_ndarray())  # shape: (channels, samples)
-                if len(audio_frames) > 0:
-                    audio_data = np.concatenate(audio_frames, axis=1)  # shape: (channels, total_samples)
-                    audio_tensor = torch.from_numpy(audio_data).unsqueeze(0)  # shape: (1, channels, total_samples)
-                    audio = AudioInput({
-                        "waveform": audio_tensor,
-                        "sample_rate": int(stream.sample_rate) if stream.sample_rate else 1,
-                    })
-        except StopIteration:
-            pass  # No audio stream
+        for stream in container.streams:
+            if stream.type != 'audio':
+                continue
+            assert isinstance(stream, av.AudioStream)
+            sample_rate = int(stream.sample_rate) if stream.sample_rate else 1
+            if start_time:
+                container.seek(max(0, int(start_time * av.time_base)), backward=True)
+            else:
+                container.seek(0)  # Reset the container to the beginning
+            audio_frames = []
+            for frame in container.decode(stream):
+                assert isinstance(frame, av.AudioFrame)
+                data = frame.to_ndarray()  # shape: (channels, samples), or (1, samples * channels) if packed
+                if frame.time is not None and (start_time is not None or end_time is not None):
+                    if end_time is not None and frame.time >= end_time:
+                        break
+                    scale = 1 if frame.format.is_planar else len(frame.layout.channels)
+                    first = 0 if start_time is None else max(0, round((start_time - frame.time) * sample_rate))
+                    last = frame.samples if end_time is None else min(frame.samples, round((end_time - frame.time) * sample_rate))
+                    if last <= first:
+                        continue
+                    data = data[:, first * scale:last * scale]
+                audio_frames.append(data)
+            if len(audio_frames) > 0:
+                audio_data = np.concatenate(audio_frames, axis=1)  # shape: (channels, total_samples)
+                audio_tensor = torch.from_numpy(audio_data).unsqueeze(0)  # shape: (1, channels, total_samples)
+                audio = AudioInput({
+                    "waveform": audio_tensor,
+                    "sample_rate": sample_rate,
+                })
+        return audio
+
+    def iter_frames(
+        self,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        stride: int = 1,
+        chunk_size: int = 16,
+        dtype: torch.dtype = torch.float32,
+    ) -> Iterator[torch.Tensor]:
+        """
+        Decodes only the selected frames, seeking to the keyframe preceding start_frame, and yields them
+        in chunks so at most chunk_size frames are held in memory at a time.
+        """
+        validate_frame_range(start_frame, end_frame, stride, chunk_size)
+        with self._open() as container:
+            video_stream = self._get_first_video_stream(container)
+            video_stream.thread_type = 'AUTO'
+            frames = []
+            for frame in self._decode_frames(container, video_stream, start_frame, end_frame, stride):
+                frames.append(frame.to_ndarray(format='rgb24'))  # shape: (H, W, 3)
+                if len(frames) == chunk_size:
+                    yield frames_to_tensor(frames, dtype)
+                    frames = []
+            if len(frames) > 0:
+                yield frames_to_tensor(frames, dtype)
+
+    def get_components_internal(
+        self,
+        container: InputContainer,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        stride: int = 1,
+    ) -> VideoComponents:
+        validate_frame_range(start_frame, end_frame, stride)
+        video_stream = self._get_first_video_stream(container)
+        frame_rate = Fraction(video_stream.average_rate) if video_stream.average_rate else Fraction(1)
+
+        # Decode as uint8 (a quarter of the float32 size) and convert into a single preallocated tensor,
+        # instead of keeping a float32 copy of every frame and stacking them
+        chunks = []
+        frames = []
+        for frame in self._decode_frames(container, video_stream, start_frame, end_frame, stride):
+            frames.append(frame.to_ndarray(format='rgb24'))  # shape: (H, W, 3)
+            if len(frames) == 64:
+                chunks.append(frames_to_tensor(frames, torch.uint8))
+                frames = []
+        if len(frames) > 0:
+            chunks.append(frames_to_tensor(frames, torch.uint8))
+
+        if len(chunks) > 0:
+            images = torch.empty((sum(c.shape[0] for c in chunks), *chunks[0].shape[1:]), dtype=torch.float32)
+            offset = 0
+            chunks.reverse()
+            while chunks:
+                chunk = chunks.pop()
+                images[offset:offset + chunk.shape[0]].copy_(chunk).div_(255.0)
+                offset += chunk.shape[0]
+        else:
+            images = torch.zeros(0, 3, 0, 0)
+
+        # Get audio for the time span of the selected frames
+        start_time = end_time = None
+        if start_frame > 0 or end_frame is not None:
+            origin = float(video_stream.start_time * video_stream.time_base) if video_stream.start_time is not None and video_stream.time_base else 0.0
+            start_time = origin + float(start_frame / frame_rate)
+            if end_frame is not None:
+                end_time = origin + float(end_frame / frame_rate)
+        audio = self._decode_audio(container, start_time, end_time)
 
         metadata = container.metadata
-        return VideoComponents(images=images, audio=audio, frame_rate=frame_rate, metadata=metadata)
+        return VideoComponents(images=images, audio=audio, frame_rate=frame_rate / stride, metadata=metadata)
 
     def get_components(self) -> VideoComponents:
-        if isinstance(self.__file, io.BytesIO):
-            self.__file.seek(0)  # Reset the BytesIO object to the beginning
-        with av.open(self.__file, mode='r') as container:
+        with self._open() as container:
             return self.get_components_internal(container)
-        raise ValueError(f"No video stream found in file '{self.__file}'")
+
+    def get_components_range(
+        self,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        stride: int = 1,
+    ) -> VideoComponents:
+        with self._open() as container:
+            return self.get_components_internal(container, start_frame, end_frame, stride)
+
+    def _reencode_to(
+        self,
+        container: InputContainer,
+        path: str | io.BytesIO,
+        format: VideoContainer = VideoContainer.AUTO,
+        codec: VideoCodec = VideoCodec.AUTO,
+        metadata: Optional[dict] = None
+    ):
+        """
+        Re-encodes to H264/AAC in MP4 (the same output as VideoFromComponents.save_to), passing decoded
+        frames straight to the encoders instead of materializing the whole video as tensors.
+        """
+        if format != VideoContainer.AUTO and format != VideoContainer.MP4:
+            raise ValueError("Only MP4 format is supported for now")
+        if codec != VideoCodec.AUTO and codec != VideoCodec.H264:
+            raise ValueError("Only H264 codec is supported for now")
+        extra_kwargs = {}
+        if isinstance(format, VideoContainer) and format != VideoContainer.AUTO:
+            extra_kwargs["format"] = format.value
+        elif isinstance(path, io.BytesIO):
+            extra_kwargs["format"] = VideoContainer.MP4.value
+        with av.open(path, mode='w', options={'movflags': 'use_metadata_tags'}, **extra_kwargs) as output:
+            # Add metadata before writing any streams
+            if metadata is not None:
+                for key, value in metadata.items():
+                    output.metadata[key] = json.dumps(value)
+
+            input_video = self._get_first_video_stream(container)
+            input_video.thread_type = 'AUTO'
+            input_frame_rate = Fraction(input_video.average_rate) if input_video.average_rate else Fraction(1)
+            frame_rate = Fraction(round(input_frame_rate * 1000), 1000)
+            video_stream = output.add_stream('h264', rate=frame_rate)
+            video_stream.width = input_video.width
+            video_stream.height = input_video.height
+            video_stream.pix_fmt = 'yuv420p'
+
+            input_audio = next((s for s in container.streams if s.type == 'audio'), None)
+            audio_stream: Optional[av.AudioStream] = None
+            if input_audio is not None and input_audio.sample_rate:
+                audio_stream = output.add_stream('aac', rate=int(input_audio.sample_rate))
+
+            decode_streams = [input_video] if audio_stream is None else [input_video, input_audio]
+            for frame in container.decode(*decode_streams):
+                if isinstance(frame, av.VideoFrame):
+                    frame = frame.reformat(width=video_stream.width, height=video_stream.height, format='yuv420p')
+                    frame.pts = None  # Let the encoder number frames at the output frame rate
+                    output.mux(video_stream.encode(frame))
+                elif audio_stream is not None:
+                    output.mux(audio_stream.encode(frame))
+
+            # Flush encoders
+            output.mux(video_stream.encode(None))
+            if audio_stream is not None:
+                output.mux(audio_stream.encode(None))
 
     def save_to(
         self,
@@ -264,14 +457,7 @@ class VideoFromFile(VideoInput):
                 reuse_streams = False
 
             if not reuse_streams:
-                components = self.get_components_internal(container)
-                video = VideoFromComponents(components)
-                return video.save_to(
-                    path,
-                    format=format,
-                    codec=codec,
-                    metadata=metadata
-                )
+                return self._reencode_to(container, path, format=format, codec=codec, metadata=metadata)
 
             streams = container.streams
 
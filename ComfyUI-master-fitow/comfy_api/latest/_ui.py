@@ -18,6 +18,7 @@ from PIL import Image as PILImage
 from PIL.PngImagePlugin import PngInfo
 
 import folder_paths
+from comfy_execution import image_writer
 
 # used for image preview
 from comfy.cli_args import args
@@ -140,15 +141,17 @@ class ImageSaveHelper:
     ) -> list[SavedResult]:
         """Saves a batch of images as individual PNG files."""
         full_output_folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(
-            filename_prefix, _get_directory_by_folder_type(folder_type), images[0].shape[1], images[0].shape[0]
+            filename_prefix, _get_directory_by_folder_type(folder_type), images[0].shape[1], images[0].shape[0], count=len(images)
         )
         results = []
         metadata = ImageSaveHelper._create_png_metadata(cls)
-        for batch_number, image_tensor in enumerate(images):
-            img = ImageSaveHelper._convert_tensor_to_pil(image_tensor)
+        arrays = torch.clamp(images * 255.0, 0, 255).to(torch.uint8).cpu().numpy()
+        for batch_number, array in enumerate(arrays):
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
             file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=compress_level)
+            image_writer.writer.submit(
+                os.path.join(full_output_folder, file), image_writer.write_image, array, "png", metadata, compress_level
+            )
             results.append(SavedResult(file, subfolder, folder_type))
             counter += 1
         return results
@@ -172,7 +175,7 @@ class ImageSaveHelper:
     ) -> SavedResult:
         """Saves a batch of images as a single animated PNG."""
         full_output_folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(
-            filename_prefix, _get_directory_by_folder_type(folder_type), images[0].shape[1], images[0].shape[0]
+            filename_prefix, _get_directory_by_folder_type(folder_type), images[0].shape[1], images[0].shape[0], count=1
         )
         pil_images = [ImageSaveHelper._convert_tensor_to_pil(img) for img in images]
         metadata = ImageSaveHelper._create_animated_png_metadata(cls)
@@ -216,7 +219,7 @@ class ImageSaveHelper:
     ) -> SavedResult:
         """Saves a batch of images as a single animated WebP."""
         full_output_folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(
-            filename_prefix, _get_directory_by_folder_type(folder_type), images[0].shape[1], images[0].shape[0]
+            filename_prefix, _get_directory_by_folder_type(folder_type), images[0].shape[1], images[0].shape[0], count=1
         )
         pil_images = [ImageSaveHelper._convert_tensor_to_pil(img) for img in images]
         pil_exif = ImageSaveHelper._create_webp_metadata(pil_images[0], cls)
@@ -271,7 +274,7 @@ class AudioSaveHelper:
         quality: str = "128k",
     ) -> list[SavedResult]:
         full_output_folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(
-            filename_prefix, _get_directory_by_folder_type(folder_type)
+            filename_prefix, _get_directory_by_folder_type(folder_type), count=len(audio["waveform"])
         )
 
         metadata = {}
@@ -346,40 +346,43 @@ def trim_video(video: Input.Video, duration_sec: float) -> Input.Video:
 
         frame_count = 0
         audio_frame_count = 0
+        video_done = video_stream is None
+        audio_done = audio_stream is None
 
-        # Decode and re-encode video frames
+        # Decode and re-encode video and audio in a single pass over the input,
+        # stopping as soon as both streams are past the cut
+        input_streams = []
+        if video_stream:
+            input_streams.append(input_container.streams.video[0])
+        if audio_stream:
+            input_streams.append(input_container.streams.audio[0])
+        for frame in input_container.decode(*input_streams):
+            if isinstance(frame, av.VideoFrame):
+                if frame_count < target_frames:
+                    # Re-encode frame
+                    for packet in video_stream.encode(frame):
+                        output_container.mux(packet)
+                    frame_count += 1
+                video_done = frame_count >= target_frames
+            elif not audio_done:
+                if frame.time >= duration_sec:
+                    audio_done = True
+                else:
+                    # Re-encode frame
+                    for packet in audio_stream.encode(frame):
+                        output_container.mux(packet)
+                    audio_frame_count += 1
+            if video_done and audio_done:
+                break
+
+        # Flush encoders
         if video_stream:
-            for frame in input_container.decode(video=0):
-                if frame_count >= target_frames:
-                    break
-
-                # Re-encode frame
-                for packet in video_stream.encode(frame):
-                    output_container.mux(packet)
-                frame_count += 1
-
-            # Flush encoder
             for packet in video_stream.encode():
                 output_container.mux(packet)
-
             logging.info("Encoded %s video frames (target: %s)", frame_count, target_frames)
-
-        # Decode and re-encode audio frames
         if audio_stream:
-            input_container.seek(0)  # Reset to beginning for audio
-            for frame in input_container.decode(audio=0):
-                if frame.time >= duration_sec:
-                    break
-
-                # Re-encode frame
-                for packet in audio_stream.encode(frame):
-                    output_container.mux(packet)
-                audio_frame_count += 1
-
-            # Flush encoder
             for packet in audio_stream.encode():
                 output_container.mux(packet)
-
             logging.info("Encoded %s audio frames", audio_frame_count)
 
         # Close containers
@@ -1,7 +1,11 @@
-import bisect
+import collections
 import gc
+import hashlib
+import heapq
 import itertools
+import math
 import psutil
+import threading
 import time
 import torch
 from typing import Sequence, Mapping, Dict
@@ -63,6 +67,30 @@ def to_hashable(obj):
         # TODO - Support other objects like tensors?
         return Unhashable()
 
+class UnhashableInput(Exception):
+    pass
+
+def to_canonical(obj):
+    # Converts a signature into nested tuples of primitives whose repr() is stable across
+    # processes, so it can be digested. NaN (used by IS_CHANGED to force re-execution) and
+    # arbitrary objects are rejected, matching to_hashable()'s "never equal" semantics.
+    if obj is None or isinstance(obj, (bool, int, str, bytes)):
+        return obj
+    elif isinstance(obj, float):
+        if obj != obj:
+            raise UnhashableInput()
+        return obj
+    elif isinstance(obj, Mapping):
+        try:
+            items = sorted(obj.items())
+        except TypeError:
+            raise UnhashableInput()
+        return ("m", tuple((to_canonical(k), to_canonical(v)) for k, v in items))
+    elif isinstance(obj, Sequence):
+        return ("s", tuple(to_canonical(i) for i in obj))
+    else:
+        raise UnhashableInput()
+
 class CacheKeySetID(CacheKeySet):
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
@@ -83,6 +111,8 @@ class CacheKeySetInputSignature(CacheKeySet):
         super().__init__(dynprompt, node_ids, is_changed_cache)
         self.dynprompt = dynprompt
         self.is_changed_cache = is_changed_cache
+        # node_id -> digest (bytes), or an Unhashable instance for nodes that can't be cached
+        self.node_digests = {}
 
     def include_node_id_in_input(self) -> bool:
         return False
@@ -98,17 +128,54 @@ class CacheKeySetInputSignature(CacheKeySet):
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
     async def get_node_signature(self, dynprompt, node_id):
-        signature = []
-        ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
-        signature.append(await self.get_immediate_node_signature(dynprompt, node_id, order_mapping))
-        for ancestor_id in ancestors:
-            signature.append(await self.get_immediate_node_signature(dynprompt, ancestor_id, order_mapping))
-        return to_hashable(signature)
-
-    async def get_immediate_node_signature(self, dynprompt, node_id, ancestor_order_mapping):
+        # Signatures are Merkle-style digests: each node's digest covers its own inputs plus the
+        # digests of the nodes it links to. Digests are computed bottom-up (iteratively, so deep
+        # graphs don't hit the recursion limit) and memoized, making key building linear in the
+        # size of the graph instead of re-walking the full ancestry for every node.
+        digests = self.node_digests
+        expanded = set()
+        stack = [node_id]
+        while stack:
+            current = stack[-1]
+            if current in digests:
+                stack.pop()
+                continue
+            pending = [a for a in self.get_linked_ancestors(dynprompt, current) if a not in digests]
+            if pending:
+                if current in expanded:
+                    # Only reachable through a cycle; such a graph can't be cached.
+                    digests[current] = Unhashable()
+                    stack.pop()
+                    continue
+                expanded.add(current)
+                stack.extend(reversed(pending))
+                continue
+            stack.pop()
+            digests[current] = await self.get_node_digest(dynprompt, current)
+        return digests[node_id]
+
+    def get_linked_ancestors(self, dynprompt, node_id):
+        if not dynprompt.has_node(node_id):
+            return []
+        inputs = dynprompt.get_node(node_id)["inputs"]
+        return [inputs[key][0] for key in sorted(inputs.keys()) if is_link(inputs[key])]
+
+    async def get_node_digest(self, dynprompt, node_id):
+        signature = await self.get_immediate_node_signature(dynprompt, node_id)
+        if signature is None:
+            return Unhashable()
+        try:
+            canonical = to_canonical(signature)
+        except UnhashableInput:
+            return Unhashable()
+        return hashlib.blake2b(repr(canonical).encode("utf-8"), digest_size=20).digest()
+
+    async def get_immediate_node_signature(self, dynprompt, node_id):
+        # Returns None when the node (or anything it links to) can't be cached. Linked inputs
+        # are represented by the ancestor's digest, which must already be in self.node_digests.
         if not dynprompt.has_node(node_id):
             # This node doesn't exist -- we can't cache it.
-            return [float("NaN")]
+            return None
         node = dynprompt.get_node(node_id)
         class_type = node["class_type"]
         class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
@@ -119,33 +186,14 @@ class CacheKeySetInputSignature(CacheKeySet):
         for key in sorted(inputs.keys()):
             if is_link(inputs[key]):
                 (ancestor_id, ancestor_socket) = inputs[key]
-                ancestor_index = ancestor_order_mapping[ancestor_id]
-                signature.append((key,("ANCESTOR", ancestor_index, ancestor_socket)))
+                ancestor_digest = self.node_digests.get(ancestor_id)
+                if not isinstance(ancestor_digest, bytes):
+                    return None
+                signature.append((key, ("ANCESTOR", ancestor_digest, ancestor_socket)))
             else:
                 signature.append((key, inputs[key]))
         return signature
 
-    # This function returns a list of all ancestors of the given node. The order of the list is
-    # deterministic based on which specific inputs the ancestor is connected by.
-    def get_ordered_ancestry(self, dynprompt, node_id):
-        ancestors = []
-        order_mapping = {}
-        self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
-        return ancestors, order_mapping
-
-    def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
-        if not dynprompt.has_node(node_id):
-            return
-        inputs = dynprompt.get_node(node_id)["inputs"]
-        input_keys = sorted(inputs.keys())
-        for key in input_keys:
-            if is_link(inputs[key]):
-                ancestor_id = inputs[key][0]
-                if ancestor_id not in order_mapping:
-                    ancestors.append(ancestor_id)
-                    order_mapping[ancestor_id] = len(ancestors) - 1
-                    self.get_ordered_ancestry_internal(dynprompt, ancestor_id, ancestors, order_mapping)
-
 class BasicCache:
     def __init__(self, key_class):
         self.key_class = key_class
@@ -349,75 +397,267 @@ class LRUCache(BasicCache):
         return self
 
 
-#Iterating the cache for usage analysis might be expensive, so if we trigger make sure
-#to take a chunk out to give breathing space on high-node / low-ram-per-node flows.
+#If we trigger, take a chunk out to give breathing space on high-node / low-ram-per-node flows.
 
 RAM_CACHE_HYSTERESIS = 1.1
 
-#This is kinda in GB but not really. It needs to be non-zero for the below heuristic
-#and as long as Multi GB models dwarf this it will approximate OOM scoring OK
+#Entries with nothing measurable (plain data, unknown objects) still cost something; this keeps their
+#eviction score non-zero so pure LRU applies among them
 
-RAM_CACHE_DEFAULT_RAM_USAGE = 0.1
+RAM_CACHE_MIN_ENTRY_BYTES = 64 * 1024
 
 #Exponential bias towards evicting older workflows so garbage will be taken out
 #in constantly changing setups.
 
 RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER = 1.3
 
+RAM_CACHE_RECENT_EVICTIONS = 100
+
+def _storage_of(obj):
+    """Returns (storage_id, nbytes, is_vram) for the memory behind a tensor or a model-like object."""
+    if isinstance(obj, torch.Tensor):
+        try:
+            storage = obj.untyped_storage()
+            return (("tensor", obj.device.type, obj.device.index, storage.data_ptr()), storage.nbytes(), obj.device.type != "cpu")
+        except Exception:
+            # Tensor subclasses without a plain storage
+            return (("object", id(obj)), obj.numel() * obj.element_size(), obj.device.type != "cpu")
+    # ModelPatcher / CLIP / VAE: clones share the underlying module, so count it once
+    owner = obj
+    while getattr(owner, "patcher", None) is not None and owner.patcher is not owner:
+        owner = owner.patcher
+    module = getattr(owner, "model", None)
+    if module is None:
+        module = getattr(owner, "first_stage_model", None)
+    return (("object", id(module if module is not None else obj)), obj.get_ram_usage(), False)
+
+def measure_storages(value):
+    """Collects the distinct storages referenced by a cached value: {storage_id: (nbytes, is_vram)}."""
+    storages = {}
+    seen = set()
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, torch.Tensor) or hasattr(obj, "get_ram_usage"):
+            storage_id, nbytes, is_vram = _storage_of(obj)
+            if nbytes > 0:
+                storages[storage_id] = (nbytes, is_vram)
+        elif isinstance(obj, (list, tuple, dict)):
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            stack.extend(obj.values() if isinstance(obj, dict) else obj)
+    return storages
+
 class RAMPressureCache(LRUCache):
 
-    def __init__(self, key_class):
+    def __init__(self, key_class, max_ram_bytes=0, max_vram_bytes=0):
         super().__init__(key_class, 0)
+        self.max_ram_bytes = max_ram_bytes
+        self.max_vram_bytes = max_vram_bytes
         self.timestamps = {}
+        # Sizes are measured once, when a value is inserted. Storages shared between entries (the same
+        # model behind several patcher clones, tensor views) are counted once in the totals.
+        self.entry_storages = {}
+        self.entry_classes = {}
+        self.storage_refs = {}
+        self.ram_bytes = 0
+        self.vram_bytes = 0
+        # Lazily invalidated max-heap of eviction candidates; see _push
+        self.heap = []
+        self.heap_serial = {}
+        self.serial = itertools.count()
+        self.stats_lock = threading.Lock()
+        self.evictions = 0
+        self.evicted_ram_bytes = 0
+        self.evicted_vram_bytes = 0
+        self.recent_evictions = collections.deque(maxlen=RAM_CACHE_RECENT_EVICTIONS)
 
     def clean_unused(self):
         self._clean_subcaches()
 
     def set(self, node_id, value):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        self.timestamps[cache_key] = time.time()
+        if self.cache.get(cache_key) is value:
+            # Write-back of a value we already hold
+            self._mark_used(node_id)
+            return
+        storages = measure_storages(value)
+        with self.stats_lock:
+            self._forget(cache_key)
+            self._remember(cache_key, storages)
+            self.entry_classes[cache_key] = self.dynprompt.get_node(node_id)["class_type"]
         super().set(node_id, value)
+        self._push(cache_key)
 
     def get(self, node_id):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
-        return super().get(node_id)
+        value = super().get(node_id)
+        if value is not None:
+            self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
+        return value
+
+    def _mark_used(self, node_id):
+        super()._mark_used(node_id)
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        if cache_key in self.cache:
+            self._push(cache_key)
+
+    def _remember(self, cache_key, storages):
+        self.entry_storages[cache_key] = storages
+        for storage_id, (nbytes, is_vram) in storages.items():
+            refs = self.storage_refs.get(storage_id, 0)
+            self.storage_refs[storage_id] = refs + 1
+            if refs == 0:
+                if is_vram:
+                    self.vram_bytes += nbytes
+                else:
+                    self.ram_bytes += nbytes
+
+    def _forget(self, cache_key):
+        """Drops an entry's storages from the totals; returns the (ram, vram) bytes no other entry references."""
+        freed_ram = freed_vram = 0
+        for storage_id, (nbytes, is_vram) in self.entry_storages.pop(cache_key, {}).items():
+            refs = self.storage_refs[storage_id] - 1
+            if refs > 0:
+                self.storage_refs[storage_id] = refs
+                continue
+            del self.storage_refs[storage_id]
+            if is_vram:
+                self.vram_bytes -= nbytes
+                freed_vram += nbytes
+            else:
+                self.ram_bytes -= nbytes
+                freed_ram += nbytes
+        return freed_ram, freed_vram
+
+    def _entry_size(self, cache_key):
+        ram = vram = 0
+        for nbytes, is_vram in self.entry_storages.get(cache_key, {}).values():
+            if is_vram:
+                vram += nbytes
+            else:
+                ram += nbytes
+        return ram, vram
+
+    def _push(self, cache_key):
+        # The OOM score of an entry is MULTIPLIER ** (generation - used_generation) * size. The generation
+        # term is shared by every entry, so ordering by size * MULTIPLIER ** -used_generation is equivalent
+        # and doesn't change as generations pass: an entry only needs re-pushing when it is used again.
+        # Ties (nothing measurable) go to the least recently touched entry.
+        serial = next(self.serial)
+        self.heap_serial[cache_key] = serial
+        size = sum(self._entry_size(cache_key)) + RAM_CACHE_MIN_ENTRY_BYTES
+        score = math.log(size) - self.used_generation.get(cache_key, 0) * math.log(RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER)
+        heapq.heappush(self.heap, (-score, self.timestamps.get(cache_key, 0), serial, cache_key))
+        if len(self.heap) > 2 * len(self.cache) + 1024:
+            self.heap = [item for item in self.heap if self._is_live(item)]
+            heapq.heapify(self.heap)
+
+    def _is_live(self, item):
+        return item[3] in self.cache and self.heap_serial.get(item[3]) == item[2]
+
+    def _pop_victim(self, vram_only=False):
+        skipped = []
+        victim = None
+        while self.heap:
+            item = heapq.heappop(self.heap)
+            if not self._is_live(item):
+                continue
+            if vram_only and self._entry_size(item[3])[1] == 0:
+                skipped.append(item)
+                continue
+            victim = item[3]
+            break
+        for item in skipped:
+            heapq.heappush(self.heap, item)
+        return victim
+
+    def _evict(self, cache_key, reason):
+        with self.stats_lock:
+            ram, vram = self._entry_size(cache_key)
+            freed_ram, freed_vram = self._forget(cache_key)
+            del self.cache[cache_key]
+            self.heap_serial.pop(cache_key, None)
+            self.timestamps.pop(cache_key, None)
+            self.evictions += 1
+            self.evicted_ram_bytes += freed_ram
+            self.evicted_vram_bytes += freed_vram
+            self.recent_evictions.append({
+                "time": time.time(),
+                "reason": reason,
+                "key": cache_key.hex() if isinstance(cache_key, bytes) else None,
+                "class_type": self.entry_classes.pop(cache_key, None),
+                "ram_bytes": ram,
+                "vram_bytes": vram,
+                "freed_ram_bytes": freed_ram,
+                "freed_vram_bytes": freed_vram,
+                "age": self.generation - self.used_generation.get(cache_key, self.generation),
+            })
+        return freed_ram, freed_vram
+
+    def _enforce_budgets(self):
+        while self.max_ram_bytes > 0 and self.ram_bytes > self.max_ram_bytes:
+            cache_key = self._pop_victim()
+            if cache_key is None:
+                break
+            self._evict(cache_key, "ram_budget")
+        while self.max_vram_bytes > 0 and self.vram_bytes > self.max_vram_bytes:
+            cache_key = self._pop_victim(vram_only=True)
+            if cache_key is None:
+                break
+            self._evict(cache_key, "vram_budget")
+
+    def poll(self, ram_headroom=0, **kwargs):
+        self._enforce_budgets()
+        if ram_headroom <= 0:
+            return
 
-    def poll(self, ram_headroom):
         def _ram_gb():
             return psutil.virtual_memory().available / (1024**3)
 
         if _ram_gb() > ram_headroom:
             return
         gc.collect()
-        if _ram_gb() > ram_headroom:
-            return
 
-        clean_list = []
-
-        for key, (outputs, _), in self.cache.items():
-            oom_score =  RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER ** (self.generation - self.used_generation[key])
-
-            ram_usage = RAM_CACHE_DEFAULT_RAM_USAGE
-            def scan_list_for_ram_usage(outputs):
-                nonlocal ram_usage
-                if outputs is None:
-                    return
-                for output in outputs:
-                    if isinstance(output, list):
-                        scan_list_for_ram_usage(output)
-                    elif isinstance(output, torch.Tensor) and output.device.type == 'cpu':
-                        #score Tensors at a 50% discount for RAM usage as they are likely to
-                        #be high value intermediates
-                        ram_usage += (output.numel() * output.element_size()) * 0.5
-                    elif hasattr(output, "get_ram_usage"):
-                        ram_usage += output.get_ram_usage()
-            scan_list_for_ram_usage(outputs)
-
-            oom_score *= ram_usage
-            #In the case where we have no information on the node ram usage at all,
-            #break OOM score ties on the last touch timestamp (pure LRU)
-            bisect.insort(clean_list, (oom_score, self.timestamps[key], key))
-
-        while _ram_gb() < ram_headroom * RAM_CACHE_HYSTERESIS and clean_list:
-            _, _, key = clean_list.pop()
-            del self.cache[key]
+        while True:
+            deficit = (ram_headroom * RAM_CACHE_HYSTERESIS - _ram_gb()) * (1024**3)
+            if deficit <= 0:
+                return
+            # Evict enough measured bytes to cover the deficit, then collect once and re-check
+            freed = 0
+            while freed < deficit:
+                cache_key = self._pop_victim()
+                if cache_key is None:
+                    break
+                freed += max(sum(self._evict(cache_key, "ram_pressure")), RAM_CACHE_MIN_ENTRY_BYTES)
             gc.collect()
+            if freed == 0:
+                return
+
+    def get_stats(self):
+        with self.stats_lock:
+            entries = []
+            for cache_key in self.entry_storages:
+                ram, vram = self._entry_size(cache_key)
+                entries.append({
+                    "key": cache_key.hex() if isinstance(cache_key, bytes) else None,
+                    "class_type": self.entry_classes.get(cache_key),
+                    "ram_bytes": ram,
+                    "vram_bytes": vram,
+                    "age": self.generation - self.used_generation.get(cache_key, self.generation),
+                })
+            entries.sort(key=lambda e: e["ram_bytes"] + e["vram_bytes"], reverse=True)
+            return {
+                "type": "ram_pressure",
+                "entries": len(self.entry_storages),
+                "ram_bytes": self.ram_bytes,
+                "vram_bytes": self.vram_bytes,
+                "max_ram_bytes": self.max_ram_bytes,
+                "max_vram_bytes": self.max_vram_bytes,
+                "evictions": self.evictions,
+                "evicted_ram_bytes": self.evicted_ram_bytes,
+                "evicted_vram_bytes": self.evicted_vram_bytes,
+                "largest_entries": entries[:20],
+                "recent_evictions": list(self.recent_evictions),
+            }
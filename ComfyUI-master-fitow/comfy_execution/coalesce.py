@@ -0,0 +1,414 @@
+"""
+Prompt coalescing: queued prompts that share a workflow and differ only in sampler seeds or prompt texts run as one
+execution, with all of their latents denoised in a single sampling pass.
+
+The merged prompt keeps the nodes the members share once, encodes the differing texts into one batched conditioning,
+samples every member's latent together (each with the noise its own seed would have produced) and gives every member
+its own copy of the nodes downstream of the sampler, so output files, image metadata and history stay per prompt.
+"""
+import hashlib
+import json
+import math
+from typing import NamedTuple
+
+import torch
+
+import comfy.sample
+import nodes
+from comfy_execution.graph_utils import is_link
+
+# Inputs that may differ between prompts that are coalesced together
+COALESCE_INPUTS = {
+    "KSampler": ("seed",),
+    "KSamplerAdvanced": ("noise_seed",),
+    "CLIPTextEncode": ("text",),
+}
+SAMPLER_CLASSES = ("KSampler", "KSamplerAdvanced")
+TEXT_CLASSES = ("CLIPTextEncode",)
+
+# Keys that are allowed to differ between members' extra_data. client_id is part of the key: the merged run reports its
+# progress to the first member's client, which must not see other clients' prompts.
+MEMBER_EXTRA_DATA_KEYS = ("extra_pnginfo",)
+
+SHARED = "shared"
+BATCHED = "batched"
+COPY = "copy"
+
+
+class CoalesceMember(NamedTuple):
+    prompt_id: str
+    prompt: dict
+    extra_data: dict
+    execute_outputs: list
+
+
+def coalesce_key(item):
+    """
+    Returns a key that is equal for queue items which can be coalesced, or None if the item has no sampler to batch.
+    Items are (number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive).
+    """
+    prompt, extra_data, execute_outputs, sensitive = item[2], item[3], item[4], item[5]
+    if not any(node.get("class_type") in SAMPLER_CLASSES for node in prompt.values()):
+        return None
+    template = {}
+    for node_id, node in prompt.items():
+        inputs = dict(node.get("inputs", {}))
+        for name in COALESCE_INPUTS.get(node.get("class_type"), ()):
+            if name in inputs and not is_link(inputs[name]):
+                inputs[name] = None
+        template[node_id] = {**{k: v for k, v in node.items() if k != "_meta"}, "inputs": inputs}
+    context = {k: v for k, v in extra_data.items() if k not in MEMBER_EXTRA_DATA_KEYS}
+    data = json.dumps([template, sorted(execute_outputs), context, sensitive], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _links(node):
+    return [(name, value) for name, value in node["inputs"].items() if is_link(value)]
+
+
+def _topological_order(prompt):
+    pending = {node_id: {value[0] for _, value in _links(node)} for node_id, node in prompt.items()}
+    order = []
+    ready = [node_id for node_id, deps in pending.items() if not deps]
+    consumers = {}
+    for node_id, deps in pending.items():
+        for dep in deps:
+            consumers.setdefault(dep, []).append(node_id)
+    while ready:
+        node_id = ready.pop()
+        order.append(node_id)
+        for consumer in consumers.get(node_id, ()):
+            pending[consumer].discard(node_id)
+            if not pending[consumer]:
+                ready.append(consumer)
+    return order if len(order) == len(prompt) else None
+
+
+def _member_node_id(node_id, index):
+    # The first member keeps the original ids, so the submitting client sees its own nodes execute
+    return node_id if index == 0 else f"{node_id}@{index}"
+
+
+class CoalescedPrompt:
+    def __init__(self, prompt, execute_outputs, extra_data, node_maps):
+        self.prompt = prompt
+        self.execute_outputs = execute_outputs
+        self.extra_data = extra_data
+        # Per member: merged node id -> the member's original node id
+        self.node_maps = node_maps
+
+    def split_history(self, history_result):
+        results = [{"outputs": {}, "meta": {}} for _ in self.node_maps]
+        metas = history_result.get("meta", {})
+        for merged_id, output in history_result.get("outputs", {}).items():
+            meta = metas.get(merged_id)
+            real_id = meta.get("real_node_id", merged_id) if meta else merged_id
+            for node_map, result in zip(self.node_maps, results):
+                if real_id not in node_map:
+                    continue
+                out_id = node_map[real_id] if merged_id == real_id else merged_id
+                result["outputs"][out_id] = output
+                if meta is not None:
+                    result["meta"][out_id] = {k: node_map.get(v, v) if isinstance(v, str) else v for k, v in meta.items()}
+        return results
+
+    def failed_members(self, status_messages):
+        """
+        Returns the indices of the members a failed run is attributed to: the member whose copied node raised the
+        error, or every member if the run was interrupted or failed in a node they share.
+        """
+        everyone = set(range(len(self.node_maps)))
+        failed = set()
+        for event, data in status_messages:
+            if event == "execution_interrupted":
+                return everyone
+            if event == "execution_error":
+                member = self.prompt.get(data.get("node_id"), {}).get("coalesce_member")
+                if member is None:
+                    return everyone
+                failed.add(member)
+        return failed or everyone
+
+
+def merge_prompts(members):
+    """
+    Builds one prompt that executes all members (CoalesceMember, with equal coalesce_key). Returns a CoalescedPrompt,
+    or None if the members have nothing to batch.
+    """
+    base = members[0].prompt
+    count = len(members)
+    order = _topological_order(base)
+    if count < 2 or order is None:
+        return None
+
+    varying = set()
+    for node_id, node in base.items():
+        for name in COALESCE_INPUTS.get(node["class_type"], ()):
+            values = [m.prompt[node_id]["inputs"].get(name) for m in members]
+            if any(v != values[0] for v in values):
+                varying.add(node_id)
+
+    kinds = {}
+    for node_id in order:
+        node = base[node_id]
+        parents = {name: kinds[value[0]] for name, value in _links(node)}
+        if node_id not in varying and all(kind == SHARED for kind in parents.values()):
+            kinds[node_id] = SHARED
+        elif node["class_type"] in TEXT_CLASSES and node_id in varying and all(kind == SHARED for kind in parents.values()):
+            kinds[node_id] = BATCHED
+        elif node["class_type"] in SAMPLER_CLASSES and all(
+            kind == SHARED or (name in ("positive", "negative") and kind == BATCHED) for name, kind in parents.items()
+        ):
+            kinds[node_id] = BATCHED
+        else:
+            kinds[node_id] = COPY
+    if not any(kinds[node_id] == BATCHED and base[node_id]["class_type"] in SAMPLER_CLASSES for node_id in base):
+        return None
+
+    merged = {}
+    node_maps = [{} for _ in members]
+    for node_id in order:
+        node = base[node_id]
+        kind = kinds[node_id]
+        if kind == SHARED:
+            merged[node_id] = node
+            for node_map in node_maps:
+                node_map[node_id] = node_id
+        elif kind == BATCHED and node["class_type"] in TEXT_CLASSES:
+            texts = [m.prompt[node_id]["inputs"]["text"] for m in members]
+            merged[node_id] = {
+                "class_type": "CoalescedCLIPTextEncode",
+                "inputs": {"clip": node["inputs"]["clip"], "texts_json": json.dumps(texts)},
+            }
+        elif kind == BATCHED:
+            seed_name = COALESCE_INPUTS[node["class_type"]][0]
+            inputs = {k: v for k, v in node["inputs"].items() if k != seed_name}
+            inputs["sampler_class"] = node["class_type"]
+            inputs["seeds_json"] = json.dumps([m.prompt[node_id]["inputs"][seed_name] for m in members])
+            inputs["batched_inputs_json"] = json.dumps(sorted(name for name, value in _links(node) if kinds[value[0]] == BATCHED))
+            merged[node_id] = {"class_type": "CoalescedKSampler", "inputs": inputs}
+        else:
+            for index, member in enumerate(members):
+                source = member.prompt[node_id]
+                inputs = {}
+                for name, value in source["inputs"].items():
+                    if not is_link(value) or kinds[value[0]] == SHARED:
+                        inputs[name] = value
+                    elif kinds[value[0]] == COPY:
+                        inputs[name] = [_member_node_id(value[0], index), value[1]]
+                    else:
+                        # Slice this member's share out of a batched result
+                        select_id = f"{value[0]}@{index}:{value[1]}"
+                        merged[select_id] = {
+                            "class_type": "CoalescedSelect",
+                            "inputs": {"value": [value[0], value[1]], "index": index, "count": count},
+                        }
+                        inputs[name] = [select_id, 0]
+                member_node_id = _member_node_id(node_id, index)
+                if member_node_id != node_id and member_node_id in base:
+                    return None
+                merged[member_node_id] = {**source, "inputs": inputs, "coalesce_member": index}
+                node_maps[index][member_node_id] = node_id
+
+    execute_outputs = []
+    for node_id in members[0].execute_outputs:
+        if kinds.get(node_id) == COPY:
+            execute_outputs.extend(_member_node_id(node_id, index) for index in range(count))
+        else:
+            execute_outputs.append(node_id)
+
+    extra_data = dict(members[0].extra_data)
+    extra_data["coalesce_members"] = [
+        {"prompt_id": m.prompt_id, "prompt": m.prompt, "extra_pnginfo": m.extra_data.get("extra_pnginfo")} for m in members
+    ]
+    return CoalescedPrompt(merged, execute_outputs, extra_data, node_maps)
+
+
+def get_member(dynprompt, unique_id, extra_data):
+    """
+    For a coalesced execution, returns the member ({"prompt_id", "prompt", "extra_pnginfo"}) a node belongs to, so hidden
+    PROMPT / EXTRA_PNGINFO inputs describe the member's own prompt. Shared nodes belong to the first member.
+    """
+    members = extra_data.get("coalesce_members")
+    if not members or dynprompt is None:
+        return None
+    node = dynprompt.get_node(dynprompt.get_real_node_id(unique_id))
+    return members[node.get("coalesce_member", 0)]
+
+
+def failed_in_coalesced_node(status_messages):
+    for event, data in status_messages:
+        if event == "execution_error" and data.get("node_type") in NODE_CLASS_MAPPINGS:
+            return True
+    return False
+
+
+def batch_conditioning(conditionings):
+    """Concatenates single-prompt conditionings along the batch dimension."""
+    first = conditionings[0]
+    if any(len(c) != len(first) for c in conditionings):
+        raise ValueError("Conditionings with different schedules can't be batched")
+    out = []
+    for entries in zip(*conditionings):
+        tensors = [entry[0] for entry in entries]
+        if tensors[0].ndim == 3:
+            # Token counts can differ; repeat up to a common length like CONDCrossAttn.concat does
+            length = math.lcm(*(t.shape[1] for t in tensors))
+            tensors = [t.repeat(1, length // t.shape[1], 1) for t in tensors]
+        cond = torch.cat(tensors)
+        options = {}
+        for key, value in entries[0][1].items():
+            values = [entry[1].get(key) for entry in entries]
+            if isinstance(value, torch.Tensor):
+                if any(not isinstance(v, torch.Tensor) or v.shape != value.shape for v in values):
+                    raise ValueError(f"Conditioning '{key}' has different shapes and can't be batched")
+                options[key] = torch.cat(values)
+            elif any(v is not value and v != value for v in values):
+                raise ValueError(f"Conditioning '{key}' differs between prompts and can't be batched")
+            else:
+                options[key] = value
+        if any(set(entry[1]) != set(options) for entry in entries):
+            raise ValueError("Conditionings with different options can't be batched")
+        out.append([cond, options])
+    return out
+
+
+def _map_batch_tensors(conditioning, count, function):
+    out = []
+    for cond, options in conditioning:
+        cond = function(cond) if cond.shape[0] == count else cond
+        options = {k: function(v) if isinstance(v, torch.Tensor) and v.ndim > 0 and v.shape[0] == count else v for k, v in options.items()}
+        out.append([cond, options])
+    return out
+
+
+def batched_noise(latent_image, seeds, noise_inds=None):
+    """The noise each seed would produce for latent_image on its own, concatenated along the batch dimension."""
+    return torch.cat([comfy.sample.prepare_noise(latent_image, seed, noise_inds) for seed in seeds])
+
+
+class CoalescedCLIPTextEncode:
+    DEV_ONLY = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"clip": ("CLIP",), "texts_json": ("STRING",)}}
+
+    RETURN_TYPES = ("CONDITIONING",)
+    FUNCTION = "encode"
+    CATEGORY = "_for_testing"
+
+    def encode(self, clip, texts_json):
+        texts = json.loads(texts_json)
+        return (batch_conditioning([clip.encode_from_tokens_scheduled(clip.tokenize(text)) for text in texts]),)
+
+
+class CoalescedKSampler:
+    DEV_ONLY = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "sampler_class": ("STRING",),
+                "seeds_json": ("STRING",),
+                "batched_inputs_json": ("STRING",),
+                "model": ("MODEL",),
+                "positive": ("CONDITIONING",),
+                "negative": ("CONDITIONING",),
+                "latent_image": ("LATENT",),
+                "steps": ("INT",),
+                "cfg": ("FLOAT",),
+                "sampler_name": ("STRING",),
+                "scheduler": ("STRING",),
+            },
+            "optional": {
+                "denoise": ("FLOAT",),
+                "add_noise": ("STRING",),
+                "start_at_step": ("INT",),
+                "end_at_step": ("INT",),
+                "return_with_leftover_noise": ("STRING",),
+            },
+        }
+
+    RETURN_TYPES = ("LATENT",)
+    FUNCTION = "sample"
+    CATEGORY = "_for_testing"
+
+    def sample(self, sampler_class, seeds_json, batched_inputs_json, model, positive, negative, latent_image, steps, cfg,
+               sampler_name, scheduler, denoise=1.0, add_noise="enable", start_at_step=None, end_at_step=None,
+               return_with_leftover_noise="disable"):
+        seeds = json.loads(seeds_json)
+        batched_inputs = json.loads(batched_inputs_json)
+        samples = latent_image["samples"]
+        if samples.is_nested:
+            raise ValueError("Nested latents can't be coalesced")
+        per_member = samples.shape[0]
+        fixed = comfy.sample.fix_empty_latent_channels(model, samples, latent_image.get("downscale_ratio_spacial", None))
+
+        latent = latent_image.copy()
+        latent["samples"] = samples.repeat(len(seeds), *([1] * (samples.ndim - 1)))
+        # Per-latent entries cover every member's latents too, so CoalescedSelect can slice them with the samples
+        noise_mask = latent_image.get("noise_mask")
+        if isinstance(noise_mask, torch.Tensor) and noise_mask.ndim > 0 and noise_mask.shape[0] == per_member:
+            latent["noise_mask"] = noise_mask.repeat(len(seeds), *([1] * (noise_mask.ndim - 1)))
+        if "batch_index" in latent_image:
+            latent["batch_index"] = list(latent_image["batch_index"]) * len(seeds)
+        # Batched conditionings have one row per member; give every latent of a member that member's row
+        conds = {"positive": positive, "negative": negative}
+        for name in batched_inputs:
+            conds[name] = _map_batch_tensors(conds[name], len(seeds), lambda t: t.repeat_interleave(per_member, dim=0))
+
+        advanced = sampler_class == "KSamplerAdvanced"
+        disable_noise = advanced and add_noise == "disable"
+        if disable_noise:
+            noise = torch.zeros(latent["samples"].size(), dtype=fixed.dtype, layout=fixed.layout, device="cpu")
+        else:
+            noise = batched_noise(fixed, seeds, latent_image.get("batch_index", None))
+        return nodes.common_ksampler(model, seeds[0], steps, cfg, sampler_name, scheduler, conds["positive"], conds["negative"], latent,
+                                     denoise=denoise, disable_noise=disable_noise,
+                                     start_step=start_at_step if advanced else None, last_step=end_at_step if advanced else None,
+                                     force_full_denoise=advanced and return_with_leftover_noise != "enable", noise=noise)
+
+
+class CoalescedSelect:
+    DEV_ONLY = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("*",), "index": ("INT",), "count": ("INT",)}}
+
+    RETURN_TYPES = ("*",)
+    FUNCTION = "select"
+    CATEGORY = "_for_testing"
+
+    def select(self, value, index, count):
+        def rows(t):
+            size = t.shape[0] // count
+            return t[index * size:(index + 1) * size]
+
+        if isinstance(value, dict):
+            out = value.copy()
+            out["samples"] = rows(value["samples"])
+            # Per-latent entries are sized for the whole merged batch; keep this member's share of them
+            noise_mask = value.get("noise_mask")
+            if isinstance(noise_mask, torch.Tensor) and noise_mask.ndim > 0 and noise_mask.shape[0] == value["samples"].shape[0]:
+                out["noise_mask"] = rows(noise_mask)
+            batch_index = value.get("batch_index")
+            if batch_index is not None and len(batch_index) == value["samples"].shape[0]:
+                size = len(batch_index) // count
+                out["batch_index"] = batch_index[index * size:(index + 1) * size]
+            return (out,)
+        if isinstance(value, list):
+            return (_map_batch_tensors(value, count, lambda t: t[index:index + 1]),)
+        return (rows(value),)
+
+
+NODE_CLASS_MAPPINGS = {
+    "CoalescedCLIPTextEncode": CoalescedCLIPTextEncode,
+    "CoalescedKSampler": CoalescedKSampler,
+    "CoalescedSelect": CoalescedSelect,
+}
+
+# Merged prompts are executed and validated like any other prompt, so the coalescing nodes are registered once here
+nodes.NODE_CLASS_MAPPINGS.update(NODE_CLASS_MAPPINGS)
@@ -0,0 +1,300 @@
+"""
+Persistent tier for the node output cache.
+
+Entries are keyed by the input-signature cache key (the Merkle digest built by CacheKeySetInputSignature) and stored
+as safetensors files, so they survive restarts and can be shared by every ComfyUI process pointed at the same
+directory:
+
+    <root>/<comfyui version>/<key[:2]>/<key>.safetensors
+
+Only plain data is persisted: CPU tensors nested in lists, tuples and str-keyed dicts, plus JSON scalars. Outputs
+holding anything else (models, VAEs, custom objects) stay in the RAM tiers only.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+import comfyui_version
+import nodes
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FORMAT = "comfy-output-cache/1"
+SUFFIX = ".safetensors"
+# Eviction trims the directory to this fraction of the cap so it doesn't run on every write
+EVICTION_TARGET = 0.9
+# Another process may have written since our last scan; re-measure the directory at least this often
+RESCAN_INTERVAL = 60.0
+# Temp files older than this were left behind by a crashed writer
+STALE_TEMP_SECONDS = 3600.0
+
+
+class NotPersistable(Exception):
+    pass
+
+
+def encode_value(value, tensors):
+    """Encode value as JSON-compatible data, moving tensors into `tensors` (name -> tensor)."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if type(value) is torch.Tensor:
+        if value.device.type != "cpu" or value.layout != torch.strided:
+            raise NotPersistable()
+        name = str(len(tensors))
+        tensors[name] = value.detach().contiguous()
+        return {"__tensor__": name}
+    if isinstance(value, list):
+        return [encode_value(v, tensors) for v in value]
+    if isinstance(value, tuple):
+        return {"__tuple__": [encode_value(v, tensors) for v in value]}
+    if isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value):
+            raise NotPersistable()
+        return {"__dict__": {k: encode_value(v, tensors) for k, v in value.items()}}
+    raise NotPersistable()
+
+
+def decode_value(value, tensors):
+    if isinstance(value, list):
+        return [decode_value(v, tensors) for v in value]
+    if isinstance(value, dict):
+        if "__tensor__" in value:
+            return tensors[value["__tensor__"]]
+        if "__tuple__" in value:
+            return tuple(decode_value(v, tensors) for v in value["__tuple__"])
+        return {k: decode_value(v, tensors) for k, v in value["__dict__"].items()}
+    return value
+
+
+class DiskCacheStore:
+    def __init__(self, root, max_bytes, max_pending_writes=8):
+        self.root = root
+        self.directory = os.path.join(root, comfyui_version.__version__)
+        self.max_bytes = max_bytes
+        self.max_pending_writes = max_pending_writes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "skipped": 0, "evicted": 0}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="output-disk-cache")
+        self._approx_bytes = None
+        self._last_scan = 0.0
+
+    def path_for(self, key):
+        name = key.hex()
+        return os.path.join(self.directory, name[:2], name + SUFFIX)
+
+    def load(self, key):
+        """Returns (ui, outputs) for key, or None on a miss."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            self.stats["misses"] += 1
+            return None
+        try:
+            with safe_open(path, framework="pt", device="cpu") as f:
+                metadata = f.metadata() or {}
+                if metadata.get("format") != FORMAT:
+                    raise ValueError(f"unexpected format {metadata.get('format')!r}")
+                tensors = {name: f.get_tensor(name) for name in f.keys()}
+            entry = json.loads(metadata["entry"])
+            ui = decode_value(entry["ui"], tensors)
+            outputs = decode_value(entry["outputs"], tensors)
+        except Exception as e:
+            logging.warning(f"Discarding unreadable output cache entry {path}: {e}")
+            self._remove(path)
+            self.stats["misses"] += 1
+            return None
+        try:
+            # Bump the mtime; eviction drops the least recently used files first
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return ui, outputs
+
+    def save(self, key, ui, outputs):
+        """Queues an entry for writing. Returns False if the value can't be persisted or the writer is backed up."""
+        try:
+            tensors = {}
+            entry = {"ui": encode_value(ui, tensors), "outputs": encode_value(outputs, tensors)}
+        except NotPersistable:
+            return False
+        path = self.path_for(key)
+        with self._lock:
+            if path in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending_writes:
+                self.stats["skipped"] += 1
+                return False
+            self._pending.add(path)
+        metadata = {"format": FORMAT, "entry": json.dumps(entry)}
+        self._executor.submit(self._write, path, tensors, metadata)
+        return True
+
+    def flush(self):
+        """Blocks until all queued writes have finished."""
+        self._executor.submit(lambda: None).result()
+
+    def _write(self, path, tensors, metadata):
+        try:
+            if os.path.exists(path):
+                os.utime(path)
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a unique temp file and rename, so readers (in any process) never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                try:
+                    save_file(tensors, tmp_path, metadata=metadata)
+                except RuntimeError:
+                    # Views sharing storage are rejected by safetensors; give each one its own copy
+                    save_file({k: v.clone() for k, v in tensors.items()}, tmp_path, metadata=metadata)
+                os.replace(tmp_path, path)
+            except BaseException:
+                self._remove(tmp_path)
+                raise
+            self.stats["writes"] += 1
+            self._account(os.path.getsize(path))
+        except Exception as e:
+            logging.warning(f"Failed to write output cache entry {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def _account(self, added):
+        if self._approx_bytes is None or time.monotonic() - self._last_scan > RESCAN_INTERVAL:
+            self._approx_bytes = self._scan_total()
+        else:
+            self._approx_bytes += added
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def _scan(self):
+        entries = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if filename.endswith(".tmp"):
+                    if now - st.st_mtime > STALE_TEMP_SECONDS:
+                        self._remove(path)
+                    continue
+                if filename.endswith(SUFFIX):
+                    entries.append((st.st_mtime, st.st_size, path))
+        self._last_scan = time.monotonic()
+        return entries
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._scan())
+
+    def evict(self):
+        """Deletes the least recently used entries (across all versions) until the directory is under the cap."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Another process is already evicting
+                    self._approx_bytes = None
+                    return
+            entries = sorted(self._scan())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * EVICTION_TARGET
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+                self.stats["evicted"] += 1
+            self._approx_bytes = total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class DiskBackedCache:
+    """
+    Wraps an in-memory output cache: misses fall through to the store, and new results are written through to it.
+
+    Output nodes and NOT_IDEMPOTENT nodes are never persisted, and neither are nodes expanded from subgraphs.
+    """
+    def __init__(self, cache, store, entry_type):
+        self.cache = cache
+        self.store = store
+        self.entry_type = entry_type
+
+    async def set_prompt(self, dynprompt, node_ids, is_changed_cache):
+        await self.cache.set_prompt(dynprompt, node_ids, is_changed_cache)
+
+    def all_node_ids(self):
+        return self.cache.all_node_ids()
+
+    def clean_unused(self):
+        self.cache.clean_unused()
+
+    def poll(self, **kwargs):
+        self.cache.poll(**kwargs)
+
+    async def ensure_subcache_for(self, node_id, children_ids):
+        return await self.cache.ensure_subcache_for(node_id, children_ids)
+
+    def recursive_debug_dump(self):
+        return self.cache.recursive_debug_dump()
+
+    def get_stats(self):
+        stats = self.cache.get_stats() if hasattr(self.cache, "get_stats") else {"type": type(self.cache).__name__}
+        stats["disk"] = dict(self.store.stats)
+        return stats
+
+    def _disk_key(self, node_id):
+        if not self.cache.initialized or self.cache.dynprompt.get_parent_node_id(node_id) is not None:
+            return None
+        key = self.cache.cache_key_set.get_data_key(node_id)
+        if not isinstance(key, bytes):
+            return None
+        class_def = nodes.NODE_CLASS_MAPPINGS[self.cache.dynprompt.get_node(node_id)["class_type"]]
+        if getattr(class_def, "OUTPUT_NODE", False) or getattr(class_def, "NOT_IDEMPOTENT", False):
+            return None
+        return key
+
+    def get(self, node_id):
+        value = self.cache.get(node_id)
+        if value is not None:
+            return value
+        key = self._disk_key(node_id)
+        if key is None:
+            return None
+        loaded = self.store.load(key)
+        if loaded is None:
+            return None
+        value = self.entry_type(ui=loaded[0], outputs=loaded[1])
+        self.cache.set(node_id, value)
+        return value
+
+    def set(self, node_id, value):
+        # ExecutionList writes cached values back on every touch; only new results go to disk
+        is_new = self.cache.get(node_id) is not value
+        self.cache.set(node_id, value)
+        if is_new:
+            key = self._disk_key(node_id)
+            if key is not None:
+                self.store.save(key, value.ui, value.outputs)
@@ -0,0 +1,238 @@
+"""
+Prompt history storage.
+
+The most recent entries are kept in memory, in completion order. When the database is available every entry is also
+written to its prompt_history table by a background thread, so entries that fall out of the in-memory window, or
+were recorded before a restart, can still be looked up and queried by time and status. Stored entries are kept per
+instance (its user directory), so instances sharing one database keep separate histories, and can be limited by count
+and age.
+
+Entries are never modified once stored, so they are handed out without copying.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+
+class HistoryRecord(NamedTuple):
+    seq: int
+    status: Optional[str]
+    completed_at: int
+    entry: dict
+
+
+def _database():
+    """The app.database.db module if sessions can be created, otherwise None."""
+    try:
+        from app.database import db
+    except ImportError:
+        return None
+    return db if db.can_create_session() else None
+
+
+def _user_directory():
+    import folder_paths
+    return folder_paths.get_user_directory()
+
+
+class HistoryStore:
+    def __init__(self, max_hot_items, use_database=True, max_stored_items=0, max_age_days=0, instance=_user_directory):
+        """
+        max_stored_items and max_age_days (0 for no limit) bound the entries kept in the database. instance returns the
+        name the entries are stored under: the user directory, so instances sharing a database keep separate histories.
+        """
+        self.max_hot_items = max_hot_items
+        self.use_database = use_database
+        self.max_stored_items = max_stored_items
+        self.max_age_days = max_age_days
+        self.instance = instance
+        self.lock = threading.RLock()
+        self.hot = OrderedDict()
+        # Orders the in-memory entries only; stored entries are numbered by the database
+        self.next_seq = 1
+        # Database work in submission order: rows to insert, or operations run as operation(session, instance)
+        self._pending = []
+        self._writing = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-history")
+
+    def _db(self):
+        return _database() if self.use_database else None
+
+    def add(self, prompt_id, entry):
+        db = self._db()
+        with self.lock:
+            status = (entry.get("status") or {}).get("status_str")
+            record = HistoryRecord(self.next_seq, status, int(time.time() * 1000), entry)
+            self.next_seq += 1
+            self.hot.pop(prompt_id, None)
+            self.hot[prompt_id] = record
+            while len(self.hot) > self.max_hot_items:
+                self.hot.popitem(last=False)
+            if db is None:
+                return
+            prompt = entry.get("prompt") or ()
+            extra_data = prompt[3] if len(prompt) > 3 and isinstance(prompt[3], dict) else {}
+            self._submit(db, {
+                "prompt_id": prompt_id,
+                "status": status,
+                "created_at": extra_data.get("create_time"),
+                "completed_at": record.completed_at,
+                "entry": entry,
+            })
+
+    def _submit(self, db, work):
+        with self.lock:
+            self._pending.append((self.instance(), work))
+            if not self._writing:
+                self._writing = True
+                self._executor.submit(self._write_pending, db)
+
+    def _write_pending(self, db):
+        from app.history import queries
+        while True:
+            with self.lock:
+                pending, self._pending = self._pending, []
+                if not pending:
+                    self._writing = False
+                    return
+            inserted = set()
+            for (instance, is_row), group in itertools.groupby(pending, key=lambda p: (p[0], isinstance(p[1], dict))):
+                works = [work for _, work in group]
+                if is_row:
+                    self._insert(db, instance, works)
+                    inserted.add(instance)
+                else:
+                    for operation in works:
+                        self._execute(db, lambda session: operation(session, instance))
+            if self.max_stored_items > 0 or self.max_age_days > 0:
+                completed_before = int((time.time() - self.max_age_days * 86400) * 1000) if self.max_age_days > 0 else None
+                for instance in inserted:
+                    self._execute(db, lambda session: queries.prune_entries(
+                        session, instance, max_items=self.max_stored_items or None, completed_before=completed_before))
+
+    def _insert(self, db, instance, rows):
+        from app.history import queries
+        try:
+            with db.create_session() as session:
+                queries.insert_entries(session, instance, rows)
+                session.commit()
+        except Exception:
+            # Usually an entry that can't be serialized; store the others one by one
+            for row in rows:
+                try:
+                    with db.create_session() as session:
+                        queries.insert_entries(session, instance, [row])
+                        session.commit()
+                except Exception as e:
+                    logging.warning(f"Failed to store prompt history entry {row['prompt_id']}: {e}")
+
+    @staticmethod
+    def _execute(db, operation):
+        try:
+            with db.create_session() as session:
+                operation(session)
+                session.commit()
+        except Exception as e:
+            logging.warning(f"Prompt history database operation failed: {e}")
+
+    def flush(self):
+        """Blocks until everything queued for the database has been written."""
+        self._executor.submit(lambda: None).result()
+
+    def get(self, prompt_id):
+        with self.lock:
+            record = self.hot.get(prompt_id)
+        if record is not None:
+            return record.entry
+        db = self._db()
+        if db is None:
+            return None
+        from app.history import queries
+        self.flush()
+        with db.create_session() as session:
+            return queries.get_entry(session, self.instance(), prompt_id)
+
+    def window(self, max_items=None, offset=-1):
+        """The in-memory entries, oldest first: max_items of them starting at offset, or the newest max_items."""
+        with self.lock:
+            if offset < 0 and max_items is not None:
+                offset = len(self.hot) - max_items
+            out = {}
+            for i, (prompt_id, record) in enumerate(self.hot.items()):
+                if i >= offset:
+                    out[prompt_id] = record.entry
+                    if max_items is not None and len(out) >= max_items:
+                        break
+            return out
+
+    def query(self, max_items=None, since=None, before=None, since_time=None, status=None):
+        """
+        Entries in completion order, filtered by status and completion time (ms since the epoch).
+
+        `since` and `before` are prompt_ids used as cursors: with `since` the first max_items entries completed after
+        it are returned, so pollers only fetch new entries; otherwise the newest max_items, optionally those completed
+        before `before`. Unknown cursor prompt_ids are ignored.
+        """
+        db = self._db()
+        if db is None:
+            with self.lock:
+                after_seq = self._hot_seq(since)
+                before_seq = self._hot_seq(before)
+                return dict(self._query_hot(max_items, after_seq, before_seq, since_time, status))
+
+        from app.history import queries
+        self.flush()
+        instance = self.instance()
+        with db.create_session() as session:
+            after_seq = queries.get_seq(session, instance, since) if since is not None else None
+            before_seq = queries.get_seq(session, instance, before) if before is not None else None
+            rows = queries.query_entries(session, instance, limit=max_items, after_seq=after_seq, before_seq=before_seq,
+                                         since_time=since_time, status=status)
+        return dict(rows)
+
+    def _hot_seq(self, prompt_id):
+        record = self.hot.get(prompt_id) if prompt_id is not None else None
+        return record.seq if record is not None else None
+
+    def _query_hot(self, limit, after_seq, before_seq, since_time, status):
+        matches = []
+        # Newest first, so a poller's "since" scan stops at the entries it has already seen
+        for prompt_id, record in reversed(self.hot.items()):
+            if after_seq is not None and record.seq <= after_seq:
+                break
+            if before_seq is not None and record.seq >= before_seq:
+                continue
+            if since_time is not None and record.completed_at <= since_time:
+                continue
+            if status is not None and record.status != status:
+                continue
+            matches.append((prompt_id, record.entry))
+            if limit is not None and after_seq is None and len(matches) >= limit:
+                break
+        matches.reverse()
+        if limit is not None:
+            matches = matches[:limit]
+        return matches
+
+    def delete(self, prompt_id):
+        db = self._db()
+        with self.lock:
+            self.hot.pop(prompt_id, None)
+            if db is None:
+                return
+            from app.history import queries
+            # Queued behind the entries added so far, so a rerun added later under the same prompt_id is kept
+            self._submit(db, lambda session, instance: queries.delete_entries(session, instance, [prompt_id]))
+
+    def clear(self):
+        db = self._db()
+        with self.lock:
+            self.hot.clear()
+            if db is None:
+                return
+            from app.history import queries
+            self._submit(db, lambda session, instance: queries.delete_entries(session, instance, None))
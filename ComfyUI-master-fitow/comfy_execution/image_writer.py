@@ -0,0 +1,154 @@
+"""
+Background encoding and writing of saved images.
+
+Save nodes convert a batch to uint8 once and hand the images to a pool of writer threads (Pillow releases the GIL
+while it compresses), so the next node can run while the batch is still being encoded. Writes are tracked per
+prompt: the executor flushes them before reporting the prompt finished, and /view waits for a file that is still
+being written.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from comfy.cli_args import args
+from comfy_execution.utils import get_executing_context
+
+FORMAT_EXTENSIONS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+# JPEG stores EXIF in a single APP1 segment
+JPEG_MAX_EXIF = 65533
+
+
+class PendingWrite(NamedTuple):
+    node_id: Optional[str]
+    path: str
+    future: Future
+
+
+def build_metadata(image_format: str, prompt=None, extra_pnginfo=None):
+    """The prompt and workflow metadata for a batch: PngInfo for PNG, EXIF bytes otherwise, None if disabled."""
+    if args.disable_metadata:
+        return None
+    if image_format == "png":
+        metadata = PngInfo()
+        if prompt is not None:
+            metadata.add_text("prompt", json.dumps(prompt))
+        if extra_pnginfo is not None:
+            for x in extra_pnginfo:
+                metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+        return metadata
+
+    # Same tags as the animated WebP saver
+    exif = Image.Exif()
+    if prompt is not None:
+        exif[0x0110] = "prompt:{}".format(json.dumps(prompt))  # EXIF 0x0110 = Model
+    if extra_pnginfo is not None:
+        tag = 0x010F  # EXIF 0x010f = Make
+        for key, value in extra_pnginfo.items():
+            exif[tag] = "{}:{}".format(key, json.dumps(value))
+            tag -= 1
+    exif = exif.tobytes()
+    if image_format == "jpeg" and len(exif) > JPEG_MAX_EXIF:
+        logging.warning("The prompt and workflow are too large for JPEG EXIF metadata, saving without them.")
+        return None
+    return exif
+
+
+def write_image(path: str, array, image_format: str = "png", metadata=None, compress_level: int = 4, quality: int = 90):
+    """Encodes a HxWxC uint8 array to path, through a temporary file so a partial image is never visible."""
+    img = Image.fromarray(array)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{threading.get_ident()}.tmp")
+    try:
+        if image_format == "png":
+            img.save(tmp_path, format="PNG", pnginfo=metadata, compress_level=compress_level)
+        elif image_format == "webp":
+            img.save(tmp_path, format="WEBP", quality=quality, exif=metadata or b"")
+        elif image_format == "jpeg":
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img.save(tmp_path, format="JPEG", quality=quality, exif=metadata or b"")
+        else:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ImageWriter:
+    def __init__(self, workers: int, max_pending: Optional[int] = None):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="image-writer") if workers > 0 else None
+        self.lock = threading.Lock()
+        self.pending: dict[str, list[PendingWrite]] = {}
+        self.paths: dict[str, Future] = {}
+        # Bounds the decoded images waiting for a writer when encoding can't keep up
+        self.slots = threading.BoundedSemaphore(max_pending or max(1, workers) * 4)
+
+    def submit(self, path: str, write: Callable[..., None], *write_args):
+        """
+        Runs write(path, *write_args) on the pool. Outside of a prompt, or with no writer threads, it runs right away.
+        """
+        context = get_executing_context()
+        if self.executor is None or context is None:
+            write(path, *write_args)
+            return
+
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(write, path, *write_args)
+        except BaseException:
+            self.slots.release()
+            raise
+        key = os.path.normpath(path)
+        with self.lock:
+            self.pending.setdefault(context.prompt_id, []).append(PendingWrite(context.node_id, path, future))
+            self.paths[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+
+    def is_pending(self, path: str) -> bool:
+        return os.path.normpath(path) in self.paths
+
+    def _done(self, key, future):
+        self.slots.release()
+        with self.lock:
+            if self.paths.get(key) is future:
+                del self.paths[key]
+
+    def wait_for(self, path: str):
+        """Blocks until a pending write of path, if any, has finished."""
+        with self.lock:
+            future = self.paths.get(os.path.normpath(path))
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def flush(self, prompt_id: str) -> list[tuple[Optional[str], BaseException]]:
+        """Waits for every image written by the prompt; returns the (node_id, exception) of the writes that failed."""
+        with self.lock:
+            writes = self.pending.pop(prompt_id, [])
+        failures = []
+        for write in writes:
+            try:
+                write.future.result()
+            except Exception as e:
+                logging.error(f"Failed to save {write.path}: {e}")
+                failures.append((write.node_id, e))
+        return failures
+
+
+def default_workers() -> int:
+    return max(1, min(8, (os.cpu_count() or 2) // 2))
+
+
+writer = ImageWriter(default_workers() if args.save_image_workers is None else args.save_image_workers)
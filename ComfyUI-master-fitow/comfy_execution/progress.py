@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import threading
 from typing import TypedDict, Dict, Optional, Tuple
 from typing_extensions import override
 from PIL import Image
@@ -11,6 +12,7 @@ if TYPE_CHECKING:
     from comfy_execution.graph import DynamicPrompt
 from protocol import BinaryEventTypes
 from comfy_api import feature_flags
+from comfy_execution.utils import get_executing_context
 
 PreviewImageTuple = Tuple[str, Image.Image, Optional[int]]
 
@@ -321,16 +323,25 @@ class ProgressRegistry:
 
 # Global registry instance
 global_progress_registry: ProgressRegistry | None = None
+# With several prompt workers each thread tracks its own prompt
+thread_progress_state = threading.local()
+progress_registries: Dict[str, ProgressRegistry] = {}
 
 def reset_progress_state(prompt_id: str, dynprompt: "DynamicPrompt") -> None:
     global global_progress_registry
 
-    # Reset existing handlers if registry exists
-    if global_progress_registry is not None:
-        global_progress_registry.reset_handlers()
+    # Reset existing handlers if this thread already has a registry
+    previous = getattr(thread_progress_state, "registry", None)
+    if previous is not None:
+        previous.reset_handlers()
+        if progress_registries.get(previous.prompt_id) is previous:
+            del progress_registries[previous.prompt_id]
 
     # Create new registry
-    global_progress_registry = ProgressRegistry(prompt_id, dynprompt)
+    registry = ProgressRegistry(prompt_id, dynprompt)
+    thread_progress_state.registry = registry
+    progress_registries[prompt_id] = registry
+    global_progress_registry = registry
 
 
 def add_progress_handler(handler: ProgressHandler) -> None:
@@ -341,6 +352,15 @@ def add_progress_handler(handler: ProgressHandler) -> None:
 
 def get_progress_state() -> ProgressRegistry:
     global global_progress_registry
+    # Nodes may report progress from helper threads; the executing context says which prompt they belong to
+    context = get_executing_context()
+    if context is not None:
+        registry = progress_registries.get(context.prompt_id)
+        if registry is not None:
+            return registry
+    registry = getattr(thread_progress_state, "registry", None)
+    if registry is not None:
+        return registry
     if global_progress_registry is None:
         from comfy_execution.graph import DynamicPrompt
 
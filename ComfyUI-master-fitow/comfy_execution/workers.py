@@ -0,0 +1,66 @@
+"""
+Support for running several prompt workers in one process.
+
+Each worker thread has its own PromptExecutor (and so its own caches) and pulls from the shared PromptQueue. The
+executor and the progress handlers keep the client and node being executed on the server object, so every worker
+gets a WorkerServer: a view of the PromptServer with its own copy of that state.
+"""
+import threading
+from typing import Optional
+
+current_worker = threading.local()
+flags_lock = threading.Lock()
+
+
+class WorkerServer:
+    def __init__(self, server, index):
+        self.server = server
+        self.index = index
+        self.client_id = None
+        self.last_node_id = None
+        self.last_prompt_id = None
+        # Set while the worker is executing a prompt
+        self.running_prompt_ids = ()
+        self.thread_id = None
+        self.pending_flags = {}
+
+    def __getattr__(self, name):
+        return getattr(self.server, name)
+
+    def bind_thread(self):
+        self.thread_id = threading.get_ident()
+        current_worker.server = self
+
+
+def get_current_worker() -> Optional[WorkerServer]:
+    return getattr(current_worker, "server", None)
+
+
+def distribute_flags(workers, worker, flags):
+    """
+    Queue flags (unload_models, free_memory) are taken by whichever worker polls first; hand them to every other
+    worker too and return the flags this worker should apply now.
+    """
+    with flags_lock:
+        if flags:
+            for other in workers:
+                if other is not worker:
+                    other.pending_flags.update(flags)
+        flags = {**worker.pending_flags, **flags}
+        worker.pending_flags = {}
+    return flags
+
+
+def interrupt_workers(workers, prompt_id=None):
+    """Interrupts the workers running prompt_id, or every busy worker. Returns whether any worker was interrupted."""
+    # main.py imports this module before the device environment is set up
+    import comfy.model_management
+
+    interrupted = False
+    for worker in workers:
+        if worker.thread_id is None or not worker.running_prompt_ids:
+            continue
+        if prompt_id is None or prompt_id in worker.running_prompt_ids:
+            comfy.model_management.interrupt_current_processing(thread_id=worker.thread_id)
+            interrupted = True
+    return interrupted
@@ -1218,7 +1218,7 @@ class SaveLoRA(io.ComfyNode):
     def execute(cls, lora, prefix, steps=None):
         output_dir = folder_paths.get_output_directory()
         full_output_folder, filename, counter, subfolder, filename_prefix = (
-            folder_paths.get_save_image_path(prefix, output_dir)
+            folder_paths.get_save_image_path(prefix, output_dir, count=1)
         )
         if steps is None:
             output_checkpoint = f"{filename}_{counter:05}_.safetensors"
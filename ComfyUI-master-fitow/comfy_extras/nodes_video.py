@@ -33,7 +33,7 @@ class SaveWEBM(io.ComfyNode):
     @classmethod
     def execute(cls, images, codec, fps, filename_prefix, crf) -> io.NodeOutput:
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(
-            filename_prefix, folder_paths.get_output_directory(), images[0].shape[1], images[0].shape[0]
+            filename_prefix, folder_paths.get_output_directory(), images[0].shape[1], images[0].shape[0], count=1
         )
 
         file = f"{filename}_{counter:05}_.webm"
@@ -91,7 +91,8 @@ class SaveVideo(io.ComfyNode):
             filename_prefix,
             folder_paths.get_output_directory(),
             width,
-            height
+            height,
+            count=1,
         )
         saved_metadata = None
         if not args.disable_metadata:
@@ -149,6 +150,9 @@ class GetVideoComponents(io.ComfyNode):
             description="Extracts all components from a video: frames, audio, and framerate.",
             inputs=[
                 io.Video.Input("video", tooltip="The video to extract components from."),
+                io.Int.Input("start_frame", default=0, min=0, max=0xffffffff, optional=True, tooltip="Index of the first frame to extract. Decoding starts at the nearest preceding keyframe instead of the beginning of the video."),
+                io.Int.Input("frame_count", default=0, min=0, max=0xffffffff, optional=True, tooltip="Maximum number of frames to extract. 0 extracts all remaining frames."),
+                io.Int.Input("stride", default=1, min=1, max=1000, optional=True, tooltip="Extract every Nth frame. The output fps is divided by the stride."),
             ],
             outputs=[
                 io.Image.Output(display_name="images"),
@@ -158,8 +162,12 @@ class GetVideoComponents(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, video: Input.Video) -> io.NodeOutput:
-        components = video.get_components()
+    def execute(cls, video: Input.Video, start_frame: int = 0, frame_count: int = 0, stride: int = 1) -> io.NodeOutput:
+        if start_frame == 0 and frame_count == 0 and stride == 1:
+            components = video.get_components()
+        else:
+            end_frame = start_frame + (frame_count - 1) * stride + 1 if frame_count > 0 else None
+            components = video.get_components_range(start_frame, end_frame, stride)
         return io.NodeOutput(components.images, components.audio, float(components.frame_rate))
 
 
@@ -13,6 +13,7 @@ import asyncio
 import torch
 
 import comfy.model_management
+from comfy.cli_args import args
 from latent_preview import set_preview_method
 import nodes
 from comfy_execution.caching import (
@@ -24,6 +25,8 @@ from comfy_execution.caching import (
     LRUCache,
     RAMPressureCache,
 )
+from comfy_execution import coalesce, image_writer
+from comfy_execution.disk_cache import DiskBackedCache, DiskCacheStore
 from comfy_execution.graph import (
     DynamicPrompt,
     ExecutionBlocker,
@@ -31,6 +34,7 @@ from comfy_execution.graph import (
     get_input_info,
 )
 from comfy_execution.graph_utils import GraphBuilder, is_link
+from comfy_execution.history import HistoryStore
 from comfy_execution.validation import validate_node_input
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
 from comfy_execution.utils import CurrentNodeContext
@@ -109,7 +113,9 @@ class CacheSet:
             logging.info("Disabling intermediate node cache.")
         elif cache_type == CacheType.RAM_PRESSURE:
             cache_ram = cache_args.get("ram", 16.0)
-            self.init_ram_cache(cache_ram)
+            max_ram_bytes = int(cache_args.get("ram_max", 0) * (1024 ** 3))
+            max_vram_bytes = int(cache_args.get("vram_max", 0) * (1024 ** 3))
+            self.init_ram_cache(cache_ram, max_ram_bytes, max_vram_bytes)
             logging.info("Using RAM pressure cache.")
         elif cache_type == CacheType.LRU:
             cache_size = cache_args.get("lru", 0)
@@ -118,6 +124,10 @@ class CacheSet:
         else:
             self.init_classic_cache()
 
+        if cache_args and cache_args.get("disk") and cache_type != CacheType.NONE:
+            self.init_disk_cache(cache_args["disk"], cache_args.get("disk_size", 20.0))
+            logging.info(f"Using disk cache at {cache_args['disk']}")
+
         self.all = [self.outputs, self.objects]
 
     # Performs like the old cache -- dump data ASAP
@@ -129,14 +139,24 @@ class CacheSet:
         self.outputs = LRUCache(CacheKeySetInputSignature, max_size=cache_size)
         self.objects = HierarchicalCache(CacheKeySetID)
 
-    def init_ram_cache(self, min_headroom):
-        self.outputs = RAMPressureCache(CacheKeySetInputSignature)
+    def init_ram_cache(self, min_headroom, max_ram_bytes=0, max_vram_bytes=0):
+        self.outputs = RAMPressureCache(CacheKeySetInputSignature, max_ram_bytes=max_ram_bytes, max_vram_bytes=max_vram_bytes)
         self.objects = HierarchicalCache(CacheKeySetID)
 
     def init_null_cache(self):
         self.outputs = NullCache()
         self.objects = NullCache()
 
+    # Persistent tier below the output cache, shared across restarts and processes using the same directory
+    def init_disk_cache(self, directory, size_gb):
+        store = DiskCacheStore(directory, max_bytes=int(size_gb * (1024 ** 3)))
+        self.outputs = DiskBackedCache(self.outputs, store, CacheEntry)
+
+    def get_stats(self):
+        if hasattr(self.outputs, "get_stats"):
+            return self.outputs.get_stats()
+        return {"type": type(self.outputs).__name__}
+
     def recursive_debug_dump(self):
         result = {
             "outputs": self.outputs.recursive_debug_dump(),
@@ -178,14 +198,21 @@ def get_input_data(inputs, class_def, unique_id, execution_list=None, dynprompt=
         elif input_category is not None or (is_v3 and class_def.ACCEPT_ALL_INPUTS):
             input_data_all[x] = [input_data]
 
+    original_prompt = dynprompt.get_original_prompt() if dynprompt is not None else {}
+    extra_pnginfo = extra_data.get('extra_pnginfo', None)
+    coalesce_member = coalesce.get_member(dynprompt, unique_id, extra_data)
+    if coalesce_member is not None:
+        original_prompt = coalesce_member["prompt"]
+        extra_pnginfo = coalesce_member["extra_pnginfo"]
+
     if is_v3:
         if hidden is not None:
             if io.Hidden.prompt.name in hidden:
-                hidden_inputs_v3[io.Hidden.prompt] = dynprompt.get_original_prompt() if dynprompt is not None else {}
+                hidden_inputs_v3[io.Hidden.prompt] = original_prompt
             if io.Hidden.dynprompt.name in hidden:
                 hidden_inputs_v3[io.Hidden.dynprompt] = dynprompt
             if io.Hidden.extra_pnginfo.name in hidden:
-                hidden_inputs_v3[io.Hidden.extra_pnginfo] = extra_data.get('extra_pnginfo', None)
+                hidden_inputs_v3[io.Hidden.extra_pnginfo] = extra_pnginfo
             if io.Hidden.unique_id.name in hidden:
                 hidden_inputs_v3[io.Hidden.unique_id] = unique_id
             if io.Hidden.auth_token_comfy_org.name in hidden:
@@ -197,11 +224,11 @@ def get_input_data(inputs, class_def, unique_id, execution_list=None, dynprompt=
             h = valid_inputs["hidden"]
             for x in h:
                 if h[x] == "PROMPT":
-                    input_data_all[x] = [dynprompt.get_original_prompt() if dynprompt is not None else {}]
+                    input_data_all[x] = [original_prompt]
                 if h[x] == "DYNPROMPT":
                     input_data_all[x] = [dynprompt]
                 if h[x] == "EXTRA_PNGINFO":
-                    input_data_all[x] = [extra_data.get('extra_pnginfo', None)]
+                    input_data_all[x] = [extra_pnginfo]
                 if h[x] == "UNIQUE_ID":
                     input_data_all[x] = [unique_id]
                 if h[x] == "AUTH_TOKEN_COMFY_ORG":
@@ -669,6 +696,22 @@ class PromptExecutor:
             }
             self.add_message("execution_error", mes, broadcast=False)
 
+    def flush_saved_images(self, prompt_id, dynamic_prompt, current_outputs, executed):
+        """Waits for the images the prompt is still writing in the background; a failed write fails the prompt."""
+        failures = image_writer.writer.flush(prompt_id)
+        if not failures:
+            return True
+        node_id, ex = failures[0]
+        error = {
+            "node_id": dynamic_prompt.get_real_node_id(node_id),
+            "exception_message": str(ex),
+            "exception_type": full_type_name(type(ex)),
+            "traceback": traceback.format_tb(ex.__traceback__),
+            "current_inputs": {},
+        }
+        self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
+        return False
+
     def execute(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
         asyncio.run(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
 
@@ -731,7 +774,11 @@ class PromptExecutor:
                 self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
             else:
                 # Only execute when the while-loop ends without break
-                self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+                self.success = self.flush_saved_images(prompt_id, dynamic_prompt, current_outputs, executed)
+                if self.success:
+                    self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+            # After a failure, still let the images saved before it finish writing
+            image_writer.writer.flush(prompt_id)
 
             ui_outputs = {}
             meta_outputs = {}
@@ -746,6 +793,82 @@ class PromptExecutor:
             if comfy.model_management.DISABLE_SMART_MEMORY:
                 comfy.model_management.unload_all_models()
 
+    def execution_status(self):
+        return PromptQueue.ExecutionStatus(
+            status_str='success' if self.success else 'error',
+            completed=self.success,
+            messages=self.status_messages)
+
+    def execute_coalesced(self, members):
+        """
+        Executes several queued prompts (coalesce.CoalesceMember, sharing a coalesce_key) as one batched run.
+        Falls back to running them one at a time when they can't be merged, or when the merged run fails in one of
+        the coalescing nodes. When it fails in nodes copied for some members, only those members fail and the others
+        are run again without them. Returns a (history_result, ExecutionStatus) per member.
+        """
+        merged = coalesce.merge_prompts(members)
+        if merged is not None:
+            self.execute(merged.prompt, members[0].prompt_id, merged.extra_data, merged.execute_outputs)
+            if self.success:
+                return self.split_coalesced_results(members, merged, set())
+            if not coalesce.failed_in_coalesced_node(self.status_messages):
+                failed = merged.failed_members(self.status_messages)
+                results = self.split_coalesced_results(members, merged, failed)
+                retry = [index for index in range(len(members)) if index not in failed]
+                if retry:
+                    logging.warning("Coalesced execution failed for {} of {} prompts, running the others again.".format(len(failed), len(members)))
+                    for index, result in zip(retry, self.execute_coalesced([members[index] for index in retry])):
+                        results[index] = result
+                return results
+            logging.warning("Coalesced execution failed, running the prompts one at a time.")
+
+        results = []
+        for member in members:
+            self.execute(member.prompt, member.prompt_id, member.extra_data, member.execute_outputs)
+            results.append((self.history_result, self.execution_status()))
+        return results
+
+    def split_coalesced_results(self, members, merged, failed):
+        """
+        Splits the merged run into a result per member. After a failed run, members that are not in failed get None,
+        as the error stopped their part of the run too.
+        """
+        results = []
+        for index, (member, history_result) in enumerate(zip(members, merged.split_history(self.history_result))):
+            if not self.success and index not in failed:
+                results.append(None)
+                continue
+            if index == 0:
+                # The merged run was executed (and reported to the client) as the first member
+                results.append((history_result, self.execution_status()))
+                continue
+
+            messages = []
+            client_id = member.extra_data.get("client_id")
+            def send(event, data, record=True):
+                data = {**data, "prompt_id": member.prompt_id, "timestamp": int(time.time() * 1000)}
+                if record:
+                    messages.append((event, data))
+                if client_id is not None:
+                    self.server.send_sync(event, data, client_id)
+
+            send("execution_start", {})
+            if self.success:
+                for node_id, output in history_result["outputs"].items():
+                    display_node = history_result["meta"].get(node_id, {}).get("display_node", node_id)
+                    send("executed", {"node": node_id, "display_node": display_node, "output": output}, record=False)
+                send("execution_success", {})
+            else:
+                node_map = merged.node_maps[index]
+                for event, data in self.status_messages:
+                    if event in ("execution_error", "execution_interrupted"):
+                        send(event, {**data, "node_id": node_map.get(data["node_id"], data["node_id"])})
+            results.append((history_result, PromptQueue.ExecutionStatus(
+                status_str='success' if self.success else 'error',
+                completed=self.success,
+                messages=messages)))
+        return results
+
 
 async def validate_inputs(prompt_id, prompt, item, validated):
     unique_id = item
@@ -1108,35 +1231,145 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
 MAXIMUM_HISTORY_SIZE = 10000
 
 class PromptQueue:
+    class Snapshot(NamedTuple):
+        version: int
+        running: tuple
+        queued: tuple
+
     def __init__(self, server):
         self.server = server
         self.mutex = threading.RLock()
         self.not_empty = threading.Condition(self.mutex)
         self.task_counter = 0
+        # Heap of queue items. Deleted items stay in it as tombstones until they are popped or the heap is compacted
         self.queue = []
+        # prompt_id -> the live queue item, or a list of them when several share the id. Storing the item itself keeps
+        # put() from allocating a container per prompt, which long queues would otherwise pay for in GC passes
+        self.queued = {}
+        self.queued_count = 0
+        self.tombstones = 0
         self.currently_running = {}
-        self.history = {}
+        self.history = HistoryStore(MAXIMUM_HISTORY_SIZE, max_stored_items=args.history_max_items, max_age_days=args.history_max_days)
         self.flags = {}
+        self.coalesce_keys = {}
+        # Bumped on every change to the queued or running items
+        self.version = 0
+        self.snapshot = None
+
+    def _changed(self):
+        self.version += 1
+        self.snapshot = None
+
+    def _queued_items(self, prompt_id):
+        entry = self.queued.get(prompt_id)
+        if entry is None:
+            return ()
+        return entry if isinstance(entry, list) else (entry,)
+
+    def _is_queued(self, item):
+        return any(x is item for x in self._queued_items(item[1]))
+
+    def _iter_queued(self):
+        for entry in self.queued.values():
+            if isinstance(entry, list):
+                yield from entry
+            else:
+                yield entry
+
+    def _unindex(self, item):
+        items = [x for x in self._queued_items(item[1]) if x is not item]
+        if len(items) > 1:
+            self.queued[item[1]] = items
+        elif items:
+            self.queued[item[1]] = items[0]
+        else:
+            del self.queued[item[1]]
+        self.queued_count -= 1
+        self.coalesce_keys.pop(item[1], None)
+
+    def _pop(self):
+        # Callers check queued_count first, so a live item is always found
+        while True:
+            item = heapq.heappop(self.queue)
+            if self._is_queued(item):
+                self._unindex(item)
+                return item
+            self.tombstones -= 1
+
+    def _delete(self, item):
+        self._unindex(item)
+        self.tombstones += 1
+        # Rebuild once tombstones outnumber live items, which keeps deletion amortized O(log n)
+        if self.tombstones > max(64, self.queued_count):
+            self.queue = list(self._iter_queued())
+            heapq.heapify(self.queue)
+            self.tombstones = 0
+
+    def _start(self, item):
+        i = self.task_counter
+        # Queue items are treated as immutable, so the running copy is the item itself
+        self.currently_running[i] = item
+        self.task_counter += 1
+        return i
 
     def put(self, item):
         with self.mutex:
             heapq.heappush(self.queue, item)
+            existing = self.queued.get(item[1])
+            if existing is None:
+                self.queued[item[1]] = item
+            elif isinstance(existing, list):
+                existing.append(item)
+            else:
+                self.queued[item[1]] = [existing, item]
+            self.queued_count += 1
+            self._changed()
             self.server.queue_updated()
             self.not_empty.notify()
 
     def get(self, timeout=None):
         with self.not_empty:
-            while len(self.queue) == 0:
+            while self.queued_count == 0:
                 self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
+                if timeout is not None and self.queued_count == 0:
                     return None
-            item = heapq.heappop(self.queue)
-            i = self.task_counter
-            self.currently_running[i] = copy.deepcopy(item)
-            self.task_counter += 1
+            item = self._pop()
+            i = self._start(item)
+            self._changed()
             self.server.queue_updated()
             return (item, i)
 
+    def get_coalesced(self, timeout=None, max_items=1, key_function=None):
+        """
+        Like get(), but also takes up to max_items - 1 further queued items whose key_function(item) equals that of
+        the first one, in queue order. Returns a list of (item, item_id), empty on timeout.
+        """
+        with self.not_empty:
+            while self.queued_count == 0:
+                self.not_empty.wait(timeout=timeout)
+                if timeout is not None and self.queued_count == 0:
+                    return []
+            items = [self._pop()]
+            key = None
+            if max_items > 1 and key_function is not None:
+                key = key_function(items[0])
+            if key is not None:
+                matches = sorted((x for x in self._iter_queued() if self._coalesce_key(x, key_function) == key), key=lambda x: x[:2])
+                for x in matches[:max_items - 1]:
+                    self._delete(x)
+                    items.append(x)
+
+            result = [(item, self._start(item)) for item in items]
+            self._changed()
+            self.server.queue_updated()
+            return result
+
+    def _coalesce_key(self, item, key_function):
+        # Keys are computed once per queued prompt
+        if item[1] not in self.coalesce_keys:
+            self.coalesce_keys[item[1]] = key_function(item) if key_function is not None else None
+        return self.coalesce_keys[item[1]]
+
     class ExecutionStatus(NamedTuple):
         status_str: Literal['success', 'error']
         completed: bool
@@ -1146,8 +1379,6 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
 
             status_dict: Optional[dict] = None
             if status is not None:
@@ -1156,85 +1387,105 @@ class PromptQueue:
             if process_item is not None:
                 prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
+            entry = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
+            entry.update(history_result)
+            self.history.add(prompt[1], entry)
+            self._changed()
             self.server.queue_updated()
 
-    # Note: slow
-    def get_current_queue(self):
+    def get_snapshot(self):
+        """
+        Returns the running and queued items as tuples, rebuilt only after the queue changes. Both the snapshot and
+        the items in it are shared between callers and must not be modified.
+        """
         with self.mutex:
-            out = []
-            for x in self.currently_running.values():
-                out += [x]
-            return (out, copy.deepcopy(self.queue))
+            if self.snapshot is None:
+                queued = tuple(x for x in self.queue if self._is_queued(x)) if self.tombstones else tuple(self.queue)
+                self.snapshot = PromptQueue.Snapshot(self.version, tuple(self.currently_running.values()), queued)
+            return self.snapshot
+
+    def get_current_queue(self):
+        snapshot = self.get_snapshot()
+        return (list(snapshot.running), list(snapshot.queued))
 
     # read-safe as long as queue items are immutable
     def get_current_queue_volatile(self):
+        snapshot = self.get_snapshot()
+        return (snapshot.running, snapshot.queued)
+
+    def get_queue_items(self, prompt_id):
+        """Returns the (running, queued) items for prompt_id without building a snapshot."""
         with self.mutex:
-            running = [x for x in self.currently_running.values()]
-            queued = copy.copy(self.queue)
-            return (running, queued)
+            running = [x for x in self.currently_running.values() if x[1] == prompt_id]
+            return (running, list(self._queued_items(prompt_id)))
 
     def get_tasks_remaining(self):
         with self.mutex:
-            return len(self.queue) + len(self.currently_running)
+            return self.queued_count + len(self.currently_running)
 
     def wipe_queue(self):
         with self.mutex:
             self.queue = []
+            self.queued = {}
+            self.queued_count = 0
+            self.tombstones = 0
+            self.coalesce_keys = {}
+            self._changed()
             self.server.queue_updated()
 
     def delete_queue_item(self, function):
         with self.mutex:
-            for x in range(len(self.queue)):
-                if function(self.queue[x]):
-                    if len(self.queue) == 1:
-                        self.wipe_queue()
-                    else:
-                        self.queue.pop(x)
-                        heapq.heapify(self.queue)
+            for item in self._iter_queued():
+                if function(item):
+                    self._delete(item)
+                    self._changed()
                     self.server.queue_updated()
                     return True
         return False
 
-    def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
+    def delete_queue_items(self, prompt_ids):
+        """Deletes the queued items with the given prompt_ids. Returns how many were deleted."""
         with self.mutex:
-            if prompt_id is None:
-                out = {}
-                i = 0
-                if offset < 0 and max_items is not None:
-                    offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        p = self.history[k]
-                        if map_function is not None:
-                            p = map_function(p)
-                        out[k] = p
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
-                return out
-            elif prompt_id in self.history:
-                p = self.history[prompt_id]
-                if map_function is None:
-                    p = copy.deepcopy(p)
-                else:
-                    p = map_function(p)
-                return {prompt_id: p}
-            else:
+            deleted = 0
+            for prompt_id in prompt_ids:
+                for item in self._queued_items(prompt_id):
+                    self._delete(item)
+                    deleted += 1
+            if deleted:
+                self._changed()
+                self.server.queue_updated()
+            return deleted
+
+    def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None, since=None, before=None, since_time=None, status=None):
+        """
+        Without filters this returns the in-memory window as before. With since/before (prompt_id cursors), since_time
+        or status the query also covers entries only kept in the database; see HistoryStore.query.
+        """
+        if prompt_id is not None:
+            p = self.history.get(prompt_id)
+            if p is None:
                 return {}
+            if map_function is not None:
+                p = map_function(p)
+            return {prompt_id: p}
+
+        if since is None and before is None and since_time is None and status is None:
+            out = self.history.window(max_items=max_items, offset=offset)
+        else:
+            out = self.history.query(max_items=max_items, since=since, before=before, since_time=since_time, status=status)
+        if map_function is not None:
+            out = {k: map_function(p) for k, p in out.items()}
+        return out
 
     def wipe_history(self):
-        with self.mutex:
-            self.history = {}
+        self.history.clear()
 
     def delete_history_item(self, id_to_delete):
-        with self.mutex:
-            self.history.pop(id_to_delete, None)
+        self.history.delete(id_to_delete)
 
     def set_flag(self, name, data):
         with self.mutex:
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import os
+import json
 import time
 import mimetypes
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Literal, List
 from collections.abc import Collection
 
@@ -89,6 +92,28 @@ class CacheHelper:
 
 cache_helper = CacheHelper()
 
+_dependency_tracking = threading.local()
+
+@contextmanager
+def track_dependencies():
+    """
+    Records what the code inside the block reads through this module, in the current thread. Yields a set that gets
+    ("filename_list", folder_name) for file lists and model folders and ("directory", path) for the input, output and
+    temp directories.
+    """
+    dependencies = set()
+    previous = getattr(_dependency_tracking, "dependencies", None)
+    _dependency_tracking.dependencies = dependencies
+    try:
+        yield dependencies
+    finally:
+        _dependency_tracking.dependencies = previous
+
+def _record_dependency(kind: str, name: str) -> None:
+    dependencies = getattr(_dependency_tracking, "dependencies", None)
+    if dependencies is not None:
+        dependencies.add((kind, name))
+
 extension_mimetypes_cache = {
     "webp" : "image",
     "fbx" : "model",
@@ -119,14 +144,17 @@ def set_input_directory(input_dir: str) -> None:
 
 def get_output_directory() -> str:
     global output_directory
+    _record_dependency("directory", output_directory)
     return output_directory
 
 def get_temp_directory() -> str:
     global temp_directory
+    _record_dependency("directory", temp_directory)
     return temp_directory
 
 def get_input_directory() -> str:
     global input_directory
+    _record_dependency("directory", input_directory)
     return input_directory
 
 def get_user_directory() -> str:
@@ -136,6 +164,28 @@ def set_user_directory(user_dir: str) -> None:
     global user_directory
     user_directory = user_dir
 
+def set_base_directory(base_dir: str) -> dict[str, str]:
+    """
+    Re-point the output, temp, input and user directories at runtime, as if the
+    server had been started with --base-directory. Model and custom node paths are
+    left untouched since they are loaded once at startup.
+    """
+    base_dir = os.path.abspath(base_dir)
+    dirs = {
+        "output": os.path.join(base_dir, "output"),
+        "temp": os.path.join(base_dir, "temp"),
+        "input": os.path.join(base_dir, "input"),
+        "user": os.path.join(base_dir, "user"),
+    }
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    set_output_directory(dirs["output"])
+    set_temp_directory(dirs["temp"])
+    set_input_directory(dirs["input"])
+    set_user_directory(dirs["user"])
+    filename_list_cache.clear()
+    return dirs
+
 
 # System User Protection - Protects system directories from HTTP endpoint access
 # System Users are internal-only users that cannot be accessed via HTTP endpoints.
@@ -298,6 +348,7 @@ def add_model_folder_path(folder_name: str, full_folder_path: str, is_default: b
 
 def get_folder_paths(folder_name: str) -> list[str]:
     folder_name = map_legacy(folder_name)
+    _record_dependency("filename_list", folder_name)
     return folder_names_and_paths[folder_name][0][:]
 
 def recursive_search(directory: str, excluded_dir_names: list[str] | None=None) -> tuple[list[str], dict[str, float]]:
@@ -417,6 +468,7 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
 
 def get_filename_list(folder_name: str) -> list[str]:
     folder_name = map_legacy(folder_name)
+    _record_dependency("filename_list", folder_name)
     out = cached_filename_list_(folder_name)
     if out is None:
         out = get_filename_list_(folder_name)
@@ -425,16 +477,122 @@ def get_filename_list(folder_name: str) -> list[str]:
     cache_helper.set(folder_name, out)
     return list(out[0])
 
-def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
-    def map_filename(filename: str) -> tuple[int, str]:
-        prefix_len = len(os.path.basename(filename_prefix))
-        prefix = filename[:prefix_len + 1]
+def _scan_counter(full_output_folder: str, filename: str) -> int:
+    """The counter after the highest one used by files named like {filename}_{counter}_ in the folder."""
+    def map_filename(name: str) -> tuple[int, str]:
+        prefix_len = len(filename)
+        prefix = name[:prefix_len + 1]
         try:
-            digits = int(filename[prefix_len + 1:].split('_')[0])
+            digits = int(name[prefix_len + 1:].split('_')[0])
         except:
             digits = 0
         return digits, prefix
 
+    try:
+        return max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
+    except ValueError:
+        return 1
+
+class SaveCounterIndex:
+    """
+    Next output counter per (folder, filename prefix), so that saving doesn't list the whole folder every time.
+
+    A prefix is seeded with one scan of its folder. Counters are kept in a small state file in each folder and
+    updated under a lock file created with O_EXCL, so several ComfyUI processes saving to the same folder never get
+    the same counter. The temp directory is only indexed in memory: its preview prefixes are random per process.
+    """
+    STATE_FILE = ".comfyui_counters.json"
+    LOCK_FILE = ".comfyui_counters.lock"
+
+    def __init__(self, lock_timeout: float = 10.0, stale_lock_age: float = 60.0):
+        self.lock = threading.Lock()
+        self.memory: dict[str, dict[str, int]] = {}
+        self.lock_timeout = lock_timeout
+        self.stale_lock_age = stale_lock_age
+
+    def reserve(self, full_output_folder: str, filename: str, count: int | None = None, shared: bool = True) -> int:
+        """
+        Returns the first of `count` consecutive counters for the prefix. With count=None the caller may use any
+        number of them, so the next reservation for the prefix scans the folder again.
+        """
+        with self.lock:
+            if not shared:
+                return self._next(self.memory.setdefault(os.path.normcase(full_output_folder), {}), full_output_folder, filename, count)
+            try:
+                with self._file_lock(full_output_folder):
+                    counters = self._read(full_output_folder)
+                    counter = self._next(counters, full_output_folder, filename, count)
+                    self._write(full_output_folder, counters)
+                    return counter
+            except OSError as e:
+                logging.debug(f"Output counter index unavailable for {full_output_folder}, scanning it: {e}")
+                return _scan_counter(full_output_folder, filename)
+
+    @staticmethod
+    def _next(counters: dict[str, int], full_output_folder: str, filename: str, count: int | None) -> int:
+        key = os.path.normcase(filename)
+        counter = counters.get(key)
+        if counter is None:
+            counter = _scan_counter(full_output_folder, filename)
+        if count is None:
+            counters.pop(key, None)
+        else:
+            counters[key] = counter + count
+        return counter
+
+    @contextmanager
+    def _file_lock(self, full_output_folder: str):
+        path = os.path.join(full_output_folder, self.LOCK_FILE)
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > self.stale_lock_age:
+                        # Left behind by a process that died while holding it
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {path}")
+                time.sleep(0.001)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _read(self, full_output_folder: str) -> dict[str, int]:
+        try:
+            with open(os.path.join(full_output_folder, self.STATE_FILE), "r", encoding="utf-8") as f:
+                counters = json.load(f)
+            return counters if isinstance(counters, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.warning(f"Ignoring invalid output counter index in {full_output_folder}")
+            return {}
+
+    def _write(self, full_output_folder: str, counters: dict[str, int]) -> None:
+        path = os.path.join(full_output_folder, self.STATE_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(counters, f)
+        os.replace(tmp_path, path)
+
+save_counter_index = SaveCounterIndex()
+
+def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0, count: int | None = None) -> tuple[str, str, int, str, str]:
+    """
+    Resolves filename_prefix inside output_dir and reserves the output counter for it. Pass the number of files that
+    will be saved with consecutive counters as `count`; without it the next call for the same prefix has to scan the
+    folder.
+    """
     def compute_vars(input: str, image_width: int, image_height: int) -> str:
         input = input.replace("%width%", str(image_width))
         input = input.replace("%height%", str(image_height))
@@ -463,13 +621,9 @@ def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, im
         logging.error(err)
         raise Exception(err)
 
-    try:
-        counter = max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
-    except ValueError:
-        counter = 1
-    except FileNotFoundError:
-        os.makedirs(full_output_folder, exist_ok=True)
-        counter = 1
+    os.makedirs(full_output_folder, exist_ok=True)
+    shared = os.path.normcase(os.path.abspath(output_dir)) != os.path.normcase(os.path.abspath(temp_directory))
+    counter = save_counter_index.reserve(full_output_folder, filename, count, shared=shared)
     return full_output_folder, filename, counter, subfolder, filename_prefix
 
 def get_input_subfolders() -> list[str]:
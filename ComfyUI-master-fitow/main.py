@@ -14,6 +14,7 @@ import logging
 import sys
 from comfy_execution.progress import get_progress_state
 from comfy_execution.utils import get_executing_context
+from comfy_execution.workers import WorkerServer, distribute_flags, get_current_worker
 from comfy_api import feature_flags
 
 
@@ -177,6 +178,7 @@ import comfy.utils
 
 import execution
 import server
+from comfy_execution.coalesce import CoalesceMember, coalesce_key
 from protocol import BinaryEventTypes
 import nodes
 import comfy.model_management
@@ -196,17 +198,57 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
-def prompt_worker(q, server_instance):
+def execute_coalesced(q, e, server_instance, queue_items):
+    execution_start_time = time.perf_counter()
+    members = []
+    for item, item_id in queue_items:
+        extra_data = item[3].copy()
+        for k in item[5]:
+            extra_data[k] = item[5][k]
+        members.append(CoalesceMember(prompt_id=item[1], prompt=item[2], extra_data=extra_data, execute_outputs=item[4]))
+    server_instance.last_prompt_id = members[0].prompt_id
+
+    results = e.execute_coalesced(members)
+
+    remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
+    for (item, item_id), (history_result, status) in zip(queue_items, results):
+        q.task_done(item_id, history_result, status=status, process_item=remove_sensitive)
+        client_id = item[3].get("client_id")
+        if client_id is not None:
+            server_instance.send_sync("executing", {"node": None, "prompt_id": item[1]}, client_id)
+
+    current_time = time.perf_counter()
+    execution_time = current_time - execution_start_time
+
+    # Log Time in a more readable way after 10 minutes
+    if execution_time > 600:
+        execution_time = time.strftime("%H:%M:%S", time.gmtime(execution_time))
+        logging.info(f"{len(queue_items)} coalesced prompts executed in {execution_time}")
+    else:
+        logging.info("{} coalesced prompts executed in {:.2f} seconds".format(len(queue_items), execution_time))
+    return current_time
+
+
+def prompt_worker(q, server_instance, worker=None):
     current_time: float = 0.0
+    # With several workers, each executor reports through its own view of the server
+    server = server_instance
+    if worker is not None:
+        worker.bind_thread()
+        server = worker
+
     cache_type = execution.CacheType.CLASSIC
     if args.cache_lru > 0:
         cache_type = execution.CacheType.LRU
-    elif args.cache_ram > 0:
+    elif args.cache_ram > 0 or (args.cache_ram_max > 0 and not (args.cache_none or args.cache_classic)):
         cache_type = execution.CacheType.RAM_PRESSURE
     elif args.cache_none:
         cache_type = execution.CacheType.NONE
 
-    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+    e = execution.PromptExecutor(server, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram, "ram_max" : args.cache_ram_max, "vram_max" : args.cache_vram_max, "disk" : args.cache_disk, "disk_size" : args.cache_disk_size } )
+    server_instance.prompt_executors.append(e)
+    if server_instance.prompt_executor is None:
+        server_instance.prompt_executor = e
     last_gc_collect = 0
     need_gc = False
     gc_collect_interval = 10.0
@@ -215,13 +257,27 @@ def prompt_worker(q, server_instance):
         timeout = 1000.0
         if need_gc:
             timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
+        if worker is not None:
+            # Wake up regularly to apply flags taken from the queue by other workers
+            timeout = min(timeout, gc_collect_interval)
+
+        if args.coalesce_prompts > 1:
+            queue_items = q.get_coalesced(timeout=timeout, max_items=args.coalesce_prompts, key_function=coalesce_key)
+        else:
+            queue_item = q.get(timeout=timeout)
+            queue_items = [queue_item] if queue_item is not None else []
 
-        queue_item = q.get(timeout=timeout)
-        if queue_item is not None:
-            item, item_id = queue_item
+        if worker is not None:
+            worker.running_prompt_ids = tuple(item[1] for item, _ in queue_items)
+
+        if len(queue_items) > 1:
+            current_time = execute_coalesced(q, e, server, queue_items)
+            need_gc = True
+        elif queue_items:
+            item, item_id = queue_items[0]
             execution_start_time = time.perf_counter()
             prompt_id = item[1]
-            server_instance.last_prompt_id = prompt_id
+            server.last_prompt_id = prompt_id
 
             sensitive = item[5]
             extra_data = item[3].copy()
@@ -238,8 +294,8 @@ def prompt_worker(q, server_instance):
                             status_str='success' if e.success else 'error',
                             completed=e.success,
                             messages=e.status_messages), process_item=remove_sensitive)
-            if server_instance.client_id is not None:
-                server_instance.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server_instance.client_id)
+            if server.client_id is not None:
+                server.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server.client_id)
 
             current_time = time.perf_counter()
             execution_time = current_time - execution_start_time
@@ -251,7 +307,14 @@ def prompt_worker(q, server_instance):
             else:
                 logging.info("Prompt executed in {:.2f} seconds".format(execution_time))
 
+        if queue_items:
+            comfy.model_management.release_models_in_use()
+            if worker is not None:
+                worker.running_prompt_ids = ()
+
         flags = q.get_flags()
+        if worker is not None:
+            flags = distribute_flags(server_instance.prompt_workers, worker, flags)
         free_memory = flags.get("free_memory", False)
 
         if flags.get("unload_models", free_memory):
@@ -290,25 +353,26 @@ def hijack_progress(server_instance):
         if node_id is None and executing_context is not None:
             node_id = executing_context.node_id
         comfy.model_management.throw_exception_if_processing_interrupted()
+        server = get_current_worker() or server_instance
         if prompt_id is None:
-            prompt_id = server_instance.last_prompt_id
+            prompt_id = server.last_prompt_id
         if node_id is None:
-            node_id = server_instance.last_node_id
+            node_id = server.last_node_id
         progress = {"value": value, "max": total, "prompt_id": prompt_id, "node": node_id}
         get_progress_state().update_progress(node_id, value, total, preview_image)
 
-        server_instance.send_sync("progress", progress, server_instance.client_id)
+        server.send_sync("progress", progress, server.client_id)
         if preview_image is not None:
             # Only send old method if client doesn't support preview metadata
             if not feature_flags.supports_feature(
-                server_instance.sockets_metadata,
-                server_instance.client_id,
+                server.sockets_metadata,
+                server.client_id,
                 "supports_preview_metadata",
             ):
-                server_instance.send_sync(
+                server.send_sync(
                     BinaryEventTypes.UNENCODED_PREVIEW_IMAGE,
                     preview_image,
-                    server_instance.client_id,
+                    server.client_id,
                 )
 
     comfy.utils.set_progress_bar_global_hook(hook)
@@ -370,7 +434,12 @@ def start_comfyui(asyncio_loop=None):
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+    if args.prompt_workers > 1:
+        prompt_server.prompt_workers = [WorkerServer(prompt_server, i) for i in range(args.prompt_workers)]
+        for worker in prompt_server.prompt_workers:
+            threading.Thread(target=prompt_worker, daemon=True, name=f"prompt-worker-{worker.index}", args=(prompt_server.prompt_queue, prompt_server, worker)).start()
+    else:
+        threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
 
     if args.quick_test_for_ci:
         exit(0)
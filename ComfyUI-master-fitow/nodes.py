@@ -15,7 +15,6 @@ import random
 import logging
 
 from PIL import Image, ImageOps, ImageSequence
-from PIL.PngImagePlugin import PngInfo
 
 import numpy as np
 import safetensors.torch
@@ -43,6 +42,7 @@ import importlib
 import folder_paths
 import latent_preview
 import node_helpers
+from comfy_execution import image_writer
 
 if args.enable_manager:
     import comfyui_manager
@@ -494,7 +494,7 @@ class SaveLatent:
     CATEGORY = "_for_testing"
 
     def save(self, samples, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir)
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, count=1)
 
         # support save metadata for latent sharing
         prompt_info = ""
@@ -1536,11 +1536,13 @@ class SetLatentNoiseMask:
         s["noise_mask"] = mask.reshape((-1, 1, mask.shape[-2], mask.shape[-1]))
         return (s,)
 
-def common_ksampler(model, seed, steps, cfg, sampler_name, scheduler, positive, negative, latent, denoise=1.0, disable_noise=False, start_step=None, last_step=None, force_full_denoise=False):
+def common_ksampler(model, seed, steps, cfg, sampler_name, scheduler, positive, negative, latent, denoise=1.0, disable_noise=False, start_step=None, last_step=None, force_full_denoise=False, noise=None):
     latent_image = latent["samples"]
     latent_image = comfy.sample.fix_empty_latent_channels(model, latent_image, latent.get("downscale_ratio_spacial", None))
 
-    if disable_noise:
+    if noise is not None:
+        pass
+    elif disable_noise:
         noise = torch.zeros(latent_image.size(), dtype=latent_image.dtype, layout=latent_image.layout, device="cpu")
     else:
         batch_inds = latent["batch_index"] if "batch_index" in latent else None
@@ -1624,11 +1626,13 @@ class KSamplerAdvanced:
         return common_ksampler(model, noise_seed, steps, cfg, sampler_name, scheduler, positive, negative, latent_image, denoise=denoise, disable_noise=disable_noise, start_step=start_at_step, last_step=end_at_step, force_full_denoise=force_full_denoise)
 
 class SaveImage:
+    image_format = args.save_image_format
+
     def __init__(self):
         self.output_dir = folder_paths.get_output_directory()
         self.type = "output"
         self.prefix_append = ""
-        self.compress_level = 4
+        self.compress_level = args.save_image_compress_level
 
     @classmethod
     def INPUT_TYPES(s):
@@ -1653,23 +1657,16 @@ class SaveImage:
 
     def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
         filename_prefix += self.prefix_append
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0], count=len(images))
+        image_format = getattr(self, "image_format", "png")
+        extension = image_writer.FORMAT_EXTENSIONS[image_format]
+        metadata = image_writer.build_metadata(image_format, prompt, extra_pnginfo)
+        arrays = torch.clamp(images * 255., 0, 255).to(torch.uint8).cpu().numpy()
         results = list()
-        for (batch_number, image) in enumerate(images):
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
-            if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-
+        for (batch_number, array) in enumerate(arrays):
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
+            file = f"{filename_with_batch_num}_{counter:05}_.{extension}"
+            image_writer.writer.submit(os.path.join(full_output_folder, file), image_writer.write_image, array, image_format, metadata, self.compress_level, args.save_image_quality)
             results.append({
                 "filename": file,
                 "subfolder": subfolder,
@@ -1680,6 +1677,8 @@ class SaveImage:
         return { "ui": { "images": results } }
 
 class PreviewImage(SaveImage):
+    image_format = "png"
+
     def __init__(self):
         self.output_dir = folder_paths.get_temp_directory()
         self.type = "temp"
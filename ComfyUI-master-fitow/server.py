@@ -8,6 +8,8 @@ import nodes
 import folder_paths
 import execution
 from comfy_execution.jobs import JobStatus, get_job, get_all_jobs
+from comfy_execution.workers import interrupt_workers
+from comfy_execution import image_writer
 import uuid
 import urllib
 import json
@@ -34,6 +36,7 @@ from comfyui_version import __version__
 from app.frontend_management import FrontendManager, parse_version
 from comfy_api.internal import _ComfyNodeInternal
 from app.assets.scanner import seed_assets
+from app.object_info_cache import ObjectInfoCache, etag_matches
 from app.assets.api.routes import register_assets_system
 
 from app.user_manager import UserManager
@@ -92,6 +95,8 @@ async def compress_body(request: web.Request, handler):
         return response
     if response.content_type not in ["application/json", "text/plain"]:
         return response
+    if "Content-Encoding" in response.headers:
+        return response
     if response.body and "gzip" in accept_encoding:
         response.enable_compression()
     return response
@@ -242,6 +247,11 @@ class PromptServer():
         self.routes = routes
         self.last_node_id = None
         self.client_id = None
+        self.prompt_executor = None
+        self.public_queue = None
+        self.prompt_executors = []
+        # WorkerServer views of this server when --prompt-workers runs several executors
+        self.prompt_workers = []
 
         self.on_prompt_handlers = []
 
@@ -265,8 +275,9 @@ class PromptServer():
                 # Send initial state to the new client
                 await self.send("status", {"status": self.get_queue_info(), "sid": sid}, sid)
                 # On reconnect if we are the currently executing client send the current node
-                if self.client_id == sid and self.last_node_id is not None:
-                    await self.send("executing", { "node": self.last_node_id }, sid)
+                for state in self.prompt_workers or [self]:
+                    if state.client_id == sid and state.last_node_id is not None:
+                        await self.send("executing", { "node": state.last_node_id }, sid)
 
                 # Flag to track if we've received the first message
                 first_message = True
@@ -501,6 +512,9 @@ class PromptServer():
 
                 filename = os.path.basename(filename)
                 file = os.path.join(output_dir, filename)
+                if image_writer.writer.is_pending(file):
+                    # Saved by a node that already finished, still being encoded in the background
+                    await asyncio.to_thread(image_writer.writer.wait_for, file)
 
                 if os.path.isfile(file):
                     if 'preview' in request.rel_url.query:
@@ -641,6 +655,15 @@ class PromptServer():
             }
             return web.json_response(system_stats)
 
+        @routes.get("/cache/stats")
+        async def get_cache_stats(request):
+            if self.prompt_executor is None:
+                return web.json_response({})
+            stats = {"outputs": self.prompt_executor.caches.get_stats()}
+            if len(self.prompt_executors) > 1:
+                stats["workers"] = [{"outputs": e.caches.get_stats()} for e in self.prompt_executors]
+            return web.json_response(stats)
+
         @routes.get("/features")
         async def get_features(request):
             return web.json_response(feature_flags.get_server_features())
@@ -655,7 +678,7 @@ class PromptServer():
                 return obj_class.GET_NODE_INFO_V1()
             info = {}
             info['input'] = obj_class.INPUT_TYPES()
-            info['input_order'] = {key: list(value.keys()) for (key, value) in obj_class.INPUT_TYPES().items()}
+            info['input_order'] = {key: list(value.keys()) for (key, value) in info['input'].items()}
             info['output'] = obj_class.RETURN_TYPES
             info['output_is_list'] = obj_class.OUTPUT_IS_LIST if hasattr(obj_class, 'OUTPUT_IS_LIST') else [False] * len(obj_class.RETURN_TYPES)
             info['output_name'] = obj_class.RETURN_NAMES if hasattr(obj_class, 'RETURN_NAMES') else info['output']
@@ -688,29 +711,41 @@ class PromptServer():
             info['search_aliases'] = getattr(obj_class, 'SEARCH_ALIASES', [])
             return info
 
-        @routes.get("/object_info")
-        async def get_object_info(request):
+        self.object_info_cache = ObjectInfoCache(node_info)
+
+        def seed_models():
             try:
                 seed_assets(["models"])
             except Exception as e:
                 logging.error(f"Failed to seed assets: {e}")
-            with folder_paths.cache_helper:
-                out = {}
-                for x in nodes.NODE_CLASS_MAPPINGS:
-                    try:
-                        out[x] = node_info(x)
-                    except Exception:
-                        logging.error(f"[ERROR] An error occurred while retrieving information for the '{x}' node.")
-                        logging.error(traceback.format_exc())
-                return web.json_response(out)
+
+        @routes.get("/object_info")
+        async def get_object_info(request):
+            if args.disable_object_info_cache:
+                self.object_info_cache.invalidate()
+            use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+            object_info = await asyncio.to_thread(self.object_info_cache.get, use_gzip)
+            if object_info.models_changed:
+                await asyncio.to_thread(seed_models)
+
+            headers = {"ETag": object_info.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            if etag_matches(request.headers.get("If-None-Match"), object_info.etag):
+                return web.Response(status=304, headers=headers)
+            if use_gzip:
+                headers["Content-Encoding"] = "gzip"
+            return web.Response(body=object_info.body, content_type="application/json", headers=headers)
 
         @routes.get("/object_info/{node_class}")
         async def get_object_info_node(request):
             node_class = request.match_info.get("node_class", None)
-            out = {}
+            if args.disable_object_info_cache:
+                self.object_info_cache.invalidate([node_class])
+            info = None
             if (node_class is not None) and (node_class in nodes.NODE_CLASS_MAPPINGS):
-                out[node_class] = node_info(node_class)
-            return web.json_response(out)
+                info = await asyncio.to_thread(self.object_info_cache.get_node, node_class)
+            if info is None:
+                return web.json_response({})
+            return web.Response(text=f"{{{json.dumps(node_class)}: {info}}}", content_type="application/json")
 
         @routes.get("/api/jobs")
         async def get_jobs(request):
@@ -782,12 +817,9 @@ class PromptServer():
                         status=400
                     )
 
-            running, queued = self.prompt_queue.get_current_queue_volatile()
+            running, queued = self.get_public_queue()
             history = self.prompt_queue.get_history()
 
-            running = _remove_sensitive_from_queue(running)
-            queued = _remove_sensitive_from_queue(queued)
-
             jobs, total = get_all_jobs(
                 running, queued, history,
                 status_filter=status_filter,
@@ -820,8 +852,8 @@ class PromptServer():
                     status=400
                 )
 
-            running, queued = self.prompt_queue.get_current_queue_volatile()
-            history = self.prompt_queue.get_history(prompt_id=job_id)
+            running, queued = self.prompt_queue.get_queue_items(job_id)
+            history = await asyncio.to_thread(self.prompt_queue.get_history, prompt_id=job_id)
 
             running = _remove_sensitive_from_queue(running)
             queued = _remove_sensitive_from_queue(queued)
@@ -847,19 +879,33 @@ class PromptServer():
             else:
                 offset = -1
 
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset))
+            # Cursor/filter queries: pollers pass the last prompt_id they saw as `since` to get only newer entries
+            since = request.rel_url.query.get("since", None)
+            before = request.rel_url.query.get("before", None)
+            status = request.rel_url.query.get("status", None)
+            since_time = request.rel_url.query.get("since_time", None)
+            if since_time is not None:
+                try:
+                    since_time = int(since_time)
+                except ValueError:
+                    return web.json_response({"error": "since_time must be an integer (milliseconds)"}, status=400)
+
+            if since is None and before is None and status is None and since_time is None:
+                return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset))
+            # These may query the database
+            history = await asyncio.to_thread(self.prompt_queue.get_history, max_items=max_items, since=since, before=before, since_time=since_time, status=status)
+            return web.json_response(history)
 
         @routes.get("/history/{prompt_id}")
         async def get_history_prompt_id(request):
             prompt_id = request.match_info.get("prompt_id", None)
-            return web.json_response(self.prompt_queue.get_history(prompt_id=prompt_id))
+            # Entries outside the in-memory window are looked up in the database
+            return web.json_response(await asyncio.to_thread(self.prompt_queue.get_history, prompt_id=prompt_id))
 
         @routes.get("/queue")
         async def get_queue(request):
             queue_info = {}
-            current_queue = self.prompt_queue.get_current_queue_volatile()
-            queue_info['queue_running'] = _remove_sensitive_from_queue(current_queue[0])
-            queue_info['queue_pending'] = _remove_sensitive_from_queue(current_queue[1])
+            queue_info['queue_running'], queue_info['queue_pending'] = self.get_public_queue()
             return web.json_response(queue_info)
 
         @routes.post("/prompt")
@@ -922,10 +968,7 @@ class PromptServer():
                 if json_data["clear"]:
                     self.prompt_queue.wipe_queue()
             if "delete" in json_data:
-                to_delete = json_data['delete']
-                for id_to_delete in to_delete:
-                    delete_func = lambda a: a[1] == id_to_delete
-                    self.prompt_queue.delete_queue_item(delete_func)
+                self.prompt_queue.delete_queue_items(json_data['delete'])
 
             return web.Response(status=200)
 
@@ -938,8 +981,12 @@ class PromptServer():
 
             # Check if a specific prompt_id was provided for targeted interruption
             prompt_id = json_data.get('prompt_id')
-            if prompt_id:
-                currently_running, _ = self.prompt_queue.get_current_queue()
+            if self.prompt_workers:
+                # Only stop the workers running the prompt (or all busy workers), not every worker that checks next
+                if not interrupt_workers(self.prompt_workers, prompt_id or None) and prompt_id:
+                    logging.info(f"Prompt {prompt_id} is not currently running, skipping interrupt")
+            elif prompt_id:
+                currently_running, _ = self.prompt_queue.get_queue_items(prompt_id)
 
                 # Check if the prompt_id matches any currently running prompt
                 should_interrupt = False
@@ -1051,6 +1098,13 @@ class PromptServer():
             web.static('/', self.web_root),
         ])
 
+    def get_public_queue(self):
+        """The (running, queued) items without sensitive data, rebuilt only when the queue has changed."""
+        snapshot = self.prompt_queue.get_snapshot()
+        if self.public_queue is None or self.public_queue[0] != snapshot.version:
+            self.public_queue = (snapshot.version, _remove_sensitive_from_queue(snapshot.running), _remove_sensitive_from_queue(snapshot.queued))
+        return self.public_queue[1], self.public_queue[2]
+
     def get_queue_info(self):
         prompt_info = {}
         exec_info = {}
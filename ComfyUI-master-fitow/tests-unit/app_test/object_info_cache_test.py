@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+from collections import Counter
+
+import pytest
+
+import folder_paths
+import nodes
+from app.object_info_cache import ObjectInfoCache, etag_matches
+
+
+def touch(path, mtime):
+    with open(path, "w"):
+        pass
+    os.utime(os.path.dirname(path), (mtime, mtime))
+
+
+class LoraNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"lora_name": (folder_paths.get_filename_list("loras"),)}}
+
+
+class ImageNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"image": (sorted(os.listdir(folder_paths.get_input_directory())),)}}
+
+
+class StaticNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT",)}}
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    loras = tmp_path / "loras"
+    inputs = tmp_path / "input"
+    loras.mkdir()
+    inputs.mkdir()
+    touch(str(loras / "a.safetensors"), 1000)
+    monkeypatch.setitem(folder_paths.folder_names_and_paths, "loras", ([str(loras)], {".safetensors"}))
+    monkeypatch.setattr(folder_paths, "filename_list_cache", {})
+    monkeypatch.setattr(folder_paths, "input_directory", str(inputs))
+    monkeypatch.setattr(nodes, "NODE_CLASS_MAPPINGS", {"Lora": LoraNode, "Image": ImageNode, "Static": StaticNode})
+
+    calls = Counter()
+
+    def node_info(name):
+        calls[name] += 1
+        return {"input": nodes.NODE_CLASS_MAPPINGS[name].INPUT_TYPES()}
+
+    return ObjectInfoCache(node_info), calls, loras, inputs
+
+
+def test_builds_once_and_matches_json_dumps(setup):
+    cache, calls, _, _ = setup
+    first = cache.get()
+    assert json.loads(first.body)["Lora"]["input"]["required"]["lora_name"] == [["a.safetensors"]]
+    assert first.models_changed
+
+    second = cache.get()
+    assert second.etag == first.etag
+    assert second.body is first.body
+    assert not second.models_changed
+    assert calls == {"Lora": 1, "Image": 1, "Static": 1}
+
+    expected = json.dumps({name: {"input": cls.INPUT_TYPES()} for name, cls in nodes.NODE_CLASS_MAPPINGS.items()})
+    assert first.body.decode() == expected
+    compressed = cache.get(use_gzip=True)
+    assert gzip.decompress(compressed.body) == first.body
+    assert compressed.etag != first.etag
+
+
+def test_only_dependent_classes_are_rebuilt(setup):
+    cache, calls, loras, inputs = setup
+    etag = cache.get().etag
+
+    touch(str(inputs / "new.png"), 2000)
+    info = cache.get()
+    assert calls == {"Lora": 1, "Image": 2, "Static": 1}
+    assert info.etag != etag
+    assert not info.models_changed
+    assert json.loads(info.body)["Image"]["input"]["required"]["image"] == [["new.png"]]
+
+    touch(str(loras / "b.safetensors"), 3000)
+    info = cache.get()
+    assert calls == {"Lora": 2, "Image": 2, "Static": 1}
+    assert info.models_changed
+    assert json.loads(cache.get_node("Lora"))["input"]["required"]["lora_name"] == [["a.safetensors", "b.safetensors"]]
+
+
+def test_replaced_removed_and_invalidated_classes(setup):
+    cache, calls, _, _ = setup
+    cache.get()
+
+    class OtherStatic(StaticNode):
+        pass
+
+    nodes.NODE_CLASS_MAPPINGS["Static"] = OtherStatic
+    del nodes.NODE_CLASS_MAPPINGS["Image"]
+    info = json.loads(cache.get().body)
+    assert list(info) == ["Lora", "Static"]
+    assert calls["Static"] == 2
+
+    cache.invalidate(["Lora"])
+    cache.get()
+    assert calls == {"Lora": 2, "Image": 1, "Static": 2}
+
+
+def test_failing_class_is_retried(setup):
+    cache, calls, _, _ = setup
+
+    class Broken:
+        fail = True
+
+        @classmethod
+        def INPUT_TYPES(cls):
+            if cls.fail:
+                raise RuntimeError("broken")
+            return {}
+
+    nodes.NODE_CLASS_MAPPINGS["Broken"] = Broken
+    assert "Broken" not in json.loads(cache.get().body)
+    Broken.fail = False
+    assert "Broken" in json.loads(cache.get().body)
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -237,3 +237,117 @@ def test_duration_consistency(video_components):
     manual_duration = float(components.images.shape[0] / components.frame_rate)
 
     assert duration == pytest.approx(manual_duration)
+
+
+def create_gradient_video(frames=40, fps=20, gop_size=8, suffix=".mp4", codec="h264", with_audio=False):
+    """Helper to create a video whose frame i has pixel value 5 * i, with a keyframe every gop_size frames"""
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    with av.open(tmp.name, mode="w") as container:
+        stream = container.add_stream(codec, rate=fps)
+        stream.width = 16
+        stream.height = 16
+        stream.pix_fmt = "yuv420p"
+        stream.gop_size = gop_size
+        audio_stream = container.add_stream("aac", rate=8000) if with_audio else None
+
+        for i in range(frames):
+            frame = av.VideoFrame.from_ndarray(
+                torch.full((16, 16, 3), i * 5, dtype=torch.uint8).numpy(), format="rgb24"
+            )
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+
+        if audio_stream is not None:
+            samples = frames * 8000 // fps
+            frame = av.AudioFrame.from_ndarray(
+                torch.zeros(1, samples).numpy(), format="flt", layout="mono"
+            )
+            frame.sample_rate = 8000
+            frame.pts = 0
+            container.mux(audio_stream.encode(frame))
+            container.mux(audio_stream.encode(None))
+
+    return tmp.name
+
+
+@pytest.fixture
+def gradient_video_file():
+    file_path = create_gradient_video(with_audio=True)
+    yield file_path
+    os.unlink(file_path)
+
+
+@pytest.mark.parametrize(
+    "start_frame,end_frame,stride",
+    [(0, None, 1), (0, 10, 1), (13, None, 1), (17, 33, 3), (39, None, 2), (5, 5, 1)],
+)
+def test_video_from_file_get_components_range(gradient_video_file, start_frame, end_frame, stride):
+    """Seeking to a range decodes the same frames as slicing the full decode"""
+    video = VideoFromFile(gradient_video_file)
+    full = video.get_components()
+    selected = video.get_components_range(start_frame, end_frame, stride)
+
+    expected = full.images[start_frame:end_frame:stride]
+    assert selected.images.dtype == torch.float32
+    if expected.shape[0] == 0:
+        assert selected.images.shape[0] == 0
+    else:
+        assert torch.equal(selected.images, expected)
+    assert selected.frame_rate == Fraction(20, stride)
+
+
+def test_video_from_file_get_components_range_trims_audio(gradient_video_file):
+    """Audio is cut to the time span of the selected frames"""
+    video = VideoFromFile(gradient_video_file)
+    selected = video.get_components_range(10, 30)
+    assert selected.audio is not None
+    assert selected.audio["sample_rate"] == 8000
+    # 20 frames at 20fps
+    assert selected.audio["waveform"].shape[-1] == 8000
+
+
+def test_video_from_file_iter_frames_chunks(gradient_video_file):
+    """Frames are yielded in bounded uint8 chunks, converted to float on request"""
+    video = VideoFromFile(gradient_video_file)
+    full = video.get_components()
+
+    chunks = list(video.iter_frames(start_frame=3, stride=2, chunk_size=6, dtype=torch.uint8))
+    assert all(chunk.dtype == torch.uint8 for chunk in chunks)
+    assert [chunk.shape[0] for chunk in chunks] == [6, 6, 6, 1]
+    assert torch.equal(torch.cat(chunks).float() / 255.0, full.images[3::2])
+
+    float_chunks = list(video.iter_frames(start_frame=3, stride=2, chunk_size=6))
+    assert torch.equal(torch.cat(float_chunks), full.images[3::2])
+
+
+def test_video_from_file_invalid_range(gradient_video_file):
+    video = VideoFromFile(gradient_video_file)
+    with pytest.raises(ValueError, match="stride"):
+        video.get_components_range(stride=0)
+    with pytest.raises(ValueError, match="end_frame"):
+        video.get_components_range(10, 5)
+
+
+def test_video_from_components_get_components_range(video_components):
+    """Default implementation slices the components"""
+    video = VideoFromComponents(video_components)
+    selected = video.get_components_range(1, None, 2)
+    assert torch.equal(selected.images, video_components.images[1::2])
+    assert selected.frame_rate == Fraction(15)
+
+    chunks = list(video.iter_frames(chunk_size=2))
+    assert torch.equal(torch.cat(chunks), video_components.images)
+
+
+def test_video_from_file_save_to_reencodes():
+    """Converting to another container re-encodes without changing the frame count"""
+    file_path = create_gradient_video(frames=12, suffix=".avi", codec="mpeg4")
+    try:
+        output = io.BytesIO()
+        VideoFromFile(file_path).save_to(output, format="mp4", codec="h264")
+        output.seek(0)
+        video = VideoFromFile(output)
+        assert "mp4" in video.get_container_format()
+        assert video.get_components().images.shape[0] == 12
+    finally:
+        os.unlink(file_path)
@@ -116,6 +116,67 @@ def test_get_save_image_path(temp_dir):
         assert filename_prefix == "test"
 
 
+def _touch(directory, name):
+    with open(os.path.join(directory, name), "w"):
+        pass
+
+
+def test_save_counter_index_seeds_once_and_reserves_ranges(temp_dir):
+    _touch(temp_dir, "img_00007_.png")
+    _touch(temp_dir, "other_00020_.png")
+    index = folder_paths.SaveCounterIndex()
+    assert index.reserve(temp_dir, "img", count=4) == 8
+    with patch("folder_paths.os.listdir", side_effect=AssertionError("scanned")):
+        assert index.reserve(temp_dir, "img", count=1) == 12
+    # Another process sees the same counters through the state file
+    assert folder_paths.SaveCounterIndex().reserve(temp_dir, "img", count=1) == 13
+    assert index.reserve(temp_dir, "other", count=1) == 21
+    assert not os.path.exists(os.path.join(temp_dir, folder_paths.SaveCounterIndex.LOCK_FILE))
+
+
+def test_save_counter_index_unknown_count_rescans(temp_dir):
+    index = folder_paths.SaveCounterIndex()
+    assert index.reserve(temp_dir, "img") == 1
+    _touch(temp_dir, "img_00001_.png")
+    _touch(temp_dir, "img_00002_.png")
+    assert index.reserve(temp_dir, "img", count=1) == 3
+    assert index.reserve(temp_dir, "img", count=1) == 4
+
+
+def test_save_counter_index_breaks_stale_lock(temp_dir):
+    index = folder_paths.SaveCounterIndex(lock_timeout=0.05, stale_lock_age=60)
+    lock_path = os.path.join(temp_dir, index.LOCK_FILE)
+    _touch(temp_dir, index.LOCK_FILE)
+    # Held by a live process: falls back to scanning the folder
+    _touch(temp_dir, "img_00003_.png")
+    assert index.reserve(temp_dir, "img", count=1) == 4
+    os.utime(lock_path, (0, 0))
+    assert index.reserve(temp_dir, "img", count=1) == 4
+    assert index.reserve(temp_dir, "img", count=1) == 5
+
+
+def test_save_counter_index_threads(temp_dir):
+    from concurrent.futures import ThreadPoolExecutor
+    index = folder_paths.SaveCounterIndex()
+    with ThreadPoolExecutor(8) as pool:
+        counters = list(pool.map(lambda _: index.reserve(temp_dir, "img", count=2), range(64)))
+    assert sorted(counters) == list(range(1, 129, 2))
+
+
+def test_get_save_image_path_reserves_counters(temp_dir):
+    with patch("folder_paths.temp_directory", os.path.join(temp_dir, "temp")):
+        _, _, first, _, _ = folder_paths.get_save_image_path("sub/test", temp_dir, count=3)
+        full_output_folder, _, second, subfolder, _ = folder_paths.get_save_image_path("sub/test", temp_dir, count=1)
+        assert (first, second, subfolder) == (1, 4, "sub")
+        assert os.path.exists(os.path.join(full_output_folder, folder_paths.SaveCounterIndex.STATE_FILE))
+
+        temp = os.path.join(temp_dir, "temp")
+        os.makedirs(temp)
+        assert folder_paths.get_save_image_path("preview", temp, count=1)[2] == 1
+        assert folder_paths.get_save_image_path("preview", temp, count=1)[2] == 2
+        assert not os.path.exists(os.path.join(temp, folder_paths.SaveCounterIndex.STATE_FILE))
+
+
 def test_base_path_changes(set_base_dir):
     test_dir = os.path.abspath("/test/dir")
     set_base_dir(test_dir)
@@ -0,0 +1,121 @@
+"""
+Unit tests for the Merkle-style input signatures built by CacheKeySetInputSignature.
+
+Tests cover:
+- Identical graphs produce identical keys; any upstream change changes every downstream key
+- Keys don't depend on node ids unless the node is NOT_IDEMPOTENT
+- NaN from IS_CHANGED and unsupported input values make a node (and its descendants) uncacheable
+- Deep chains don't hit the recursion limit
+"""
+import asyncio
+
+import pytest
+
+import nodes
+from comfy_execution.caching import CacheKeySetInputSignature, Unhashable
+from comfy_execution.graph import DynamicPrompt
+
+
+class _Node:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {}}
+
+
+class _NotIdempotentNode(_Node):
+    NOT_IDEMPOTENT = True
+
+
+class _IsChanged:
+    def __init__(self, values=None):
+        self.values = values or {}
+
+    async def get(self, node_id):
+        return self.values.get(node_id, False)
+
+
+@pytest.fixture(autouse=True)
+def node_classes(monkeypatch):
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestNode", _Node)
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestNotIdempotentNode", _NotIdempotentNode)
+
+
+def _keys(prompt, is_changed=None):
+    key_set = CacheKeySetInputSignature(DynamicPrompt(prompt), list(prompt.keys()), _IsChanged(is_changed))
+    asyncio.run(key_set.add_keys(list(prompt.keys())))
+    return key_set
+
+
+def _chain(length, seed=0, prefix=""):
+    prompt = {f"{prefix}0": {"class_type": "TestNode", "inputs": {"seed": seed}}}
+    for i in range(1, length):
+        prompt[f"{prefix}{i}"] = {"class_type": "TestNode", "inputs": {"x": [f"{prefix}{i - 1}", 0], "i": i}}
+    return prompt
+
+
+def test_identical_graphs_share_keys():
+    a = _keys(_chain(5))
+    b = _keys(_chain(5))
+    for node_id in map(str, range(5)):
+        assert isinstance(a.get_data_key(node_id), bytes)
+        assert a.get_data_key(node_id) == b.get_data_key(node_id)
+
+
+def test_node_ids_do_not_affect_keys():
+    a = _keys(_chain(5))
+    b = _keys(_chain(5, prefix="n"))
+    assert a.get_data_key("4") == b.get_data_key("n4")
+
+
+def test_upstream_change_propagates_downstream():
+    a = _keys(_chain(5, seed=1))
+    b = _keys(_chain(5, seed=2))
+    for node_id in map(str, range(5)):
+        assert a.get_data_key(node_id) != b.get_data_key(node_id)
+
+
+def test_socket_and_input_name_are_part_of_key():
+    base = {"0": {"class_type": "TestNode", "inputs": {}}}
+    a = _keys({**base, "1": {"class_type": "TestNode", "inputs": {"x": ["0", 0]}}})
+    b = _keys({**base, "1": {"class_type": "TestNode", "inputs": {"x": ["0", 1]}}})
+    c = _keys({**base, "1": {"class_type": "TestNode", "inputs": {"y": ["0", 0]}}})
+    assert len({a.get_data_key("1"), b.get_data_key("1"), c.get_data_key("1")}) == 3
+
+
+def test_not_idempotent_includes_node_id():
+    def prompt(node_id):
+        return {node_id: {"class_type": "TestNotIdempotentNode", "inputs": {"v": 1}}}
+
+    assert _keys(prompt("1")).get_data_key("1") != _keys(prompt("2")).get_data_key("2")
+    assert _keys(prompt("1")).get_data_key("1") == _keys(prompt("1")).get_data_key("1")
+
+
+@pytest.mark.parametrize("is_changed,inputs", [
+    ({"0": float("NaN")}, {"v": 1}),
+    ({}, {"v": object()}),
+    ({}, {"v": [1, float("NaN")]}),
+])
+def test_uncacheable_nodes_propagate(is_changed, inputs):
+    prompt = {
+        "0": {"class_type": "TestNode", "inputs": inputs},
+        "1": {"class_type": "TestNode", "inputs": {"x": ["0", 0]}},
+        "2": {"class_type": "TestNode", "inputs": {"v": 2}},
+    }
+    a = _keys(prompt, is_changed)
+    b = _keys(prompt, is_changed)
+    assert isinstance(a.get_data_key("0"), Unhashable)
+    assert isinstance(a.get_data_key("1"), Unhashable)
+    assert a.get_data_key("1") != b.get_data_key("1")
+    # Unrelated nodes are unaffected
+    assert a.get_data_key("2") == b.get_data_key("2")
+
+
+def test_missing_ancestor_is_uncacheable():
+    prompt = {"1": {"class_type": "TestNode", "inputs": {"x": ["missing", 0]}}}
+    assert isinstance(_keys(prompt).get_data_key("1"), Unhashable)
+
+
+def test_deep_chain_does_not_recurse():
+    key_set = _keys(_chain(5000))
+    assert isinstance(key_set.get_data_key("4999"), bytes)
+    assert len(key_set.node_digests) == 5000
@@ -0,0 +1,202 @@
+"""
+Unit tests for prompt coalescing (comfy_execution.coalesce) and PromptQueue.get_coalesced.
+
+Tests cover:
+- Prompts from one client that differ only in sampler seed / prompt text share a coalesce key; other differences don't
+- The merged prompt shares common nodes, batches the text encoder and sampler, and copies downstream nodes per member
+- History is split back per member with the original node ids
+- A failure in one member's copied nodes fails only that member; the others run again
+- Batched noise and conditioning match what each member would have used on its own
+- Per-latent noise masks and batch indexes follow the samples through the merged batch and back
+- The queue hands out matching prompts together, in queue order
+"""
+from unittest.mock import MagicMock
+
+import pytest
+import torch
+
+import comfy.sample
+import nodes
+from comfy_execution import coalesce
+from comfy_execution.coalesce import CoalesceMember, coalesce_key, merge_prompts
+from execution import PromptExecutor, PromptQueue
+
+
+def _prompt(seed=1, text="a cat", steps=20):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "model.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 1}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": text, "clip": ["4", 1]}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["4", 1]}},
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": seed, "steps": steps, "cfg": 8.0, "sampler_name": "euler", "scheduler": "normal", "denoise": 1.0,
+            "model": ["4", 0], "positive": ["6", 0], "negative": ["7", 0], "latent_image": ["5", 0]}},
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["3", 0], "vae": ["4", 2]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "ComfyUI", "images": ["8", 0]}},
+    }
+
+
+def _item(number, prompt, client_id="client"):
+    return (number, f"prompt-{number}", prompt, {"client_id": client_id}, ["9"], {})
+
+
+def _members(*prompts):
+    return [CoalesceMember(f"prompt-{i}", p, {"client_id": "client"}, ["9"]) for i, p in enumerate(prompts)]
+
+
+def test_coalesce_key_ignores_seed_and_text():
+    key = coalesce_key(_item(0, _prompt()))
+    assert key is not None
+    assert coalesce_key(_item(1, _prompt(seed=2, text="a dog"))) == key
+    assert coalesce_key(_item(2, _prompt(steps=30))) != key
+    # The merged run reports to the first member's client, so other clients' prompts are never merged with it
+    assert coalesce_key(_item(3, _prompt(seed=2), client_id="other")) != key
+
+
+def test_coalesce_key_requires_a_sampler():
+    prompt = {"1": {"class_type": "CLIPTextEncode", "inputs": {"text": "x", "clip": ["2", 0]}}}
+    assert coalesce_key(_item(0, prompt)) is None
+
+
+def test_identical_members_are_not_merged():
+    assert merge_prompts(_members(_prompt(), _prompt())) is None
+
+
+def test_merge_shares_batches_and_copies():
+    merged = merge_prompts(_members(_prompt(seed=1, text="a cat"), _prompt(seed=2, text="a dog"), _prompt(seed=3, text="a cow")))
+    prompt = merged.prompt
+    # Shared nodes appear once
+    for node_id in ("4", "5", "7"):
+        assert prompt[node_id]["class_type"] == _prompt()[node_id]["class_type"]
+    assert prompt["6"]["class_type"] == "CoalescedCLIPTextEncode"
+    assert prompt["6"]["inputs"]["texts_json"] == '["a cat", "a dog", "a cow"]'
+    assert prompt["3"]["class_type"] == "CoalescedKSampler"
+    assert prompt["3"]["inputs"]["seeds_json"] == "[1, 2, 3]"
+    assert prompt["3"]["inputs"]["batched_inputs_json"] == '["positive"]'
+    # Downstream nodes are copied per member, reading their slice of the batch
+    assert prompt["8"]["inputs"]["samples"] == ["3@0:0", 0]
+    assert prompt["8@2"]["inputs"]["samples"] == ["3@2:0", 0]
+    assert prompt["3@2:0"]["inputs"] == {"value": ["3", 0], "index": 2, "count": 3}
+    assert prompt["9@1"]["inputs"]["images"] == ["8@1", 0]
+    assert prompt["9@1"]["coalesce_member"] == 1
+    assert sorted(merged.execute_outputs) == ["9", "9@1", "9@2"]
+    assert merged.extra_data["coalesce_members"][1]["prompt_id"] == "prompt-1"
+
+
+def test_split_history_restores_member_node_ids():
+    merged = merge_prompts(_members(_prompt(seed=1), _prompt(seed=2)))
+    history = {
+        "outputs": {"9": {"images": ["a.png"]}, "9@1": {"images": ["b.png"]}},
+        "meta": {"9@1": {"node_id": "9@1", "display_node": "9@1", "parent_node": None, "real_node_id": "9@1"}},
+    }
+    first, second = merged.split_history(history)
+    assert first["outputs"] == {"9": {"images": ["a.png"]}}
+    assert second["outputs"] == {"9": {"images": ["b.png"]}}
+    assert second["meta"]["9"] == {"node_id": "9", "display_node": "9", "parent_node": None, "real_node_id": "9"}
+
+
+def test_failed_members_are_attributed_by_copied_node():
+    merged = merge_prompts(_members(_prompt(seed=1), _prompt(seed=2), _prompt(seed=3)))
+    assert merged.failed_members([("execution_error", {"node_id": "9@1"})]) == {1}
+    assert merged.failed_members([("execution_error", {"node_id": "8"})]) == {0}
+    assert merged.failed_members([("execution_error", {"node_id": "4"})]) == {0, 1, 2}
+    assert merged.failed_members([("execution_interrupted", {"node_id": "9@1"})]) == {0, 1, 2}
+
+
+def test_execute_coalesced_reruns_members_that_did_not_fail(monkeypatch):
+    members = _members(_prompt(seed=1), _prompt(seed=2), _prompt(seed=3))
+    executor = PromptExecutor(MagicMock())
+    runs = []
+
+    def fake_execute(prompt, prompt_id, extra_data, execute_outputs):
+        failing = not runs
+        runs.append(sorted(execute_outputs))
+        executor.success = not failing
+        executor.status_messages = [("execution_error", {"node_id": "9@1", "node_type": "SaveImage"})] if failing else []
+        executor.history_result = {"outputs": {}, "meta": {}}
+
+    monkeypatch.setattr(executor, "execute", fake_execute)
+    results = executor.execute_coalesced(members)
+
+    assert runs == [["9", "9@1", "9@2"], ["9", "9@1"]]
+    assert [status.status_str for _, status in results] == ["success", "error", "success"]
+    error_event, error = results[1][1].messages[-1]
+    assert error_event == "execution_error"
+    assert error["node_id"] == "9" and error["prompt_id"] == "prompt-1"
+
+
+def test_batched_noise_matches_individual_runs():
+    latent = torch.zeros(2, 4, 8, 8)
+    noise = coalesce.batched_noise(latent, [5, 7])
+    assert torch.equal(noise[:2], comfy.sample.prepare_noise(latent, 5))
+    assert torch.equal(noise[2:], comfy.sample.prepare_noise(latent, 7))
+
+
+def test_batch_conditioning_pads_tokens_and_keeps_rows():
+    a = [[torch.ones(1, 77, 8), {"pooled_output": torch.ones(1, 4)}]]
+    b = [[torch.full((1, 154, 8), 2.0), {"pooled_output": torch.full((1, 4), 2.0)}]]
+    (cond, options), = coalesce.batch_conditioning([a, b])
+    assert cond.shape == (2, 154, 8)
+    assert torch.equal(options["pooled_output"][1], torch.full((4,), 2.0))
+
+    (selected, selected_options), = coalesce.CoalescedSelect().select([[cond, options]], 1, 2)[0]
+    assert torch.equal(selected, torch.full((1, 154, 8), 2.0))
+    assert selected_options["pooled_output"].shape == (1, 4)
+
+
+def test_select_slices_per_latent_entries():
+    latent = {"samples": torch.arange(4.0).view(4, 1, 1, 1), "noise_mask": torch.arange(4.0).view(4, 1, 1),
+              "batch_index": [0, 1, 0, 1]}
+    (selected,) = coalesce.CoalescedSelect().select(latent, 1, 2)
+    assert selected["samples"].flatten().tolist() == [2.0, 3.0]
+    assert selected["noise_mask"].flatten().tolist() == [2.0, 3.0]
+    assert selected["batch_index"] == [0, 1]
+    # A single mask shared by every latent is passed through
+    (shared,) = coalesce.CoalescedSelect().select({**latent, "noise_mask": torch.ones(1, 1, 1)}, 1, 2)
+    assert shared["noise_mask"].shape == (1, 1, 1)
+
+
+def test_batch_conditioning_rejects_different_options():
+    a = [[torch.ones(1, 77, 8), {"pooled_output": torch.ones(1, 4)}]]
+    b = [[torch.ones(1, 77, 8), {"pooled_output": torch.ones(1, 4), "area": (8, 8, 0, 0)}]]
+    with pytest.raises(ValueError):
+        coalesce.batch_conditioning([a, b])
+
+
+def test_coalesced_sampler_batches_latents_noise_and_conditioning(monkeypatch):
+    calls = {}
+
+    def fake_common_ksampler(model, seed, steps, cfg, sampler_name, scheduler, positive, negative, latent, **kwargs):
+        calls.update(positive=positive, negative=negative, latent=latent, **kwargs)
+        return (latent,)
+
+    monkeypatch.setattr(nodes, "common_ksampler", fake_common_ksampler)
+    monkeypatch.setattr(comfy.sample, "fix_empty_latent_channels", lambda model, latent, ratio=None: latent)
+    positive = [[torch.stack([torch.zeros(77, 8), torch.ones(77, 8)]), {}]]
+    negative = [[torch.zeros(1, 77, 8), {}]]
+    latent = {"samples": torch.zeros(2, 4, 8, 8), "noise_mask": torch.ones(2, 8, 8), "batch_index": [0, 1]}
+    coalesce.CoalescedKSampler().sample("KSampler", "[5, 7]", '["positive"]', None, positive, negative, latent, 20, 8.0, "euler", "normal")
+
+    assert calls["latent"]["samples"].shape == (4, 4, 8, 8)
+    assert calls["latent"]["noise_mask"].shape == (4, 8, 8)
+    assert calls["latent"]["batch_index"] == [0, 1, 0, 1]
+    assert torch.equal(calls["noise"][2:], comfy.sample.prepare_noise(latent["samples"], 7, [0, 1]))
+    # Each member's row of the batched conditioning is repeated for every latent of that member
+    assert [row.max().item() for row in calls["positive"][0][0]] == [0, 0, 1, 1]
+    assert calls["negative"][0][0].shape[0] == 1
+    assert calls["disable_noise"] is False
+
+
+def test_queue_get_coalesced_takes_matching_items_in_order():
+    queue = PromptQueue(MagicMock())
+    queue.put(_item(0, _prompt(seed=1)))
+    queue.put(_item(1, _prompt(steps=30)))
+    queue.put(_item(2, _prompt(seed=2)))
+    queue.put(_item(3, _prompt(seed=3)))
+
+    taken = queue.get_coalesced(timeout=0, max_items=2, key_function=coalesce_key)
+    assert [item[1] for item, _ in taken] == ["prompt-0", "prompt-2"]
+    assert len(queue.currently_running) == 2
+    assert [item[1] for item, _ in queue.get_coalesced(timeout=0, max_items=2, key_function=coalesce_key)] == ["prompt-1"]
+    assert [item[1] for item, _ in queue.get_coalesced(timeout=0, max_items=2, key_function=coalesce_key)] == ["prompt-3"]
+    assert queue.get_coalesced(timeout=0, max_items=2, key_function=coalesce_key) == []
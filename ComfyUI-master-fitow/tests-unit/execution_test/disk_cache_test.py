@@ -0,0 +1,161 @@
+"""
+Unit tests for the persistent output cache tier (comfy_execution.disk_cache).
+
+Tests cover:
+- Nested outputs (lists, tuples, str-keyed dicts, CPU tensors) round-trip through safetensors files
+- Unsupported values are not persisted; unreadable files are discarded
+- Entries written by one store are visible to another store on the same directory
+- Eviction removes the least recently used files once the size cap is exceeded
+- DiskBackedCache fills the RAM cache from disk and skips output nodes
+"""
+import asyncio
+import os
+from typing import NamedTuple
+
+import pytest
+import torch
+
+import nodes
+from comfy_execution.caching import CacheKeySetInputSignature, HierarchicalCache
+from comfy_execution.disk_cache import DiskBackedCache, DiskCacheStore
+from comfy_execution.graph import DynamicPrompt
+
+
+class _Entry(NamedTuple):
+    ui: dict
+    outputs: list
+
+
+class _Node:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {}}
+
+
+class _OutputNode(_Node):
+    OUTPUT_NODE = True
+
+
+class _IsChanged:
+    async def get(self, node_id):
+        return False
+
+
+@pytest.fixture(autouse=True)
+def node_classes(monkeypatch):
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestNode", _Node)
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestOutputNode", _OutputNode)
+
+
+def _key(i):
+    return bytes([i]) * 20
+
+
+def _saved(store, key, ui, outputs):
+    assert store.save(key, ui, outputs)
+    store.flush()
+    return store.path_for(key)
+
+
+def test_round_trip(tmp_path):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    image = torch.rand(1, 8, 8, 3)
+    cond = torch.rand(1, 77, 16, dtype=torch.float16)
+    outputs = [[image], [[cond, {"pooled_output": cond[:, 0]}]], [{"samples": torch.zeros(1, 4, 8, 8)}], [("a", 1, 2.5, None, True)]]
+    ui = {"text": ["done"]}
+    _saved(store, _key(1), ui, outputs)
+
+    loaded_ui, loaded = DiskCacheStore(str(tmp_path), max_bytes=1 << 30).load(_key(1))
+    assert loaded_ui == ui
+    assert torch.equal(loaded[0][0], image)
+    assert torch.equal(loaded[1][0][0], cond) and loaded[1][0][0].dtype == torch.float16
+    assert torch.equal(loaded[1][0][1]["pooled_output"], cond[:, 0])
+    assert torch.equal(loaded[2][0]["samples"], torch.zeros(1, 4, 8, 8))
+    assert loaded[3][0] == ("a", 1, 2.5, None, True)
+
+
+@pytest.mark.parametrize("outputs", [[object()], [{1: "int key"}], [b"bytes"]])
+def test_unsupported_values_are_not_persisted(tmp_path, outputs):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    assert not store.save(_key(1), None, outputs)
+    store.flush()
+    assert not os.path.exists(store.path_for(_key(1)))
+
+
+def test_missing_and_corrupt_entries(tmp_path):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    assert store.load(_key(1)) is None
+
+    path = store.path_for(_key(2))
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(b"not a safetensors file")
+    assert store.load(_key(2)) is None
+    assert not os.path.exists(path)
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    paths = [_saved(store, _key(i), None, [torch.zeros(1024)]) for i in range(4)]
+    for age, path in enumerate(paths):
+        os.utime(path, (1000 + age, 1000 + age))
+    # A hit makes the oldest entry the most recently used one
+    assert store.load(_key(0)) is not None
+
+    # Room for two entries after trimming to 90% of the cap
+    store.max_bytes = int(os.path.getsize(paths[0]) * 2.5)
+    store.evict()
+    assert [os.path.exists(p) for p in paths] == [True, False, False, True]
+
+
+def test_stale_temp_files_are_removed(tmp_path):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    stale = tmp_path / "leftover.safetensors.123.abcd.tmp"
+    stale.write_bytes(b"x")
+    os.utime(stale, (0, 0))
+    store.evict()
+    assert not stale.exists()
+
+
+def _cache(store):
+    return DiskBackedCache(HierarchicalCache(CacheKeySetInputSignature), store, _Entry)
+
+
+def _prompt():
+    return {
+        "1": {"class_type": "TestNode", "inputs": {"seed": 1}},
+        "2": {"class_type": "TestOutputNode", "inputs": {"x": ["1", 0]}},
+    }
+
+
+def test_disk_backed_cache_survives_restart(tmp_path):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    prompt = _prompt()
+    cache = _cache(store)
+    asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), _IsChanged()))
+    latent = torch.rand(1, 4, 8, 8)
+    cache.set("1", _Entry(ui=None, outputs=[[latent]]))
+    cache.set("2", _Entry(ui={"images": []}, outputs=[]))
+    store.flush()
+    assert store.stats["writes"] == 1
+
+    # A fresh RAM cache, as after a restart or in another instance
+    restarted = _cache(DiskCacheStore(str(tmp_path), max_bytes=1 << 30))
+    asyncio.run(restarted.set_prompt(DynamicPrompt(prompt), prompt.keys(), _IsChanged()))
+    entry = restarted.get("1")
+    assert isinstance(entry, _Entry)
+    assert torch.equal(entry.outputs[0][0], latent)
+    assert restarted.cache.get("1") is entry
+    assert restarted.get("2") is None
+
+
+def test_write_back_of_cached_value_is_not_rewritten(tmp_path):
+    store = DiskCacheStore(str(tmp_path), max_bytes=1 << 30)
+    prompt = _prompt()
+    cache = _cache(store)
+    asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), _IsChanged()))
+    entry = _Entry(ui=None, outputs=[[torch.zeros(4)]])
+    cache.set("1", entry)
+    cache.set("1", entry)
+    store.flush()
+    assert store.stats["writes"] == 1
@@ -0,0 +1,138 @@
+"""
+Unit tests for prompt history storage (comfy_execution.history).
+
+Tests cover:
+- The in-memory window keeps the legacy /history max_items/offset behaviour
+- since/before cursors, status and time filters, with and without the database
+- Entries past the in-memory window (or from a previous run) are served from the database
+- Deletes only remove entries recorded before them
+- Instances sharing a database keep separate histories; stored entries are limited by count and age
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import db
+from app.history.models import PromptHistory
+from comfy_execution.history import HistoryStore
+
+
+def _entry(prompt_id, status="success", create_time=1000):
+    return {
+        "prompt": (0, prompt_id, {}, {"create_time": create_time}, []),
+        "outputs": {"9": {"images": [f"{prompt_id}.png"]}},
+        "status": {"status_str": status, "completed": status == "success", "messages": []},
+    }
+
+
+def _fill(store, count, failed=()):
+    for i in range(count):
+        store.add(f"p{i}", _entry(f"p{i}", "error" if i in failed else "success"))
+
+
+@pytest.fixture
+def database(monkeypatch):
+    # One connection shared by the test and the writer thread
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    PromptHistory.__table__.create(engine)
+    monkeypatch.setattr(db, "_DB_AVAILABLE", True)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    return engine
+
+
+def test_window_matches_legacy_history():
+    store = HistoryStore(max_hot_items=3)
+    _fill(store, 5)
+    assert list(store.window()) == ["p2", "p3", "p4"]
+    assert list(store.window(max_items=2)) == ["p3", "p4"]
+    assert list(store.window(max_items=2, offset=0)) == ["p2", "p3"]
+    assert store.get("p4")["outputs"]["9"]["images"] == ["p4.png"]
+    assert store.get("p0") is None
+
+
+@pytest.mark.parametrize("with_database", [False, True])
+def test_cursor_and_filters(request, with_database):
+    if with_database:
+        request.getfixturevalue("database")
+    store = HistoryStore(max_hot_items=100)
+    _fill(store, 6, failed=(1, 4))
+
+    assert list(store.query(max_items=2, since="p1")) == ["p2", "p3"]
+    assert list(store.query(max_items=10, since="p5")) == []
+    assert list(store.query(max_items=2, before="p3")) == ["p1", "p2"]
+    assert list(store.query(status="error")) == ["p1", "p4"]
+    assert list(store.query(max_items=3, status="success")) == ["p2", "p3", "p5"]
+    # An unknown cursor is ignored, so the newest entries come back
+    assert list(store.query(max_items=2, since="gone")) == ["p4", "p5"]
+    latest = store.hot["p5"].completed_at
+    assert list(store.query(since_time=latest)) == []
+    assert "p5" in store.query(since_time=latest - 1)
+
+
+def test_entries_outside_the_window_come_from_the_database(database):
+    store = HistoryStore(max_hot_items=2)
+    _fill(store, 5)
+    assert list(store.hot) == ["p3", "p4"]
+    store.flush()
+
+    old = store.get("p0")
+    assert old["outputs"] == {"9": {"images": ["p0.png"]}}
+    assert old["prompt"][3] == {"create_time": 1000}
+    assert list(store.query(max_items=2, since="p0")) == ["p1", "p2"]
+
+    # A new store (after a restart) continues the sequence
+    restarted = HistoryStore(max_hot_items=2)
+    restarted.add("p5", _entry("p5"))
+    assert list(restarted.query(max_items=10, since="p3")) == ["p4", "p5"]
+    assert list(restarted.window()) == ["p5"]
+
+
+def test_rerun_replaces_entry_and_delete_keeps_later_runs(database):
+    store = HistoryStore(max_hot_items=10)
+    _fill(store, 3)
+    store.add("p0", _entry("p0", "error"))
+    assert list(store.query(max_items=10)) == ["p1", "p2", "p0"]
+
+    store.delete("p1")
+    store.add("p1", _entry("p1"))
+    store.flush()
+    assert list(store.query(max_items=10)) == ["p2", "p0", "p1"]
+
+    store.clear()
+    store.flush()
+    assert store.query(max_items=10) == {}
+    assert store.get("p2") is None
+
+
+def test_instances_sharing_a_database_keep_separate_histories(database):
+    first = HistoryStore(max_hot_items=1, instance=lambda: "/a/user")
+    second = HistoryStore(max_hot_items=1, instance=lambda: "/b/user")
+    for i in range(3):
+        first.add(f"p{i}", _entry(f"p{i}"))
+        second.add(f"p{i}", _entry(f"p{i}", "error"))
+    first.flush()
+    second.flush()
+
+    assert list(first.query(max_items=10, since="p0")) == ["p1", "p2"]
+    assert first.get("p0")["status"]["status_str"] == "success"
+    assert second.get("p0")["status"]["status_str"] == "error"
+    second.clear()
+    second.flush()
+    assert second.query(max_items=10) == {}
+    assert list(first.query(max_items=10)) == ["p0", "p1", "p2"]
+
+
+def test_stored_entries_are_limited_by_count_and_age(database, monkeypatch):
+    store = HistoryStore(max_hot_items=1, max_stored_items=3, max_age_days=1)
+    _fill(store, 5)
+    store.flush()
+    assert list(store.query(max_items=10)) == ["p2", "p3", "p4"]
+
+    later = time.time() + 2 * 86400
+    monkeypatch.setattr("comfy_execution.history.time.time", lambda: later)
+    store.add("p5", _entry("p5"))
+    store.flush()
+    assert list(store.query(max_items=10)) == ["p5"]
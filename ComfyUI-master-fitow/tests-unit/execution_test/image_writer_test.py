@@ -0,0 +1,101 @@
+"""
+Unit tests for background image writing (comfy_execution.image_writer).
+
+Tests cover:
+- Encoding PNG, WebP and JPEG with the prompt metadata
+- Writes are deferred inside a prompt, flushed per prompt, and report failures with their node
+- SaveImage produces the same pixels as the previous per-image conversion
+"""
+import os
+import threading
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from comfy_execution import image_writer
+from comfy_execution.image_writer import ImageWriter, build_metadata, write_image
+from comfy_execution.utils import CurrentNodeContext
+
+
+@pytest.fixture
+def array():
+    return np.random.default_rng(0).integers(0, 256, size=(16, 24, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("image_format", ["png", "webp", "jpeg"])
+def test_write_image_with_metadata(tmp_path, array, image_format):
+    path = str(tmp_path / f"out.{image_writer.FORMAT_EXTENSIONS[image_format]}")
+    metadata = build_metadata(image_format, {"1": {"class_type": "KSampler"}}, {"workflow": {"nodes": []}})
+    write_image(path, array, image_format, metadata, 1, 90)
+
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    with Image.open(path) as img:
+        assert img.size == (24, 16)
+        if image_format == "png":
+            assert img.info["prompt"] == '{"1": {"class_type": "KSampler"}}'
+            assert np.array_equal(np.asarray(img), array)
+        else:
+            assert img.getexif()[0x0110] == 'prompt:{"1": {"class_type": "KSampler"}}'
+            assert img.getexif()[0x010F] == 'workflow:{"nodes": []}'
+
+
+def test_writes_are_deferred_and_flushed_per_prompt(tmp_path, array):
+    writer = ImageWriter(workers=2)
+    release = threading.Event()
+
+    def slow_write(path, *args):
+        release.wait(5)
+        write_image(path, *args)
+
+    first = str(tmp_path / "a.png")
+    with CurrentNodeContext("prompt-1", "9"):
+        writer.submit(first, slow_write, array)
+    with CurrentNodeContext("prompt-2", "9"):
+        writer.submit(str(tmp_path / "b.png"), write_image, array)
+
+    assert writer.is_pending(first)
+    assert not os.path.exists(first)
+    assert writer.flush("prompt-2") == []
+    release.set()
+    writer.wait_for(first)
+    assert os.path.exists(first)
+    assert writer.flush("prompt-1") == []
+    assert not writer.is_pending(first)
+
+
+def test_failed_write_is_reported_with_its_node(tmp_path, array):
+    writer = ImageWriter(workers=1)
+    with CurrentNodeContext("prompt", "12"):
+        writer.submit(str(tmp_path / "missing" / "a.png"), write_image, array)
+        writer.submit(str(tmp_path / "b.png"), write_image, array)
+    failures = writer.flush("prompt")
+    assert [(node_id, type(ex)) for node_id, ex in failures] == [("12", FileNotFoundError)]
+    assert os.listdir(tmp_path) == ["b.png"]
+
+
+def test_writes_outside_a_prompt_are_synchronous(tmp_path, array):
+    writer = ImageWriter(workers=2)
+    path = str(tmp_path / "a.png")
+    writer.submit(path, write_image, array)
+    assert os.path.exists(path)
+
+
+def test_save_image_matches_previous_conversion(tmp_path, monkeypatch):
+    import nodes
+    images = torch.rand(3, 8, 8, 3) * 1.2 - 0.1
+    node = nodes.SaveImage()
+    node.output_dir = str(tmp_path)
+    monkeypatch.setattr(image_writer, "writer", ImageWriter(workers=2))
+
+    with CurrentNodeContext("prompt", "9"):
+        result = node.save_images(images, "test")
+    assert image_writer.writer.flush("prompt") == []
+
+    files = [r["filename"] for r in result["ui"]["images"]]
+    assert files == ["test_00001_.png", "test_00002_.png", "test_00003_.png"]
+    for image, file in zip(images, files):
+        expected = np.clip(255. * image.numpy(), 0, 255).astype(np.uint8)
+        with Image.open(tmp_path / file) as img:
+            assert np.array_equal(np.asarray(img), expected)
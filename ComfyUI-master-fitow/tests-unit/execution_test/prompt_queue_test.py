@@ -0,0 +1,87 @@
+"""
+Unit tests for PromptQueue's prompt_id index, lazy deletion and snapshots.
+
+Tests cover:
+- Items come out in priority order, skipping deleted ones
+- Deleting by prompt_id leaves tombstones that are compacted away
+- Snapshots are reused until the queue changes and hold the queued items themselves
+- Several queued items may share a prompt_id
+"""
+from unittest.mock import MagicMock
+
+from execution import PromptQueue
+
+
+def _item(number, prompt_id=None):
+    return (number, prompt_id or f"p{number}", {"1": {"class_type": "Node", "inputs": {}}}, {}, ["1"], {})
+
+
+def _queue(*numbers):
+    queue = PromptQueue(MagicMock())
+    for number in numbers:
+        queue.put(_item(number))
+    return queue
+
+
+def test_get_returns_items_in_priority_order_skipping_deleted():
+    queue = _queue(3, 1, 2, 0)
+    assert queue.delete_queue_items(["p1", "missing"]) == 1
+    assert queue.delete_queue_item(lambda item: item[1] == "p2")
+    assert queue.get_tasks_remaining() == 2
+
+    item, item_id = queue.get(timeout=0)
+    assert item[1] == "p0"
+    assert queue.currently_running[item_id] is item
+    assert queue.get(timeout=0)[0][1] == "p3"
+    assert queue.get(timeout=0) is None
+    assert queue.get_tasks_remaining() == 2
+
+
+def test_tombstones_are_compacted():
+    queue = _queue(*range(200))
+    queue.delete_queue_items([f"p{i}" for i in range(150)])
+    assert queue.queued_count == 50
+    assert len(queue.queue) < 150
+    assert sorted(item[0] for item in queue.get_current_queue()[1]) == list(range(150, 200))
+    assert [queue.get(timeout=0)[0][0] for _ in range(50)] == list(range(150, 200))
+
+
+def test_snapshot_is_reused_until_the_queue_changes():
+    queue = _queue(0, 1)
+    snapshot = queue.get_snapshot()
+    assert queue.get_snapshot() is snapshot
+    assert queue.get_current_queue_volatile()[1] is snapshot.queued
+    assert {item[1] for item in snapshot.queued} == {"p0", "p1"}
+
+    _, item_id = queue.get(timeout=0)
+    running, queued = queue.get_current_queue_volatile()
+    assert [item[1] for item in running] == ["p0"]
+    assert [item[1] for item in queued] == ["p1"]
+    queue.task_done(item_id, {}, status=None)
+    assert queue.get_snapshot().running == ()
+    assert queue.get_snapshot().version > snapshot.version
+
+
+def test_duplicate_prompt_ids():
+    queue = PromptQueue(MagicMock())
+    queue.put(_item(0, "same"))
+    queue.put(_item(1, "same"))
+    running, queued = queue.get_queue_items("same")
+    assert running == [] and len(queued) == 2
+
+    queue.get(timeout=0)
+    running, queued = queue.get_queue_items("same")
+    assert [item[0] for item in running] == [0]
+    assert [item[0] for item in queued] == [1]
+    assert queue.delete_queue_items(["same"]) == 1
+    assert queue.get(timeout=0) is None
+
+
+def test_wipe_queue():
+    queue = _queue(0, 1, 2)
+    queue.delete_queue_items(["p1"])
+    queue.wipe_queue()
+    assert queue.get_tasks_remaining() == 0
+    assert queue.get_snapshot().queued == ()
+    queue.put(_item(5))
+    assert queue.get(timeout=0)[0][1] == "p5"
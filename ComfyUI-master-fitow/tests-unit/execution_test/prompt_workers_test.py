@@ -0,0 +1,116 @@
+"""
+Unit tests for running several prompt workers in one process (comfy_execution.workers).
+
+Tests cover:
+- Each WorkerServer keeps its own client/node state and shares everything else with the server
+- Queue flags taken by one worker reach the others
+- Interrupts only stop the worker running the targeted prompt
+- Progress state is tracked per worker thread and per executing prompt
+- A worker waits instead of repatching weights another worker is running on
+"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+import comfy.model_management
+import comfy.model_patcher
+from comfy_execution.graph import DynamicPrompt
+from comfy_execution.progress import get_progress_state, reset_progress_state
+from comfy_execution.utils import CurrentNodeContext
+from comfy_execution.workers import WorkerServer, distribute_flags, interrupt_workers
+
+
+def _run_in_thread(function, *args):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", function(*args)))
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def test_worker_server_keeps_its_own_execution_state():
+    server = SimpleNamespace(client_id="server-client", sockets_metadata={"a": {}})
+    worker = WorkerServer(server, 0)
+    worker.client_id = "worker-client"
+    assert server.client_id == "server-client"
+    assert worker.sockets_metadata is server.sockets_metadata
+
+
+def test_flags_reach_every_worker():
+    workers = [WorkerServer(None, i) for i in range(3)]
+    assert distribute_flags(workers, workers[0], {"free_memory": True}) == {"free_memory": True}
+    assert distribute_flags(workers, workers[1], {}) == {"free_memory": True}
+    assert distribute_flags(workers, workers[1], {}) == {}
+    assert distribute_flags(workers, workers[2], {"unload_models": True}) == {"free_memory": True, "unload_models": True}
+
+
+@pytest.fixture
+def clear_interrupts():
+    yield
+    comfy.model_management.interrupted_threads.clear()
+    comfy.model_management.interrupt_current_processing(False)
+
+
+def test_interrupt_targets_the_running_worker(clear_interrupts):
+    workers = [WorkerServer(None, i) for i in range(2)]
+    workers[0].thread_id, workers[0].running_prompt_ids = threading.get_ident(), ("a",)
+    workers[1].thread_id, workers[1].running_prompt_ids = -1, ("b",)
+
+    assert not interrupt_workers(workers, "c")
+    assert interrupt_workers(workers, "b")
+    assert not comfy.model_management.processing_interrupted()
+    comfy.model_management.throw_exception_if_processing_interrupted()
+
+    assert interrupt_workers(workers)
+    with pytest.raises(comfy.model_management.InterruptProcessingException):
+        comfy.model_management.throw_exception_if_processing_interrupted()
+    assert not comfy.model_management.processing_interrupted()
+    assert comfy.model_management.interrupted_threads == {-1}
+
+
+def test_progress_state_is_per_worker():
+    def run(prompt_id):
+        reset_progress_state(prompt_id, DynamicPrompt({}))
+        return get_progress_state()
+
+    first = _run_in_thread(run, "first")
+    second = _run_in_thread(run, "second")
+    assert (first.prompt_id, second.prompt_id) == ("first", "second")
+    # Helper threads find their prompt's registry through the executing context
+    with CurrentNodeContext("first", "1"):
+        assert get_progress_state() is first
+
+
+def test_worker_waits_for_shared_weights():
+    cpu = torch.device("cpu")
+    patcher = comfy.model_patcher.ModelPatcher(torch.nn.Linear(2, 2), load_device=cpu, offload_device=cpu)
+    loaded = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def first_worker():
+        comfy.model_management.load_models_gpu([patcher])
+        loaded.set()
+        release.wait()
+        order.append("released")
+        comfy.model_management.release_models_in_use()
+
+    def second_worker():
+        loaded.wait()
+        comfy.model_management.load_models_gpu([patcher.clone()])
+        order.append("loaded")
+        comfy.model_management.release_models_in_use()
+
+    threads = [threading.Thread(target=first_worker), threading.Thread(target=second_worker)]
+    for thread in threads:
+        thread.start()
+    loaded.wait()
+    threads[1].join(timeout=0.5)
+    assert threads[1].is_alive()
+    release.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert order == ["released", "loaded"]
+    assert comfy.model_management.models_in_use == {}
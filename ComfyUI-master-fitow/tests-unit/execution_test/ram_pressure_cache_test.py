@@ -0,0 +1,133 @@
+"""
+Unit tests for RAMPressureCache memory accounting and budget eviction.
+
+Tests cover:
+- Sizes come from tensor storages and get_ram_usage(), with shared storage counted once
+- Re-setting the same value doesn't change the totals
+- The byte budget evicts older workflows first, then larger entries
+- Evictions show up in get_stats()
+"""
+import asyncio
+from typing import NamedTuple
+
+import pytest
+import torch
+
+import nodes
+from comfy_execution.caching import CacheKeySetInputSignature, RAMPressureCache, measure_storages
+from comfy_execution.graph import DynamicPrompt
+
+MB = 1024 * 1024
+
+
+class _Entry(NamedTuple):
+    ui: dict
+    outputs: list
+
+
+class _Node:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {}}
+
+
+class _IsChanged:
+    async def get(self, node_id):
+        return False
+
+
+class _Model:
+    def __init__(self, module, size):
+        self.model = module
+        self.size = size
+
+    def get_ram_usage(self):
+        return self.size
+
+
+@pytest.fixture(autouse=True)
+def node_classes(monkeypatch):
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestNode", _Node)
+
+
+def _tensor(mb):
+    return torch.zeros(mb * MB, dtype=torch.uint8)
+
+
+def _prompt(*seeds):
+    return {str(seed): {"class_type": "TestNode", "inputs": {"seed": seed}} for seed in seeds}
+
+
+def _set_prompt(cache, prompt):
+    asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), _IsChanged()))
+
+
+def test_shared_storage_is_counted_once():
+    base = _tensor(2)
+    module = torch.nn.Linear(1, 1)
+    storages = measure_storages([[base, base[:MB]], {"samples": base}, _Model(module, 10 * MB), _Model(module, 10 * MB)])
+    assert sorted(nbytes for nbytes, _ in storages.values()) == [2 * MB, 10 * MB]
+
+
+def test_totals_follow_inserts_and_rewrites():
+    cache = RAMPressureCache(CacheKeySetInputSignature)
+    _set_prompt(cache, _prompt(1, 2))
+    shared = _tensor(1)
+    entry = _Entry(ui=None, outputs=[[shared, _tensor(2)]])
+    cache.set("1", entry)
+    cache.set("1", entry)
+    cache.set("2", _Entry(ui=None, outputs=[[shared]]))
+    assert cache.ram_bytes == 3 * MB
+
+    cache.set("1", _Entry(ui=None, outputs=[[_tensor(4)]]))
+    assert cache.ram_bytes == 5 * MB
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_budget_evicts_older_workflows_first():
+    cache = RAMPressureCache(CacheKeySetInputSignature, max_ram_bytes=4 * MB)
+    _set_prompt(cache, _prompt(1))
+    cache.set("1", _Entry(ui=None, outputs=[[_tensor(2)]]))
+    _set_prompt(cache, _prompt(2, 3))
+    cache.set("2", _Entry(ui=None, outputs=[[_tensor(2)]]))
+    cache.set("3", _Entry(ui=None, outputs=[[_tensor(2)]]))
+
+    cache.poll(ram_headroom=0)
+    assert cache.ram_bytes == 4 * MB
+    assert cache.get("1") is None
+    assert cache.get("2") is not None and cache.get("3") is not None
+
+
+def test_budget_evicts_larger_entries_first_within_a_workflow():
+    cache = RAMPressureCache(CacheKeySetInputSignature, max_ram_bytes=4 * MB)
+    _set_prompt(cache, _prompt(1, 2, 3))
+    cache.set("1", _Entry(ui=None, outputs=[[_tensor(1)]]))
+    cache.set("2", _Entry(ui=None, outputs=[[_tensor(3)]]))
+    cache.set("3", _Entry(ui=None, outputs=[[_tensor(2)]]))
+
+    cache.poll(ram_headroom=0)
+    assert cache.get("2") is None
+    assert cache.ram_bytes == 3 * MB
+
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["evicted_ram_bytes"] == 3 * MB
+    eviction = stats["recent_evictions"][0]
+    assert eviction["reason"] == "ram_budget"
+    assert eviction["class_type"] == "TestNode"
+    assert eviction["ram_bytes"] == 3 * MB
+    assert [e["ram_bytes"] for e in stats["largest_entries"]] == [2 * MB, 1 * MB]
+
+
+def test_evicting_shared_storage_frees_nothing_until_last_reference():
+    cache = RAMPressureCache(CacheKeySetInputSignature, max_ram_bytes=MB)
+    _set_prompt(cache, _prompt(1))
+    shared = _tensor(2)
+    cache.set("1", _Entry(ui=None, outputs=[[shared]]))
+    _set_prompt(cache, _prompt(2))
+    cache.set("2", _Entry(ui=None, outputs=[[shared[:MB]]]))
+
+    cache.poll(ram_headroom=0)
+    stats = cache.get_stats()
+    assert stats["entries"] == 0 and cache.ram_bytes == 0
+    assert [e["freed_ram_bytes"] for e in stats["recent_evictions"]] == [0, 2 * MB]
@@ -0,0 +1,110 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import folder_paths
+from api_server.routes.internal.internal_routes import InternalRoutes
+
+pytestmark = (
+    pytest.mark.asyncio
+)  # This applies the asyncio mark to all test functions in the module
+
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def saved_directories():
+    saved = (
+        folder_paths.get_output_directory(),
+        folder_paths.get_temp_directory(),
+        folder_paths.get_input_directory(),
+        folder_paths.get_user_directory(),
+    )
+    yield
+    folder_paths.set_output_directory(saved[0])
+    folder_paths.set_temp_directory(saved[1])
+    folder_paths.set_input_directory(saved[2])
+    folder_paths.set_user_directory(saved[3])
+
+
+@pytest.fixture
+def prompt_server():
+    server = MagicMock()
+    server.prompt_queue.get_tasks_remaining.return_value = 0
+    return server
+
+
+@pytest.fixture
+def pooled_env():
+    env = {"PLATFORM_WARM_POOL": "1", "PLATFORM_CALLBACK_SECRET": SECRET}
+    with patch.dict(os.environ, env):
+        yield
+
+
+@pytest.fixture
+def app(prompt_server):
+    return InternalRoutes(prompt_server).get_app()
+
+
+def test_set_base_directory(tmp_path, saved_directories):
+    dirs = folder_paths.set_base_directory(str(tmp_path))
+    assert folder_paths.get_output_directory() == str(tmp_path / "output")
+    assert folder_paths.get_temp_directory() == str(tmp_path / "temp")
+    assert folder_paths.get_input_directory() == str(tmp_path / "input")
+    assert folder_paths.get_user_directory() == str(tmp_path / "user")
+    assert all(os.path.isdir(d) for d in dirs.values())
+
+
+async def test_assign_disabled_without_pool_flag(aiohttp_client, app, tmp_path):
+    client = await aiohttp_client(app)
+    with patch.dict(os.environ, {"PLATFORM_WARM_POOL": "", "PLATFORM_CALLBACK_SECRET": SECRET}):
+        resp = await client.post(
+            "/platform/assign", json={"base_directory": str(tmp_path)}, headers={"X-Platform-Secret": SECRET}
+        )
+    assert resp.status == 404
+
+
+async def test_assign_rejects_bad_secret(aiohttp_client, app, pooled_env, tmp_path):
+    client = await aiohttp_client(app)
+    resp = await client.post(
+        "/platform/assign", json={"base_directory": str(tmp_path)}, headers={"X-Platform-Secret": "wrong"}
+    )
+    assert resp.status == 403
+
+
+async def test_assign_rejects_relative_path(aiohttp_client, app, pooled_env):
+    client = await aiohttp_client(app)
+    resp = await client.post(
+        "/platform/assign", json={"base_directory": "relative/dir"}, headers={"X-Platform-Secret": SECRET}
+    )
+    assert resp.status == 400
+
+
+async def test_assign_rejects_busy_instance(aiohttp_client, app, pooled_env, prompt_server, tmp_path):
+    client = await aiohttp_client(app)
+    prompt_server.prompt_queue.get_tasks_remaining.return_value = 1
+    resp = await client.post(
+        "/platform/assign", json={"base_directory": str(tmp_path)}, headers={"X-Platform-Secret": SECRET}
+    )
+    assert resp.status == 409
+
+
+async def test_assign_repoints_directories_once(aiohttp_client, app, pooled_env, saved_directories, tmp_path):
+    client = await aiohttp_client(app)
+    resp = await client.post(
+        "/platform/assign",
+        json={"base_directory": str(tmp_path), "project_id": 42},
+        headers={"X-Platform-Secret": SECRET},
+    )
+    assert resp.status == 200
+    body = await resp.json()
+    assert body["project_id"] == 42
+    assert folder_paths.get_output_directory() == str(tmp_path / "output")
+    assert os.environ["PLATFORM_PROJECT_ID"] == "42"
+
+    # An assigned instance leaves the pool and cannot be re-pointed again
+    resp = await client.post(
+        "/platform/assign", json={"base_directory": str(tmp_path)}, headers={"X-Platform-Secret": SECRET}
+    )
+    assert resp.status == 404
@@ -11,8 +11,13 @@ from app.core.init_app import (
     register_exceptions,
     register_routers,
 )
+from app.services.audit_log_writer import audit_log_writer
+from app.services.comfyui_event_ingest import event_ingest_loop
 from app.services.comfyui_history_sync import sync_loop
-from app.services.comfyui_manager import heartbeat_loop
+from app.services.comfyui_manager import heartbeat_loop, lifecycle_loop
+from app.services.comfyui_pool import warm_pool_loop
+from app.services.log_partitions import partition_maintenance_loop
+from app.services.server_metrics import server_metrics_loop
 
 try:
     from app.settings.config import settings
@@ -24,16 +29,31 @@ except ImportError:
 async def lifespan(app: FastAPI):
     await init_data()
     stop_event = asyncio.Event()
+    # 审计日志写入任务不取消：停止时写完队列中剩余记录再关闭数据库连接
+    audit_task = asyncio.create_task(audit_log_writer.run(stop_event))
     hb_task = asyncio.create_task(heartbeat_loop(stop_event))
-    sync_task = asyncio.create_task(sync_loop(stop_event, interval_seconds=int(settings.COMFYUI_HISTORY_SYNC_INTERVAL_SECONDS)))
+    tasks = [
+        hb_task,
+        asyncio.create_task(warm_pool_loop(stop_event)),
+        asyncio.create_task(lifecycle_loop(stop_event)),
+        asyncio.create_task(partition_maintenance_loop(stop_event)),
+        asyncio.create_task(server_metrics_loop(stop_event)),
+    ]
+    if settings.COMFYUI_EVENT_INGEST_ENABLED:
+        tasks.append(asyncio.create_task(event_ingest_loop(stop_event)))
+        sync_interval = int(settings.COMFYUI_HISTORY_SYNC_FALLBACK_SECONDS)
+    else:
+        sync_interval = int(settings.COMFYUI_HISTORY_SYNC_INTERVAL_SECONDS)
+    tasks.append(asyncio.create_task(sync_loop(stop_event, interval_seconds=sync_interval)))
     yield
     stop_event.set()
-    hb_task.cancel()
-    sync_task.cancel()
-    with suppress(Exception):
-        await hb_task
-    with suppress(Exception):
-        await sync_task
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(BaseException):
+            await task
+    with suppress(BaseException):
+        await asyncio.wait_for(audit_task, timeout=10)
     await Tortoise.close_connections()
 
 
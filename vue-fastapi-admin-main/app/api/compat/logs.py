@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import base64
 from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Query
 from tortoise.expressions import Q
 
+from app.core.crud import estimate_count
 from app.core.ctx import CTX_USER_ID
 from app.core.dependency import DependPermission
 from app.models.admin import User
 from app.models.platform import GenerationLog, Project
-from app.schemas.base import Success
+from app.schemas.base import Fail, Success
 from app.schemas.platform import GenerationLogCreate
+from app.services.generation_export import (
+    EXPORT_FORMATS,
+    LOG_EXPORT_COLUMNS,
+    export_response,
+    iter_generation_log_rows,
+)
+from app.services.generation_stats import build_log_filter
+from app.services.stat_rollup import create_generation_log
 
 router = APIRouter(prefix="/logs", tags=["日志模块"])
 
@@ -27,7 +37,7 @@ async def create_log(req_in: GenerationLogCreate):
     user_id = CTX_USER_ID.get()
     ts = req_in.timestamp or datetime.now()
 
-    obj = await GenerationLog.create(
+    obj = await create_generation_log(
         user_id=user_id,
         project_id=req_in.project_id,
         timestamp=ts,
@@ -51,42 +61,64 @@ async def create_log(req_in: GenerationLogCreate):
     )
 
 
+def _encode_cursor(ts: datetime, log_id: int) -> str:
+    raw = f"{ts.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    ts, log_id = raw.rsplit("|", 1)
+    return datetime.fromisoformat(ts), int(log_id)
+
+
 @router.get("", summary="查询生成日志", dependencies=[DependPermission])
 async def list_logs(
     user_id: int | None = Query(None, description="用户ID(可选)"),
     project_id: int | None = Query(None, description="项目ID(可选)"),
+    status: str | None = Query(None, description="状态(可选，如 成功/失败)"),
     start: str | None = Query(None, description="开始时间 YYYY-MM-DD 或 YYYY-MM-DD HH:mm:ss"),
-    end: str | None = Query(None, description="结束时间 YYYY-MM-DD 或 YYYY-MM-DD HH:mm:ss"),
+    end: str | None = Query(None, description="结束时间 YYYY-MM-DD（包含当天）或 YYYY-MM-DD HH:mm:ss"),
     current: int = Query(1, ge=1, description="当前页"),
     size: int = Query(20, ge=1, le=200, description="每页数量"),
+    mode: str = Query("page", description="分页模式：page(页码，offset)/cursor(游标，按 timestamp+id)"),
+    cursor: str | None = Query(None, description="游标模式下上一页返回的 next_cursor（为空表示第一页）"),
+    count: str = Query("exact", description="总数统计：exact(精确)/estimate(按执行计划估算)/none(不统计)"),
 ):
-    q = Q()
-    if user_id is not None:
-        q &= Q(user_id=user_id)
-    if project_id is not None:
-        q &= Q(project_id=project_id)
-
-    def parse_dt(s: str) -> datetime:
-        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+    # 与 /logs/export 使用同一过滤条件，导出结果与列表一致
+    q = build_log_filter(start_date=start, end_date=end, project_id=project_id, user_id=user_id, status=status)
+
+    total = None
+    total_estimated = False
+    if count == "estimate":
+        total, total_estimated = await estimate_count(GenerationLog.filter(q))
+    elif count != "none":
+        total = await GenerationLog.filter(q).count()
+
+    next_cursor = None
+    if mode == "cursor":
+        # keyset：WHERE (timestamp, id) < (last_ts, last_id)，可直接利用 (project_id|user_id, timestamp) 复合索引，
+        # 深翻页耗时与页码无关
+        page_q = q
+        if cursor:
             try:
-                return datetime.strptime(s, fmt)
-            except ValueError:
-                pass
-        raise ValueError("invalid datetime format")
-
-    if start:
-        q &= Q(timestamp__gte=parse_dt(start))
-    if end:
-        q &= Q(timestamp__lte=parse_dt(end))
-
-    total = await GenerationLog.filter(q).count()
-    rows = (
-        await GenerationLog.filter(q)
-        .order_by("-timestamp")
-        .offset((current - 1) * size)
-        .limit(size)
-        .all()
-    )
+                last_ts, last_id = _decode_cursor(cursor)
+            except (ValueError, UnicodeDecodeError):
+                return Fail(code=400, msg="invalid cursor")
+            # 顶层的 timestamp <= last_ts 条件使分区表只扫描游标之前的月份分区
+            page_q &= Q(timestamp__lte=last_ts) & (Q(timestamp__lt=last_ts) | Q(id__lt=last_id))
+        rows = await GenerationLog.filter(page_q).order_by("-timestamp", "-id").limit(size + 1).all()
+        if len(rows) > size:
+            rows = rows[:size]
+            next_cursor = _encode_cursor(rows[-1].timestamp, rows[-1].id)
+    else:
+        rows = (
+            await GenerationLog.filter(q)
+            .order_by("-timestamp", "-id")
+            .offset((current - 1) * size)
+            .limit(size)
+            .all()
+        )
 
     # 轻量补齐 user/project 名称
     user_ids = sorted({r.user_id for r in rows})
@@ -114,6 +146,26 @@ async def list_logs(
             "current": current,
             "size": size,
             "total": total,
+            "total_estimated": total_estimated,
+            "next_cursor": next_cursor,
         }
     )
 
+
+@router.get("/export", summary="导出生成日志(CSV/Excel)", dependencies=[DependPermission])
+async def export_logs(
+    user_id: int | None = Query(None, description="用户ID(可选)"),
+    project_id: int | None = Query(None, description="项目ID(可选)"),
+    status: str | None = Query(None, description="状态(可选，如 成功/失败)"),
+    start: str | None = Query(None, description="开始时间 YYYY-MM-DD 或 YYYY-MM-DD HH:mm:ss"),
+    end: str | None = Query(None, description="结束时间 YYYY-MM-DD（包含当天）或 YYYY-MM-DD HH:mm:ss"),
+    file_format: str = Query("csv", alias="format", description="导出格式：csv/xlsx（大数据量建议 csv）"),
+):
+    if file_format not in EXPORT_FORMATS:
+        return Fail(code=400, msg=f"不支持的导出格式：{file_format}")
+
+    q = build_log_filter(start_date=start, end_date=end, project_id=project_id, user_id=user_id, status=status)
+    suffix = f"{(start or 'all')[:10].replace('-','')}_{(end or 'all')[:10].replace('-','')}"
+    return await export_response(
+        f"logs_{suffix}", file_format, LOG_EXPORT_COLUMNS, iter_generation_log_rows(q), title="logs"
+    )
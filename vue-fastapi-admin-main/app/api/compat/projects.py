@@ -11,6 +11,7 @@ from app.core.dependency import DependPermission
 from app.models import User
 from app.models.platform import ComfyUIService, Project
 from app.services.comfyui_manager import ensure_comfyui_service, stop_pid
+from app.services.project_service_cache import invalidate_project
 from app.schemas.base import Fail, Success
 from app.schemas.platform import OpenComfyOut, ProjectCreate, ProjectUpdate
 from app.settings.config import settings
@@ -162,6 +163,7 @@ async def delete_project(project_id: int):
     if svc and svc.pid:
         stop_pid(int(svc.pid))
     await ComfyUIService.filter(project_id=project_id).delete()
+    invalidate_project(project_id)
     await Project.filter(id=project_id).delete()
     return Success(msg="Deleted")
 
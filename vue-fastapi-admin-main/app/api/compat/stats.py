@@ -1,152 +1,80 @@
 from __future__ import annotations
 
-from collections import Counter
-from datetime import datetime
-from io import BytesIO
-from typing import Optional
-
 from fastapi import APIRouter, Query
-from fastapi.responses import StreamingResponse
-from openpyxl import Workbook
-from tortoise.expressions import Q
 
 from app.core.dependency import DependPermission
-from app.models.admin import User
-from app.models.platform import GenerationLog, Project
-from app.schemas.base import Success
+from app.schemas.base import Fail, Success
+from app.services.generation_export import EXPORT_FORMATS, export_response, iter_static_rows
+from app.services.generation_stats import aggregate_generation_logs, build_log_filter, parse_day
+from app.services.stat_rollup import aggregate_rollup
+from app.settings.config import settings
 
 router = APIRouter(tags=["统计模块"])
 
-
-def _parse_date(s: str) -> datetime:
-    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S"):
-        try:
-            return datetime.strptime(s, fmt)
-        except ValueError:
-            pass
-    raise ValueError("invalid date format")
+_EXPORT_COLUMNS = {
+    "day": ["date", "count", "success", "failed"],
+    "project": ["project_id", "project_name", "count", "success", "failed"],
+    "user": ["user_id", "user_name", "count", "success", "failed"],
+    "status": ["status", "count"],
+}
+
+
+async def _aggregate(
+    dimension: str,
+    *,
+    start_date: str | None,
+    end_date: str | None,
+    project_id: int | None,
+    user_id: int | None,
+    status: str | None,
+) -> list[dict]:
+    # 日期范围按天对齐时直接走日汇总表；带具体时间的查询回退到 generation_logs 上的 SQL 聚合
+    start_day, end_day = parse_day(start_date), parse_day(end_date)
+    if settings.STATS_USE_ROLLUP and (not start_date or start_day) and (not end_date or end_day):
+        return await aggregate_rollup(
+            dimension, start_day=start_day, end_day=end_day, project_id=project_id, user_id=user_id, status=status
+        )
+    q = build_log_filter(
+        start_date=start_date, end_date=end_date, project_id=project_id, user_id=user_id, status=status
+    )
+    return await aggregate_generation_logs(dimension, q)
 
 
 @router.get("/stats", summary="统计聚合", dependencies=[DependPermission])
 async def get_stats(
-    dimension: str = Query("day", description="维度：day/project/user"),
+    dimension: str = Query("day", description="维度：day/project/user/status"),
     start_date: str | None = Query(None, description="开始日期 YYYY-MM-DD"),
     end_date: str | None = Query(None, description="结束日期 YYYY-MM-DD"),
     project_id: int | None = Query(None, description="项目ID(可选)"),
     user_id: int | None = Query(None, description="用户ID(可选)"),
     status: str | None = Query(None, description="状态(可选，如 成功/失败)"),
 ):
-    q = Q()
-    if start_date:
-        q &= Q(timestamp__gte=_parse_date(start_date))
-    if end_date:
-        q &= Q(timestamp__lte=_parse_date(end_date))
-    if project_id is not None:
-        q &= Q(project_id=project_id)
-    if user_id is not None:
-        q &= Q(user_id=user_id)
-    if status:
-        q &= Q(status=status)
-
-    rows = await GenerationLog.filter(q).all()
-
-    keys: list[str] = []
-    if dimension == "day":
-        keys = [r.timestamp.strftime("%Y-%m-%d") for r in rows]
-        counter = Counter(keys)
-        data = [{"date": k, "count": counter[k]} for k in sorted(counter.keys())]
-    elif dimension == "project":
-        keys = [str(r.project_id) for r in rows]
-        counter = Counter(keys)
-        ids = [int(k) for k in counter.keys()]
-        projects = {p.id: p for p in await Project.filter(id__in=ids).all()} if ids else {}
-        data = [
-            {
-                "project_id": int(k),
-                "project_name": projects.get(int(k)).name if int(k) in projects else "",
-                "count": counter[k],
-            }
-            for k in sorted(counter.keys(), key=int)
-        ]
-    elif dimension == "user":
-        keys = [str(r.user_id) for r in rows]
-        counter = Counter(keys)
-        ids = [int(k) for k in counter.keys()]
-        users = {u.id: u for u in await User.filter(id__in=ids).all()} if ids else {}
-        data = [
-            {
-                "user_id": int(k),
-                "user_name": users.get(int(k)).username if int(k) in users else "",
-                "count": counter[k],
-            }
-            for k in sorted(counter.keys(), key=int)
-        ]
-    else:
-        data = []
-
+    data = await _aggregate(
+        dimension, start_date=start_date, end_date=end_date, project_id=project_id, user_id=user_id, status=status
+    )
     return Success(data=data)
 
 
-@router.get("/export", summary="导出统计(Excel)", dependencies=[DependPermission])
+@router.get("/export", summary="导出统计(Excel/CSV)", dependencies=[DependPermission])
 async def export_stats(
-    dimension: str = Query("day", description="维度：day/project/user"),
+    dimension: str = Query("day", description="维度：day/project/user/status"),
     start_date: str | None = Query(None, description="开始日期 YYYY-MM-DD"),
     end_date: str | None = Query(None, description="结束日期 YYYY-MM-DD"),
     project_id: int | None = Query(None, description="项目ID(可选)"),
     user_id: int | None = Query(None, description="用户ID(可选)"),
     status: str | None = Query(None, description="状态(可选，如 成功/失败)"),
+    file_format: str = Query("xlsx", alias="format", description="导出格式：xlsx/csv"),
 ):
-    q = Q()
-    if start_date:
-        q &= Q(timestamp__gte=_parse_date(start_date))
-    if end_date:
-        q &= Q(timestamp__lte=_parse_date(end_date))
-    if project_id is not None:
-        q &= Q(project_id=project_id)
-    if user_id is not None:
-        q &= Q(user_id=user_id)
-    if status:
-        q &= Q(status=status)
-    rows = await GenerationLog.filter(q).all()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "stats"
-
-    if dimension == "day":
-        ws.append(["date", "count"])
-        counter = Counter([r.timestamp.strftime("%Y-%m-%d") for r in rows])
-        for k in sorted(counter.keys()):
-            ws.append([k, counter[k]])
-    elif dimension == "project":
-        ws.append(["project_id", "project_name", "count"])
-        counter = Counter([str(r.project_id) for r in rows])
-        ids = [int(k) for k in counter.keys()]
-        projects = {p.id: p for p in await Project.filter(id__in=ids).all()} if ids else {}
-        for k in sorted(counter.keys(), key=int):
-            pid = int(k)
-            ws.append([pid, projects.get(pid).name if pid in projects else "", counter[k]])
-    elif dimension == "user":
-        ws.append(["user_id", "user_name", "count"])
-        counter = Counter([str(r.user_id) for r in rows])
-        ids = [int(k) for k in counter.keys()]
-        users = {u.id: u for u in await User.filter(id__in=ids).all()} if ids else {}
-        for k in sorted(counter.keys(), key=int):
-            uid = int(k)
-            ws.append([uid, users.get(uid).username if uid in users else "", counter[k]])
-    else:
-        ws.append(["key", "count"])
+    if file_format not in EXPORT_FORMATS:
+        return Fail(code=400, msg=f"不支持的导出格式：{file_format}")
 
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
+    data = await _aggregate(
+        dimension, start_date=start_date, end_date=end_date, project_id=project_id, user_id=user_id, status=status
+    )
+    columns = _EXPORT_COLUMNS.get(dimension) or ["key", "count"]
+    rows = ([row.get(c, "") for c in columns] for row in data)
 
     suffix = f"{(start_date or 'all').replace('-','')}_{(end_date or 'all').replace('-','')}"
-    filename = f"stats_{dimension}_{suffix}.xlsx"
-    headers = {"Content-Disposition": f'attachment; filename=\"{filename}\"'}
-    return StreamingResponse(
-        buf,
-        headers=headers,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    return await export_response(
+        f"stats_{dimension}_{suffix}", file_format, columns, iter_static_rows(rows), title="stats"
     )
-
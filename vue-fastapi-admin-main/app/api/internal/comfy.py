@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, List, Optional
 
 from fastapi import APIRouter, Header
 from pydantic import BaseModel, Field
 
-from app.models.platform import ComfyUIService, GenerationLog
+from app.models.platform import GenerationLog
 from app.schemas.base import Fail, Success
+from app.services.project_service_cache import get_project_owner, get_project_owners
+from app.services.stat_rollup import create_generation_log, upsert_generation_logs
 from app.settings.config import settings
 
 router = APIRouter(prefix="/comfy", tags=["内部回调"])
@@ -22,21 +24,32 @@ class ComfyCallbackIn(BaseModel):
     timestamp: Optional[datetime] = Field(None, description="生成时间(可选，默认当前时间)")
 
 
-@router.post("/callback", summary="ComfyUI 生成回调（secret 校验）")
-async def comfy_callback(req_in: ComfyCallbackIn, x_platform_secret: str | None = Header(default=None)):
+class ComfyCallbackBatchIn(BaseModel):
+    events: List[ComfyCallbackIn] = Field(..., description="回调事件列表")
+
+
+def _check_secret(x_platform_secret: str | None):
     secret = settings.PLATFORM_INTERNAL_SECRET
     if not secret:
         return Fail(code=500, msg="PLATFORM_INTERNAL_SECRET 未配置，回调已禁用")
     if not x_platform_secret or x_platform_secret != secret:
         return Fail(code=403, msg="invalid secret")
+    return None
+
+
+@router.post("/callback", summary="ComfyUI 生成回调（secret 校验）")
+async def comfy_callback(req_in: ComfyCallbackIn, x_platform_secret: str | None = Header(default=None)):
+    err = _check_secret(x_platform_secret)
+    if err:
+        return err
 
-    svc = await ComfyUIService.filter(project_id=req_in.project_id).first()
-    if not svc:
+    user_id = await get_project_owner(req_in.project_id)
+    if user_id is None:
         return Fail(code=404, msg="service not found")
 
     ts = req_in.timestamp or datetime.now()
-    obj = await GenerationLog.create(
-        user_id=svc.user_id,
+    obj = await create_generation_log(
+        user_id=user_id,
         project_id=req_in.project_id,
         timestamp=ts,
         status=req_in.status,
@@ -56,3 +69,42 @@ async def comfy_callback(req_in: ComfyCallbackIn, x_platform_secret: str | None
         }
     )
 
+
+@router.post("/callback/batch", summary="ComfyUI 批量生成回调（secret 校验，按 prompt_id 幂等）")
+async def comfy_callback_batch(req_in: ComfyCallbackBatchIn, x_platform_secret: str | None = Header(default=None)):
+    err = _check_secret(x_platform_secret)
+    if err:
+        return err
+    if len(req_in.events) > settings.CALLBACK_BATCH_MAX_EVENTS:
+        return Fail(code=413, msg=f"too many events (max {settings.CALLBACK_BATCH_MAX_EVENTS})")
+
+    owners = await get_project_owners(e.project_id for e in req_in.events)
+    now = datetime.now()
+    objs = []
+    rejected = []
+    for i, e in enumerate(req_in.events):
+        user_id = owners.get(e.project_id)
+        if user_id is None:
+            rejected.append({"index": i, "project_id": e.project_id, "msg": "service not found"})
+            continue
+        objs.append(
+            GenerationLog(
+                user_id=user_id,
+                project_id=e.project_id,
+                timestamp=e.timestamp or now,
+                status=e.status,
+                prompt_id=e.prompt_id,
+                concurrent_id=e.concurrent_id,
+                details=e.details,
+            )
+        )
+
+    inserted, updated = await upsert_generation_logs(objs)
+    return Success(
+        data={
+            "accepted": inserted + updated,
+            "inserted": inserted,
+            "updated": updated,
+            "rejected": rejected,
+        }
+    )
@@ -1,15 +1,27 @@
+from typing import Any, Dict, Union
+
 from fastapi.routing import APIRoute
 
 from app.core.crud import CRUDBase
 from app.log import logger
 from app.models.admin import Api
 from app.schemas.apis import ApiCreate, ApiUpdate
+from app.services.permission_cache import invalidate_permissions
 
 
 class ApiController(CRUDBase[Api, ApiCreate, ApiUpdate]):
     def __init__(self):
         super().__init__(model=Api)
 
+    async def update(self, id: int, obj_in: Union[ApiUpdate, Dict[str, Any]]) -> Api:
+        obj = await super().update(id=id, obj_in=obj_in)
+        invalidate_permissions()
+        return obj
+
+    async def remove(self, id: int) -> None:
+        await super().remove(id=id)
+        invalidate_permissions()
+
     async def refresh_api(self):
         from app import app
 
@@ -40,6 +52,7 @@ class ApiController(CRUDBase[Api, ApiCreate, ApiUpdate]):
                 else:
                     logger.debug(f"API Created {method} {path}")
                     await Api.create(**dict(method=method, path=path, summary=summary, tags=tags))
+        invalidate_permissions()
 
 
 api_controller = ApiController()
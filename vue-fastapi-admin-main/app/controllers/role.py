@@ -1,8 +1,9 @@
-from typing import List
+from typing import Any, Dict, List, Union
 
 from app.core.crud import CRUDBase
 from app.models.admin import Api, Menu, Role
 from app.schemas.roles import RoleCreate, RoleUpdate
+from app.services.permission_cache import invalidate_permissions
 
 
 class RoleController(CRUDBase[Role, RoleCreate, RoleUpdate]):
@@ -12,6 +13,15 @@ class RoleController(CRUDBase[Role, RoleCreate, RoleUpdate]):
     async def is_exist(self, name: str) -> bool:
         return await self.model.filter(name=name).exists()
 
+    async def update(self, id: int, obj_in: Union[RoleUpdate, Dict[str, Any]]) -> Role:
+        obj = await super().update(id=id, obj_in=obj_in)
+        invalidate_permissions()
+        return obj
+
+    async def remove(self, id: int) -> None:
+        await super().remove(id=id)
+        invalidate_permissions()
+
     async def update_roles(self, role: Role, menu_ids: List[int], api_infos: List[dict]) -> None:
         await role.menus.clear()
         for menu_id in menu_ids:
@@ -22,6 +32,7 @@ class RoleController(CRUDBase[Role, RoleCreate, RoleUpdate]):
         for item in api_infos:
             api_obj = await Api.filter(path=item.get("path"), method=item.get("method")).first()
             await role.apis.add(api_obj)
+        invalidate_permissions()
 
 
 role_controller = RoleController()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 from fastapi.exceptions import HTTPException
 
@@ -7,6 +7,7 @@ from app.core.crud import CRUDBase
 from app.models.admin import User
 from app.schemas.login import CredentialsSchema
 from app.schemas.users import UserCreate, UserUpdate
+from app.services.permission_cache import invalidate_permissions
 from app.utils.password import get_password_hash, verify_password
 
 from .role import role_controller
@@ -27,6 +28,15 @@ class UserController(CRUDBase[User, UserCreate, UserUpdate]):
         obj = await self.create(obj_in)
         return obj
 
+    async def update(self, id: int, obj_in: Union[UserUpdate, Dict[str, Any]]) -> User:
+        obj = await super().update(id=id, obj_in=obj_in)
+        invalidate_permissions(id)
+        return obj
+
+    async def remove(self, id: int) -> None:
+        await super().remove(id=id)
+        invalidate_permissions(id)
+
     async def update_last_login(self, id: int) -> None:
         user = await self.model.get(id=id)
         user.last_login = datetime.now()
@@ -48,6 +58,7 @@ class UserController(CRUDBase[User, UserCreate, UserUpdate]):
         for role_id in role_ids:
             role_obj = await role_controller.get(id=role_id)
             await user.roles.add(role_obj)
+        invalidate_permissions(user.id)
 
     async def reset_password(self, user_id: int):
         user_obj = await self.get(id=user_id)
@@ -1,8 +1,10 @@
+import json
 from typing import Any, Dict, Generic, List, NewType, Tuple, Type, TypeVar, Union
 
 from pydantic import BaseModel
 from tortoise.expressions import Q
 from tortoise.models import Model
+from tortoise.queryset import QuerySet
 
 Total = NewType("Total", int)
 ModelType = TypeVar("ModelType", bound=Model)
@@ -10,6 +12,23 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+async def estimate_count(query: QuerySet) -> Tuple[Total, bool]:
+    """
+    估算查询结果行数：PostgreSQL 读取执行计划中的 Plan Rows（基于表统计信息，不扫描数据）；
+    其他数据库没有可用的行数估算，退回精确 count。返回 (行数, 是否为估算值)。
+    """
+    if query.model._meta.db.capabilities.dialect == "postgres":
+        try:
+            rows = await query.explain()
+            plan = rows[0]["QUERY PLAN"] if rows else None
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return Total(int(plan[0]["Plan"]["Plan Rows"])), True
+        except Exception:
+            pass
+    return Total(await query.count()), False
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         self.model = model
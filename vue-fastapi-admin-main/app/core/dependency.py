@@ -4,11 +4,31 @@ import jwt
 from fastapi import Depends, Header, HTTPException, Request
 
 from app.core.ctx import CTX_USER_ID
-from app.models import Role, User
+from app.models import User
+from app.services.permission_cache import UserPermissions, get_user_permissions
 from app.settings import settings
 
 
 class AuthControl:
+    @classmethod
+    async def get_user_id(cls, authorization: Optional[str], token: Optional[str]) -> int:
+        """
+        从 Authorization / token 头解析出 user_id（仅解码 JWT，不查询用户）
+        """
+        raw_token = authorization or token
+        if not raw_token:
+            raise HTTPException(status_code=401, detail="Authentication failed")
+
+        # 兼容 Bearer 方案
+        if raw_token.lower().startswith("bearer "):
+            raw_token = raw_token[7:].strip()
+
+        if raw_token == "dev":
+            user = await User.filter().first()
+            return user.id
+        decode_data = jwt.decode(raw_token, settings.SECRET_KEY, algorithms=settings.JWT_ALGORITHM)
+        return decode_data.get("user_id")
+
     @classmethod
     async def is_authed(
         cls,
@@ -16,20 +36,7 @@ class AuthControl:
         token: Optional[str] = Header(None, description="兼容旧 token 头"),
     ) -> Optional["User"]:
         try:
-            raw_token = authorization or token
-            if not raw_token:
-                raise HTTPException(status_code=401, detail="Authentication failed")
-
-            # 兼容 Bearer 方案
-            if raw_token.lower().startswith("bearer "):
-                raw_token = raw_token[7:].strip()
-
-            if raw_token == "dev":
-                user = await User.filter().first()
-                user_id = user.id
-            else:
-                decode_data = jwt.decode(raw_token, settings.SECRET_KEY, algorithms=settings.JWT_ALGORITHM)
-                user_id = decode_data.get("user_id")
+            user_id = await cls.get_user_id(authorization, token)
             user = await User.filter(id=user_id).first()
             if not user:
                 raise HTTPException(status_code=401, detail="Authentication failed")
@@ -45,11 +52,38 @@ class AuthControl:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"{repr(e)}")
 
+    @classmethod
+    async def get_permissions(
+        cls,
+        authorization: Optional[str] = Header(None, alias="Authorization", description="Authorization 头"),
+        token: Optional[str] = Header(None, description="兼容旧 token 头"),
+    ) -> UserPermissions:
+        """
+        与 is_authed 相同的鉴权，但返回缓存的用户权限而不是 User 对象：缓存命中时只解码 JWT，不查询数据库
+        """
+        try:
+            user_id = await cls.get_user_id(authorization, token)
+            permissions = await get_user_permissions(int(user_id)) if user_id is not None else None
+            if not permissions:
+                raise HTTPException(status_code=401, detail="Authentication failed")
+            CTX_USER_ID.set(permissions.user_id)
+            return permissions
+        except jwt.DecodeError:
+            raise HTTPException(status_code=401, detail="无效的Token")
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="登录已过期")
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"{repr(e)}")
+
 
 class PermissionControl:
     @classmethod
-    async def has_permission(cls, request: Request, current_user: User = Depends(AuthControl.is_authed)) -> None:
-        if current_user.is_superuser:
+    async def has_permission(
+        cls, request: Request, permissions: UserPermissions = Depends(AuthControl.get_permissions)
+    ) -> None:
+        if permissions.is_superuser:
             return
         method = request.method
         # 使用路由模板路径进行权限匹配（例如 /api/projects/{project_id}/open_comfy），
@@ -62,14 +96,9 @@ class PermissionControl:
         )
         if path != "/" and path.endswith("/"):
             path = path.rstrip("/")
-        roles: list[Role] = await current_user.roles
-        if not roles:
+        if not permissions.has_roles:
             raise HTTPException(status_code=403, detail="The user is not bound to a role")
-        apis = [await role.apis for role in roles]
-        permission_apis = list(set((api.method, api.path) for api in sum(apis, [])))
-        # path = "/api/v1/auth/userinfo"
-        # method = "GET"
-        if (method, path) not in permission_apis:
+        if (method, path) not in permissions.apis:
             raise HTTPException(status_code=403, detail=f"Permission denied method:{method} path:{path}")
 
 
@@ -24,6 +24,8 @@ from app.core.exceptions import (
 from app.log import logger
 from app.models.admin import Api, Menu, Role
 from app.schemas.menus import MenuType
+from app.services.log_partitions import ensure_partitions
+from app.services.stat_rollup import ensure_rollup
 from app.settings.config import settings
 
 from .middlewares import BackGroundTaskMiddleware, HttpAuditLogMiddleware
@@ -339,6 +341,8 @@ async def init_db():
         await command.init_db(safe=True)
 
     await command.upgrade(run_in_transaction=True)
+    # 读取日志表的分区状态并预建分区；普通表转为分区表需显式执行 make partition-logs
+    await ensure_partitions()
 
 
 async def init_roles():
@@ -366,3 +370,4 @@ async def init_data():
     await ensure_menu_auth_marks()
     await init_roles()
     await ensure_role_policies()
+    await ensure_rollup()
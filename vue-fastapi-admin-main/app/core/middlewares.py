@@ -1,17 +1,18 @@
 import json
 import re
 from datetime import datetime
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 
-from fastapi import FastAPI
+import jwt
 from fastapi.responses import Response
 from fastapi.routing import APIRoute
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
 from starlette.types import ASGIApp, Receive, Scope, Send
+from tortoise import timezone
 
-from app.core.dependency import AuthControl
-from app.models.admin import AuditLog, User
+from app.services.audit_log_writer import audit_log_writer
+from app.settings import settings
 
 from .bgtask import BgTasks
 
@@ -47,12 +48,24 @@ class BackGroundTaskMiddleware(SimpleBaseMiddleware):
 
 
 class HttpAuditLogMiddleware(BaseHTTPMiddleware):
+    """
+    审计日志中间件：记录在请求结束（流式响应发送完毕）后放入 audit_log_writer 队列，由后台任务批量写入，
+    请求路径上不访问数据库。路由信息取自 scope["route"]，用户信息只解码 JWT。
+    """
+
     def __init__(self, app, methods: list[str], exclude_paths: list[str]):
         super().__init__(app)
         self.methods = methods
-        self.exclude_paths = exclude_paths
+        self.exclude_paths = [re.compile(path, re.I) for path in exclude_paths]
         self.audit_log_paths = ["/api/v1/auditlog/list"]
-        self.max_body_size = 1024 * 1024  # 1MB 响应体大小限制
+        self.capture_request_body = settings.AUDIT_LOG_CAPTURE_REQUEST_BODY
+        self.capture_response_body = settings.AUDIT_LOG_CAPTURE_RESPONSE_BODY
+        self.max_body_size = max(0, settings.AUDIT_LOG_MAX_BODY_BYTES)
+
+    def is_audited(self, request: Request) -> bool:
+        if request.method not in self.methods:
+            return False
+        return not any(path.search(request.url.path) for path in self.exclude_paths)
 
     async def get_request_args(self, request: Request) -> dict:
         args = {}
@@ -61,11 +74,22 @@ class HttpAuditLogMiddleware(BaseHTTPMiddleware):
             args[key] = value
 
         # 获取请求体
-        if request.method in ["POST", "PUT", "PATCH"]:
+        if self.capture_request_body and request.method in ["POST", "PUT", "PATCH"]:
+            content_type = (request.headers.get("content-type") or "").lower()
+            content_length = request.headers.get("content-length")
+            # 表单/上传只记录字段与文件名；其他请求体超过上限时不解析
+            if (
+                "multipart/form-data" not in content_type
+                and content_length
+                and content_length.isdigit()
+                and int(content_length) > self.max_body_size
+            ):
+                args["_body"] = f"Request body omitted ({content_length} bytes)"
+                return args
             try:
                 body = await request.json()
                 args.update(body)
-            except json.JSONDecodeError:
+            except (json.JSONDecodeError, UnicodeDecodeError):
                 try:
                     body = await request.form()
                     # args.update(body)
@@ -78,30 +102,31 @@ class HttpAuditLogMiddleware(BaseHTTPMiddleware):
                             args[k] = v
                 except Exception:
                     pass
+            except (TypeError, ValueError):
+                pass
 
         return args
 
-    async def get_response_body(self, request: Request, response: Response) -> Any:
+    def omitted_response_body(self, response: Response) -> Optional[dict]:
+        """
+        不记录响应体时返回占位说明，否则返回 None
+        """
         content_type = (response.headers.get("content-type") or "").lower()
         if ("application/json" not in content_type) and (not content_type.startswith("text/")):
             return {"code": 0, "msg": f"Non-JSON response omitted ({content_type})", "data": None}
 
-        # 检查Content-Length
-        content_length = response.headers.get("content-length")
-        if content_length and int(content_length) > self.max_body_size:
-            return {"code": 0, "msg": "Response too large to log", "data": None}
-
-        if hasattr(response, "body"):
-            body = response.body
-        else:
-            body_chunks = []
-            async for chunk in response.body_iterator:
-                if not isinstance(chunk, bytes):
-                    chunk = chunk.encode(response.charset)
-                body_chunks.append(chunk)
+        # 文件下载（如 CSV 导出）为流式响应，不记录内容
+        if "attachment" in (response.headers.get("content-disposition") or "").lower():
+            return {"code": 0, "msg": f"Attachment response omitted ({content_type})", "data": None}
+        return None
 
-            response.body_iterator = self._async_iter(body_chunks)
-            body = b"".join(body_chunks)
+    def parse_response_body(self, request: Request, body: bytes, size: int) -> Any:
+        if size > len(body):
+            return {
+                "code": 0,
+                "msg": f"Response truncated ({len(body)} of {size} bytes)",
+                "data": body.decode("utf-8", "replace"),
+            }
 
         if any(request.url.path.startswith(path) for path in self.audit_log_paths):
             try:
@@ -123,39 +148,63 @@ class HttpAuditLogMiddleware(BaseHTTPMiddleware):
             try:
                 return json.loads(v)
             except (ValueError, TypeError):
-                pass
+                # JSONField 只接受合法 JSON 字符串，文本响应包装后存储
+                if isinstance(v, bytes):
+                    v = v.decode("utf-8", "replace")
+                return {"code": 0, "msg": "Non-JSON response", "data": v}
         return v
 
-    async def _async_iter(self, items: list[bytes]) -> AsyncGenerator[bytes, None]:
-        for item in items:
-            yield item
+    def tee_response_body(self, request: Request, response: Response, data: dict) -> None:
+        """
+        在响应流发送的同时截留前 max_body_size 字节，发送结束后再提交日志记录，不整体缓冲响应体
+        """
+        body_iterator = response.body_iterator
+        limit = self.max_body_size
+
+        async def tee() -> AsyncGenerator[bytes, None]:
+            chunks: list[bytes] = []
+            size = 0
+            try:
+                async for chunk in body_iterator:
+                    if not isinstance(chunk, bytes):
+                        chunk = chunk.encode(response.charset)
+                    if size < limit:
+                        chunks.append(chunk[: limit - size])
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                data["response_body"] = self.parse_response_body(request, b"".join(chunks), size)
+                audit_log_writer.submit(data)
+
+        response.body_iterator = tee()
+
+    def get_user(self, request: Request) -> tuple[int, str]:
+        """
+        从 Authorization / token 头解码 JWT 取得用户信息（不查询数据库）
+        """
+        raw_token = request.headers.get("authorization") or request.headers.get("token")
+        if not raw_token:
+            return 0, ""
+        if raw_token.lower().startswith("bearer "):
+            raw_token = raw_token[7:].strip()
+        try:
+            payload = jwt.decode(raw_token, settings.SECRET_KEY, algorithms=settings.JWT_ALGORITHM)
+        except jwt.PyJWTError:
+            return 0, ""
+        return int(payload.get("user_id") or 0), str(payload.get("username") or "")
 
-    async def get_request_log(self, request: Request, response: Response) -> dict:
+    def get_request_log(self, request: Request, response: Response) -> dict:
         """
         根据request和response对象获取对应的日志记录数据
         """
         data: dict = {"path": request.url.path, "status": response.status_code, "method": request.method}
-        # 路由信息
-        app: FastAPI = request.app
-        for route in app.routes:
-            if (
-                isinstance(route, APIRoute)
-                and route.path_regex.match(request.url.path)
-                and request.method in route.methods
-            ):
-                data["module"] = ",".join(route.tags)
-                data["summary"] = route.summary
+        # 路由信息：路由匹配后 Router 会写入 scope["route"]
+        route = request.scope.get("route")
+        if isinstance(route, APIRoute):
+            data["module"] = ",".join(route.tags)
+            data["summary"] = route.summary or ""
         # 获取用户信息
-        try:
-            token = request.headers.get("token")
-            user_obj = None
-            if token:
-                user_obj: User = await AuthControl.is_authed(token)
-            data["user_id"] = user_obj.id if user_obj else 0
-            data["username"] = user_obj.username if user_obj else ""
-        except Exception:
-            data["user_id"] = 0
-            data["username"] = ""
+        data["user_id"], data["username"] = self.get_user(request)
         return data
 
     async def before_request(self, request: Request):
@@ -163,20 +212,24 @@ class HttpAuditLogMiddleware(BaseHTTPMiddleware):
         request.state.request_args = request_args
 
     async def after_request(self, request: Request, response: Response, process_time: int):
-        if request.method in self.methods:
-            for path in self.exclude_paths:
-                if re.search(path, request.url.path, re.I) is not None:
-                    return
-            data: dict = await self.get_request_log(request=request, response=response)
-            data["response_time"] = process_time
-
-            data["request_args"] = request.state.request_args
-            data["response_body"] = await self.get_response_body(request, response)
-            await AuditLog.create(**data)
-
+        data: dict = self.get_request_log(request=request, response=response)
+        data["response_time"] = process_time
+        data["request_args"] = request.state.request_args
+        data["created_at"] = timezone.now()
+
+        if not self.capture_response_body:
+            data["response_body"] = None
+            audit_log_writer.submit(data)
+        elif (omitted := self.omitted_response_body(response)) is not None:
+            data["response_body"] = omitted
+            audit_log_writer.submit(data)
+        else:
+            self.tee_response_body(request, response, data)
         return response
 
     async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        if not self.is_audited(request):
+            return await call_next(request)
         start_time: datetime = datetime.now()
         await self.before_request(request)
         response = await call_next(request)
@@ -38,9 +38,37 @@ class GenerationLog(BaseModel, TimestampMixin):
     prompt_id = fields.CharField(max_length=64, null=True, description="ComfyUI prompt_id", index=True)
     concurrent_id = fields.BigIntField(null=True, description="并发ID", index=True)
     details = fields.JSONField(null=True, description="详情(错误/耗时等)")
+    duration_ms = fields.BigIntField(null=True, description="执行耗时(ms)")
 
     class Meta:
         table = "generation_logs"
         indexes = (("project_id", "timestamp"), ("user_id", "timestamp"))
         unique_together = (("project_id", "prompt_id"),)
 
+
+class GenerationLogKey(BaseModel):
+    """
+    generation_logs 分区后唯一键必须包含分区键，(project_id, prompt_id) 的唯一性由这张不分区的表保证，
+    与日志在同一事务内写入（仅分区表使用）。
+    """
+
+    project_id = fields.BigIntField(description="项目ID")
+    prompt_id = fields.CharField(max_length=64, description="ComfyUI prompt_id")
+
+    class Meta:
+        table = "generation_log_keys"
+        unique_together = (("project_id", "prompt_id"),)
+
+
+class GenerationStatDaily(BaseModel, TimestampMixin):
+    project_id = fields.BigIntField(description="项目ID", index=True)
+    user_id = fields.BigIntField(description="用户ID", index=True)
+    day = fields.DateField(description="日期", index=True)
+    status = fields.CharField(max_length=20, description="状态(成功/失败等)", index=True)
+    count = fields.BigIntField(default=0, description="生成次数")
+    total_duration_ms = fields.BigIntField(default=0, description="累计耗时(ms)")
+
+    class Meta:
+        table = "generation_stat_daily"
+        indexes = (("day", "project_id"), ("day", "user_id"))
+        unique_together = (("project_id", "user_id", "day", "status"),)
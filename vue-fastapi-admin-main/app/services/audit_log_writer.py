@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.log import logger
+from app.models.admin import AuditLog
+from app.settings.config import settings
+
+
+class AuditLogWriter:
+    """
+    审计日志异步批量写入：请求路径只把记录放入有界内存队列（不访问数据库），
+    后台协程按 batch_size 条或 flush_interval 时间窗口合并为一批，通过 bulk_create 写入。
+    队列满时丢弃新记录并计数，避免数据库变慢时拖住请求或占满内存。
+    """
+
+    def __init__(self, *, queue_size: int = 10000, batch_size: int = 200, flush_interval_ms: int = 1000) -> None:
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max(1, queue_size))
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(50, flush_interval_ms) / 1000
+        self.dropped = 0
+        self._last_drop_warning = 0.0
+
+    def submit(self, record: dict) -> bool:
+        """
+        记录入队（非阻塞）；队列已满时丢弃并返回 False
+        """
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._last_drop_warning >= 60:
+                self._last_drop_warning = now
+                logger.warning(f"[audit_log] queue full, dropped {self.dropped} records so far")
+            return False
+
+    def _drain(self, limit: int) -> list[dict]:
+        batch: list[dict] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _next_batch(self) -> list[dict]:
+        """
+        等待第一条记录（最多 flush_interval），再在剩余窗口内凑满一批
+        """
+        try:
+            batch = [await asyncio.wait_for(self.queue.get(), timeout=self.flush_interval)]
+        except TimeoutError:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            batch.extend(self._drain(self.batch_size - len(batch)))
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except TimeoutError:
+                break
+        return batch
+
+    async def write(self, batch: list[dict]) -> None:
+        if not batch:
+            return
+        try:
+            await AuditLog.bulk_create([AuditLog(**record) for record in batch])
+            return
+        except Exception as e:
+            logger.warning(f"[audit_log] bulk write of {len(batch)} records failed, retrying one by one: {repr(e)}")
+        # 逐条重试，只丢弃本身无法写入的记录
+        for record in batch:
+            try:
+                await AuditLog.create(**record)
+            except Exception as e:
+                logger.error(f"[audit_log] dropped record {record.get('method')} {record.get('path')}: {repr(e)}")
+
+    async def flush(self) -> None:
+        """
+        写入队列中剩余的全部记录（停止时调用）
+        """
+        while batch := self._drain(self.batch_size):
+            await self.write(batch)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            await self.write(await self._next_batch())
+        await self.flush()
+
+
+audit_log_writer = AuditLogWriter(
+    queue_size=settings.AUDIT_LOG_QUEUE_SIZE,
+    batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.AUDIT_LOG_FLUSH_INTERVAL_MS,
+)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import suppress
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from websockets.asyncio.client import connect
+
+from app.log import logger
+from app.models.platform import ComfyUIService
+from app.services.comfyui_history_sync import make_client, sync_services
+from app.settings.config import settings
+
+# 触发增量同步的 /ws 事件：队列状态变化（广播给所有客户端）以及执行结束相关事件
+_TRIGGER_EVENTS = ("status", "execution_success", "execution_error", "execution_interrupted", "execution_cached")
+
+_WatchKey = tuple[int, str, int | None]
+
+
+def ws_url(comfy_url: str, client_id: str) -> str:
+    """
+    http(s)://host:port -> ws(s)://host:port/ws?clientId=...
+    """
+    parts = urlsplit(comfy_url)
+    scheme = "wss" if parts.scheme == "https" else "ws"
+    path = parts.path.rstrip("/") + "/ws"
+    return urlunsplit((scheme, parts.netloc, path, f"clientId={client_id}", ""))
+
+
+def is_trigger_message(raw: str | bytes) -> bool:
+    """
+    判断 /ws 文本消息是否意味着可能有任务完成（二进制预览帧直接忽略）。
+    """
+    if not isinstance(raw, str):
+        return False
+    try:
+        msg = json.loads(raw)
+    except ValueError:
+        return False
+    if not isinstance(msg, dict):
+        return False
+    event = msg.get("type")
+    if event in _TRIGGER_EVENTS:
+        return True
+    # executing 且 node 为空表示该 prompt 执行结束
+    data = msg.get("data")
+    return event == "executing" and isinstance(data, dict) and data.get("node") is None
+
+
+class ComfyUIEventIngestor:
+    """
+    订阅每个在线 ComfyUI 实例的 /ws 事件，收到完成类事件后标记实例为 dirty；
+    flush 协程把 COMFYUI_EVENT_FLUSH_MS 内被标记的实例合并为一批，按高水位增量拉取 history 并一次性 bulk 写入。
+    """
+
+    def __init__(self, client: httpx.AsyncClient, *, flush_ms: int = 200, refresh_seconds: int = 5) -> None:
+        self.client = client
+        self.flush_seconds = max(0, flush_ms) / 1000
+        self.refresh_seconds = max(1, refresh_seconds)
+        self._services: dict[_WatchKey, ComfyUIService] = {}
+        self._watchers: dict[_WatchKey, asyncio.Task] = {}
+        self._dirty: set[_WatchKey] = set()
+        self._wake = asyncio.Event()
+
+    @staticmethod
+    def _key(s: ComfyUIService) -> _WatchKey:
+        return (s.id, s.comfy_url, s.pid)
+
+    def mark_dirty(self, key: _WatchKey) -> None:
+        self._dirty.add(key)
+        self._wake.set()
+
+    async def _watch(self, key: _WatchKey) -> None:
+        _, comfy_url, _ = key
+        url = ws_url(comfy_url, f"platform-ingest-{key[0]}")
+        backoff = 1.0
+        while True:
+            try:
+                async with connect(url, open_timeout=10, max_size=None) as ws:
+                    backoff = 1.0
+                    # 连接建立（含重连）后补拉一次，覆盖断线期间完成的任务
+                    self.mark_dirty(key)
+                    async for raw in ws:
+                        if is_trigger_message(raw):
+                            self.mark_dirty(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.debug(f"[ComfyUI] ws disconnected: {comfy_url} ({e})")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def refresh(self) -> None:
+        """
+        与数据库中的在线实例对齐：为新实例启动 watcher，停止已下线/重启实例的 watcher。
+        """
+        services = await ComfyUIService.filter(status="online").all()
+        current = {self._key(s): s for s in services if s.comfy_url}
+        for key in list(self._watchers):
+            if key not in current:
+                self._watchers.pop(key).cancel()
+                self._services.pop(key, None)
+                self._dirty.discard(key)
+        for key, s in current.items():
+            self._services[key] = s
+            if key not in self._watchers:
+                self._watchers[key] = asyncio.create_task(self._watch(key))
+
+    async def flush(self) -> int:
+        keys, self._dirty = self._dirty, set()
+        services = [self._services[k] for k in keys if k in self._services]
+        if not services:
+            return 0
+        return await sync_services(services, self.client)
+
+    async def _flush_loop(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            await self._wake.wait()
+            # 微批：等待一个窗口，把同一时间段内多个实例/多个事件合并为一次写入
+            await asyncio.sleep(self.flush_seconds)
+            self._wake.clear()
+            try:
+                n = await self.flush()
+                if n:
+                    logger.info(f"[ComfyUI] events ingested: +{n}")
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[ComfyUI] event ingest error: {e}")
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        flusher = asyncio.create_task(self._flush_loop(stop_event))
+        try:
+            while not stop_event.is_set():
+                try:
+                    await self.refresh()
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"[ComfyUI] event ingest refresh error: {e}")
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.refresh_seconds)
+        finally:
+            flusher.cancel()
+            for task in self._watchers.values():
+                task.cancel()
+            await asyncio.gather(flusher, *self._watchers.values(), return_exceptions=True)
+            self._watchers.clear()
+
+
+async def event_ingest_loop(stop_event: asyncio.Event) -> None:
+    """
+    后台订阅 ComfyUI /ws 事件，近实时写入 generation_logs（history 轮询降级为低频兜底）。
+    """
+    async with make_client() as client:
+        ingestor = ComfyUIEventIngestor(
+            client,
+            flush_ms=int(settings.COMFYUI_EVENT_FLUSH_MS),
+            refresh_seconds=int(settings.COMFYUI_EVENT_REFRESH_SECONDS),
+        )
+        await ingestor.run(stop_event)
@@ -8,13 +8,39 @@ import httpx
 
 from app.log import logger
 from app.models.platform import ComfyUIService, GenerationLog
+from app.services.comfyui_manager import touch_instance
+from app.services.stat_rollup import bulk_create_generation_logs
+from app.settings.config import settings
 
+_END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
 
-async def _fetch_history(comfy_url: str, *, max_items: int = 50) -> dict[str, Any]:
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(f"{comfy_url}/history", params={"max_items": max_items})
-        r.raise_for_status()
-        return r.json()
+# 每个实例的高水位：(comfy_url, pid) -> 最近一次同步到的最后一个 prompt_id。
+# 实例重启（pid 变化）后 history 会被清空，键随之失效，自动退回到全量比对。
+_high_water_marks: dict[tuple[str, int | None], str] = {}
+
+
+async def _fetch_history(
+    client: httpx.AsyncClient, comfy_url: str, *, max_items: int = 50, since: str | None = None
+) -> dict[str, Any]:
+    params: dict[str, Any] = {"max_items": max_items}
+    if since:
+        # 支持 since 的 ComfyUI 只返回该 prompt_id 之后的条目；不支持时由 _new_items 在本地截断
+        params["since"] = since
+    r = await client.get(f"{comfy_url}/history", params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+def _new_items(history: dict[str, Any], since: str | None) -> list[tuple[str, Any]]:
+    """
+    history 按完成顺序排列；若高水位 prompt_id 仍在返回结果中，只保留其后的条目。
+    """
+    items = [(str(k), v) for k, v in history.items() if k]
+    if since:
+        for i, (prompt_id, _) in enumerate(items):
+            if prompt_id == since:
+                return items[i + 1 :]
+    return items
 
 
 def _map_status(history_item: dict[str, Any]) -> tuple[str, dict[str, Any]]:
@@ -27,47 +53,121 @@ def _map_status(history_item: dict[str, Any]) -> tuple[str, dict[str, Any]]:
     return "未知", {"status": status}
 
 
-async def sync_once(*, max_items: int = 50) -> int:
+def _finished_at(history_item: dict[str, Any]) -> datetime:
     """
-    从所有在线服务拉取最新 history，并将新 prompt_id 写入 generation_logs。
-    返回本次新增的日志条数。
+    取 ComfyUI 执行结束消息的时间戳作为生成时间，缺失时使用当前时间。
     """
-    services = await ComfyUIService.filter(status="online").all()
-    created = 0
-    for s in services:
-        if not s.comfy_url:
-            continue
-        try:
-            history = await _fetch_history(s.comfy_url, max_items=max_items)
-        except Exception as e:  # noqa: BLE001
-            logger.warning(f"[ComfyUI] history fetch failed: {s.comfy_url} ({e})")
-            continue
+    status = history_item.get("status") or {}
+    for msg in reversed(status.get("messages") or []):
+        if isinstance(msg, (list, tuple)) and len(msg) >= 2 and msg[0] in _END_EVENTS and isinstance(msg[1], dict):
+            ts = msg[1].get("timestamp")
+            if isinstance(ts, (int, float)):
+                return datetime.fromtimestamp(ts / 1000)
+    return datetime.now()
+
+
+def _hwm_key(s: ComfyUIService) -> tuple[str, int | None]:
+    return (s.comfy_url, s.pid)
+
+
+async def _collect_service(
+    s: ComfyUIService, client: httpx.AsyncClient, *, max_items: int
+) -> tuple[list[GenerationLog], str | None]:
+    """
+    拉取单个实例高水位之后的 history，返回 (待写入的新日志, 新的高水位 prompt_id)。
+    """
+    since = _high_water_marks.get(_hwm_key(s))
+    try:
+        history = await _fetch_history(client, s.comfy_url, max_items=max_items, since=since)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"[ComfyUI] history fetch failed: {s.comfy_url} ({e})")
+        return [], None
+
+    items = _new_items(history, since)
+    if not items:
+        return [], None
 
-        for prompt_id, item in history.items():
-            if not prompt_id:
-                continue
-            exists = await GenerationLog.filter(project_id=s.project_id, prompt_id=str(prompt_id)).exists()
-            if exists:
-                continue
-
-            status_str, extra = _map_status(item if isinstance(item, dict) else {})
-            details = {
-                "prompt_id": str(prompt_id),
-                "comfy_url": s.comfy_url,
-                "history": item,
-                **extra,
-            }
-            await GenerationLog.create(
+    prompt_ids = [prompt_id for prompt_id, _ in items]
+    existing = set(
+        await GenerationLog.filter(project_id=s.project_id, prompt_id__in=prompt_ids).values_list(
+            "prompt_id", flat=True
+        )
+    )
+
+    objs = []
+    for prompt_id, item in items:
+        if prompt_id in existing:
+            continue
+        item = item if isinstance(item, dict) else {}
+        status_str, extra = _map_status(item)
+        details = {
+            "prompt_id": prompt_id,
+            "comfy_url": s.comfy_url,
+            "history": item,
+            **extra,
+        }
+        objs.append(
+            GenerationLog(
                 user_id=s.user_id,
                 project_id=s.project_id,
-                timestamp=datetime.now(),
+                timestamp=_finished_at(item),
                 status=status_str,
-                prompt_id=str(prompt_id),
+                prompt_id=prompt_id,
                 concurrent_id=None,
                 details=details,
             )
-            created += 1
-    return created
+        )
+    return objs, prompt_ids[-1]
+
+
+async def sync_services(
+    services: list[ComfyUIService], client: httpx.AsyncClient, *, max_items: int = 50
+) -> int:
+    """
+    并发（受 COMFYUI_HISTORY_SYNC_CONCURRENCY 限制）拉取给定实例的新 history，
+    汇总后一次 bulk_create 写入 generation_logs，成功后推进各实例高水位。返回新增条数。
+    """
+    services = [s for s in services if s.comfy_url]
+    if not services:
+        return 0
+
+    sem = asyncio.Semaphore(max(1, int(settings.COMFYUI_HISTORY_SYNC_CONCURRENCY)))
+
+    async def run(s: ComfyUIService) -> tuple[list[GenerationLog], str | None]:
+        async with sem:
+            try:
+                return await _collect_service(s, client, max_items=max_items)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[ComfyUI] history sync failed: {s.comfy_url} ({e})")
+                return [], None
+
+    results = await asyncio.gather(*(run(s) for s in services))
+    objs = [obj for batch, _ in results for obj in batch]
+    created = await bulk_create_generation_logs(objs)
+    for s, (_, hwm) in zip(services, results):
+        if hwm:
+            _high_water_marks[_hwm_key(s)] = hwm
+            touch_instance(s.id)
+    return len(created)
+
+
+async def sync_once(*, max_items: int = 50, client: httpx.AsyncClient | None = None) -> int:
+    """
+    从所有在线服务拉取最新 history，并将新 prompt_id 写入 generation_logs。返回本次新增的日志条数。
+    """
+    services = await ComfyUIService.filter(status="online").all()
+    if client is None:
+        async with make_client() as own_client:
+            return await sync_services(services, own_client, max_items=max_items)
+    return await sync_services(services, client, max_items=max_items)
+
+
+def make_client() -> httpx.AsyncClient:
+    concurrency = max(1, int(settings.COMFYUI_HISTORY_SYNC_CONCURRENCY))
+    return httpx.AsyncClient(
+        timeout=10,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    )
 
 
 async def sync_loop(stop_event: asyncio.Event, *, interval_seconds: int = 10) -> None:
@@ -78,15 +178,15 @@ async def sync_loop(stop_event: asyncio.Event, *, interval_seconds: int = 10) ->
         logger.warning("[ComfyUI] history sync disabled (interval<=0)")
         return
 
-    while not stop_event.is_set():
-        try:
-            n = await sync_once()
-            if n:
-                logger.info(f"[ComfyUI] history synced: +{n}")
-        except Exception as e:  # noqa: BLE001
-            logger.warning(f"[ComfyUI] history sync error: {e}")
-        try:
-            await asyncio.wait_for(stop_event.wait(), timeout=interval_seconds)
-        except TimeoutError:
-            pass
-
+    async with make_client() as client:
+        while not stop_event.is_set():
+            try:
+                n = await sync_once(client=client)
+                if n:
+                    logger.info(f"[ComfyUI] history synced: +{n}")
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[ComfyUI] history sync error: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval_seconds)
+            except TimeoutError:
+                pass
@@ -6,12 +6,15 @@ import signal
 import socket
 import subprocess
 import time
+from collections import defaultdict
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Tuple
 
 import httpx
+import psutil
 import yaml
 
 from app.log import logger
@@ -88,8 +91,14 @@ def load_comfyui_config() -> ComfyUIConfig:
     )
 
 
+# 已分配给正在启动（尚未监听）的进程的端口，避免并发启动时选中同一端口
+_reserved_ports: set[int] = set()
+
+
 def _pick_free_port(start: int, end: int) -> int:
     for port in range(start, end + 1):
+        if port in _reserved_ports:
+            continue
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             try:
@@ -150,8 +159,11 @@ def _write_extra_model_paths(cfg: ComfyUIConfig, inst_dir: Path) -> Path:
     return path
 
 
-async def is_healthy(comfy_url: str) -> bool:
+async def is_healthy(comfy_url: str, *, client: httpx.AsyncClient | None = None) -> bool:
     try:
+        if client is not None:
+            r = await client.get(f"{comfy_url}/system_stats")
+            return r.status_code == 200
         async with httpx.AsyncClient(timeout=2.5) as client:
             r = await client.get(f"{comfy_url}/system_stats")
             return r.status_code == 200
@@ -192,9 +204,17 @@ def stop_pid(pid: int, *, timeout_seconds: int = 10) -> None:
 def _should_force_cpu(cfg: ComfyUIConfig) -> bool:
     if settings.COMFYUI_FORCE_CPU:
         return True
+    return _detect_no_cuda(cfg.python_exec)
+
+
+@lru_cache(maxsize=None)
+def _detect_no_cuda(python_exec: str) -> bool:
+    """
+    在 ComfyUI 环境中检测 CUDA 是否可用（每个 python 只检测一次，避免每次启动多一个 torch 导入子进程）。
+    """
     try:
         out = subprocess.check_output(
-            [cfg.python_exec, "-c", "import torch; print(int(torch.cuda.is_available()))"],
+            [python_exec, "-c", "import torch; print(int(torch.cuda.is_available()))"],
             stderr=subprocess.STDOUT,
             timeout=10,
         )
@@ -203,18 +223,20 @@ def _should_force_cpu(cfg: ComfyUIConfig) -> bool:
         return True
 
 
-async def start_instance(user_id: int, project_id: int) -> dict:
-    cfg = load_comfyui_config()
-    port = _pick_free_port(cfg.port_start, cfg.port_end)
-    # 注意：cfg.listen 可能是 0.0.0.0（用于对外监听），内部健康检查应使用可连接的 internal_host
-    comfy_url = f"http://{cfg.internal_host}:{port}"
-
-    inst_dir = _instance_dir(cfg, user_id, project_id)
+def spawn_process(
+    cfg: ComfyUIConfig,
+    *,
+    port: int,
+    inst_dir: Path,
+    log_path: Path,
+    project_id: int | None,
+) -> subprocess.Popen:
+    """
+    启动 ComfyUI 进程（不等待就绪）。project_id 为空表示预热池实例，稍后通过 /internal/platform/assign 分配给项目。
+    """
     _ensure_instance_links(cfg, inst_dir)
     extra_paths = _write_extra_model_paths(cfg, inst_dir)
-
     cfg.log_dir.mkdir(parents=True, exist_ok=True)
-    log_path = cfg.log_dir / f"comfy_u{user_id}_p{project_id}_{port}.log"
 
     cmd = [
         cfg.python_exec,
@@ -239,8 +261,11 @@ async def start_instance(user_id: int, project_id: int) -> dict:
             env["PLATFORM_CALLBACK_URL"] = settings.PLATFORM_CALLBACK_URL
         if settings.PLATFORM_INTERNAL_SECRET:
             env["PLATFORM_CALLBACK_SECRET"] = settings.PLATFORM_INTERNAL_SECRET
-        env["PLATFORM_PROJECT_ID"] = str(project_id)
-        proc = subprocess.Popen(
+        if project_id is None:
+            env["PLATFORM_WARM_POOL"] = "1"
+        else:
+            env["PLATFORM_PROJECT_ID"] = str(project_id)
+        return subprocess.Popen(
             cmd,
             cwd=str(cfg.repo_path),
             stdout=f,
@@ -249,9 +274,36 @@ async def start_instance(user_id: int, project_id: int) -> dict:
             start_new_session=True,
         )
 
-    deadline = time.time() + max(5, cfg.startup_timeout_seconds)
-    while time.time() < deadline:
-        if await is_healthy(comfy_url):
+
+async def wait_until_healthy(proc: subprocess.Popen, comfy_url: str, *, timeout_seconds: int) -> bool:
+    """
+    轮询 /system_stats 直到就绪；进程提前退出或超时返回 False。
+    """
+    deadline = time.time() + max(5, timeout_seconds)
+    async with httpx.AsyncClient(timeout=2.5) as client:
+        while time.time() < deadline:
+            if await is_healthy(comfy_url, client=client):
+                return True
+            if proc.poll() is not None:
+                logger.warning(f"[ComfyUI] process exited early: pid={proc.pid} code={proc.returncode}")
+                return False
+            await asyncio.sleep(0.5)
+    return False
+
+
+async def start_instance(user_id: int, project_id: int) -> dict:
+    cfg = load_comfyui_config()
+    port = _pick_free_port(cfg.port_start, cfg.port_end)
+    # 注意：cfg.listen 可能是 0.0.0.0（用于对外监听），内部健康检查应使用可连接的 internal_host
+    comfy_url = f"http://{cfg.internal_host}:{port}"
+
+    inst_dir = _instance_dir(cfg, user_id, project_id)
+    log_path = cfg.log_dir / f"comfy_u{user_id}_p{project_id}_{port}.log"
+
+    _reserved_ports.add(port)
+    try:
+        proc = spawn_process(cfg, port=port, inst_dir=inst_dir, log_path=log_path, project_id=project_id)
+        if await wait_until_healthy(proc, comfy_url, timeout_seconds=cfg.startup_timeout_seconds):
             return {
                 "port": port,
                 "comfy_url": comfy_url,
@@ -259,7 +311,8 @@ async def start_instance(user_id: int, project_id: int) -> dict:
                 "base_dir": str(inst_dir),
                 "log_path": str(log_path),
             }
-        await asyncio.sleep(1)
+    finally:
+        _reserved_ports.discard(port)
 
     stop_pid(proc.pid)
     raise RuntimeError("ComfyUI start timeout")
@@ -271,6 +324,7 @@ async def ensure_comfyui_service(user_id: int, project_id: int) -> ComfyUIServic
         if await is_healthy(existing.comfy_url):
             existing.last_heartbeat = datetime.now()
             await existing.save()
+            touch_instance(existing.id)
             return existing
 
     if existing and existing.pid:
@@ -279,7 +333,15 @@ async def ensure_comfyui_service(user_id: int, project_id: int) -> ComfyUIServic
         except Exception as e:  # noqa: BLE001
             logger.warning(f"[ComfyUI] stop old pid failed: {existing.pid} ({e})")
 
-    info = await start_instance(user_id=user_id, project_id=project_id)
+    # 内存预算不足时先按 LRU 停掉空闲实例
+    await make_room_for_instance(exclude_project_id=project_id)
+
+    # 优先从预热池取已就绪实例，池为空时冷启动
+    from app.services.comfyui_pool import acquire_warm_instance
+
+    info = await acquire_warm_instance(user_id=user_id, project_id=project_id)
+    if info is None:
+        info = await start_instance(user_id=user_id, project_id=project_id)
 
     if existing:
         await existing.update_from_dict(
@@ -294,9 +356,10 @@ async def ensure_comfyui_service(user_id: int, project_id: int) -> ComfyUIServic
                 start_time=datetime.now(),
             )
         ).save()
+        touch_instance(existing.id)
         return existing
 
-    return await ComfyUIService.create(
+    svc = await ComfyUIService.create(
         user_id=user_id,
         project_id=project_id,
         port=info["port"],
@@ -308,23 +371,127 @@ async def ensure_comfyui_service(user_id: int, project_id: int) -> ComfyUIServic
         log_path=info["log_path"],
         start_time=datetime.now(),
     )
+    touch_instance(svc.id)
+    return svc
 
 
-async def heartbeat_once() -> None:
-    rows = await ComfyUIService.all()
-    for s in rows:
-        if not s.comfy_url:
-            continue
-        ok = await is_healthy(s.comfy_url)
+@dataclass
+class HeartbeatMetrics:
+    service_id: int
+    project_id: int
+    comfy_url: str
+    status: str = "unknown"
+    checks: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_latency_ms: float | None = None
+    avg_latency_ms: float | None = None
+    last_error: str | None = None
+    last_check: datetime | None = None
+    last_ok: datetime | None = None
+
+
+# service_id -> 探活指标（进程内，随心跳刷新）
+_heartbeat_metrics: dict[int, HeartbeatMetrics] = {}
+
+# 平均延迟的指数滑动系数
+_LATENCY_EWMA_ALPHA = 0.2
+
+
+def get_heartbeat_metrics() -> list[HeartbeatMetrics]:
+    return sorted(_heartbeat_metrics.values(), key=lambda m: m.service_id)
+
+
+def make_heartbeat_client() -> httpx.AsyncClient:
+    concurrency = max(1, int(settings.COMFYUI_HEARTBEAT_CONCURRENCY))
+    return httpx.AsyncClient(
+        timeout=float(settings.COMFYUI_HEARTBEAT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    )
+
+
+async def _probe(client: httpx.AsyncClient, comfy_url: str) -> tuple[bool, float, str | None]:
+    t0 = time.perf_counter()
+    try:
+        r = await client.get(f"{comfy_url}/system_stats")
+        ok = r.status_code == 200
+        err = None if ok else f"HTTP {r.status_code}"
+    except Exception as e:  # noqa: BLE001
+        ok, err = False, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+    return ok, (time.perf_counter() - t0) * 1000, err
+
+
+def _record(s: ComfyUIService, ok: bool, latency_ms: float, err: str | None, now: datetime) -> None:
+    m = _heartbeat_metrics.get(s.id)
+    if m is None or m.comfy_url != s.comfy_url:
+        m = _heartbeat_metrics[s.id] = HeartbeatMetrics(service_id=s.id, project_id=s.project_id, comfy_url=s.comfy_url)
+    m.checks += 1
+    m.last_check = now
+    m.last_latency_ms = round(latency_ms, 2)
+    m.status = "online" if ok else "offline"
+    if ok:
+        m.consecutive_failures = 0
+        m.last_ok = now
+        m.avg_latency_ms = (
+            m.last_latency_ms
+            if m.avg_latency_ms is None
+            else round(m.avg_latency_ms + _LATENCY_EWMA_ALPHA * (latency_ms - m.avg_latency_ms), 2)
+        )
+    else:
+        m.failures += 1
+        m.consecutive_failures += 1
+        m.last_error = err
+
+
+async def heartbeat_once(client: httpx.AsyncClient | None = None) -> int:
+    """
+    并发探活所有实例（COMFYUI_HEARTBEAT_CONCURRENCY 限流、共用 keep-alive 连接池），
+    只把状态变化或 last_heartbeat 超过 COMFYUI_HEARTBEAT_PERSIST_SECONDS 未落库的行按状态分组写回（仅更新状态字段）。
+    返回写回的行数。
+    """
+    if client is None:
+        async with make_heartbeat_client() as own_client:
+            return await heartbeat_once(own_client)
+
+    # pid 为空的是已被停止（空闲回收/内存淘汰）的实例，其端口可能已被复用，不再探活
+    rows = [s for s in await ComfyUIService.filter(pid__isnull=False) if s.comfy_url]
+    live_ids = {s.id for s in rows}
+    for sid in list(_heartbeat_metrics):
+        if sid not in live_ids:
+            _heartbeat_metrics.pop(sid, None)
+    if not rows:
+        return 0
+
+    sem = asyncio.Semaphore(max(1, int(settings.COMFYUI_HEARTBEAT_CONCURRENCY)))
+
+    async def run(s: ComfyUIService) -> tuple[bool, float, str | None]:
+        async with sem:
+            return await _probe(client, s.comfy_url)
+
+    results = await asyncio.gather(*(run(s) for s in rows))
+
+    now = datetime.now()
+    persist_after = timedelta(seconds=max(0, int(settings.COMFYUI_HEARTBEAT_PERSIST_SECONDS)))
+    # (探活前状态, 新状态, 是否写 last_heartbeat) -> 实例 id
+    groups: dict[tuple[str, str, bool], list[int]] = defaultdict(list)
+    for s, (ok, latency_ms, err) in zip(rows, results):
+        _record(s, ok, latency_ms, err, now)
+        new_status = "online" if ok else "offline"
+        write_heartbeat = False
         if ok:
-            if s.status != "online":
-                s.status = "online"
-            s.last_heartbeat = datetime.now()
-            await s.save()
-        else:
-            if s.status != "offline":
-                s.status = "offline"
-                await s.save()
+            last = s.last_heartbeat.replace(tzinfo=None) if s.last_heartbeat else None
+            write_heartbeat = s.status != new_status or last is None or now - last >= persist_after
+        if s.status != new_status or write_heartbeat:
+            groups[(s.status, new_status, write_heartbeat)].append(s.id)
+
+    # 只更新状态字段，并要求行在探活期间未被改动（未被停止、状态未变），避免覆盖并发写入
+    changed = 0
+    for (old_status, new_status, write_heartbeat), ids in groups.items():
+        values: dict = {"status": new_status}
+        if write_heartbeat:
+            values["last_heartbeat"] = now
+        changed += await ComfyUIService.filter(id__in=ids, status=old_status, pid__isnull=False).update(**values)
+    return changed
 
 
 async def heartbeat_loop(stop_event: asyncio.Event) -> None:
@@ -339,13 +506,197 @@ async def heartbeat_loop(stop_event: asyncio.Event) -> None:
         logger.warning("[ComfyUI] heartbeat disabled (interval<=0)")
         return
 
-    while not stop_event.is_set():
-        try:
-            await heartbeat_once()
-        except Exception as e:  # noqa: BLE001
-            logger.warning(f"[ComfyUI] heartbeat error: {e}")
+    async with make_heartbeat_client() as client:
+        while not stop_event.is_set():
+            try:
+                await heartbeat_once(client)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[ComfyUI] heartbeat error: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except TimeoutError:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# 生命周期调度：空闲回收 + 内存预算（LRU 淘汰）
+# ---------------------------------------------------------------------------
+
+# service_id -> 最近活跃时间（time.time()）。来源：open_comfy、队列非空、history 出现新任务
+_last_activity: dict[int, float] = {}
+
+
+def touch_instance(service_id: int) -> None:
+    _last_activity[service_id] = time.time()
+
+
+def last_activity(service_id: int) -> float:
+    # 首次见到（例如后端重启后）视为刚活跃，给予一个完整的 TTL 宽限期
+    return _last_activity.setdefault(service_id, time.time())
+
+
+def process_rss(pid: int) -> int:
+    """
+    进程及其子进程的 RSS（字节）；进程不存在返回 0。
+    """
+    try:
+        proc = psutil.Process(pid)
+        procs = [proc, *proc.children(recursive=True)]
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return 0
+    total = 0
+    for p in procs:
         try:
-            await asyncio.wait_for(stop_event.wait(), timeout=interval)
-        except TimeoutError:
-            pass
+            total += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total
+
+
+async def _queue_remaining(client: httpx.AsyncClient, comfy_url: str) -> int | None:
+    try:
+        r = await client.get(f"{comfy_url}/prompt")
+        r.raise_for_status()
+        return int(r.json()["exec_info"]["queue_remaining"])
+    except Exception:  # noqa: BLE001
+        return None
+
+
+async def stop_service(s: ComfyUIService, *, reason: str) -> None:
+    """
+    停止实例进程并标记离线；下次 open_comfy 会重新启动（或从预热池分配）。
+    """
+    logger.info(f"[ComfyUI] stopping instance {s.comfy_url} (project={s.project_id}, pid={s.pid}): {reason}")
+    if s.pid:
+        await asyncio.to_thread(stop_pid, int(s.pid))
+    await ComfyUIService.filter(id=s.id, pid=s.pid).update(status="offline", pid=None)
+    _last_activity.pop(s.id, None)
+    _heartbeat_metrics.pop(s.id, None)
+
+
+async def _online_instances() -> list[ComfyUIService]:
+    return [s for s in await ComfyUIService.filter(status="online", pid__isnull=False) if s.comfy_url]
+
+
+async def _evict_for_budget(
+    services: list[ComfyUIService],
+    rss: dict[int, int],
+    *,
+    budget: int,
+    extra: int = 0,
+    busy: set[int] | None = None,
+) -> int:
+    """
+    总 RSS（+ extra 预留）超过 budget 时按最近活跃时间从旧到新停止非忙碌实例，返回停止的实例数。
+    """
+    busy = busy or set()
+    total = sum(rss.values()) + extra
+    stopped = 0
+    for s in sorted(services, key=lambda s: last_activity(s.id)):
+        if total <= budget:
+            break
+        if s.id in busy:
+            continue
+        await stop_service(s, reason=f"memory budget exceeded ({total >> 20} MiB > {budget >> 20} MiB)")
+        total -= rss.get(s.id, 0)
+        stopped += 1
+    if total > budget:
+        logger.warning(f"[ComfyUI] memory budget still exceeded: {total >> 20} MiB > {budget >> 20} MiB")
+    return stopped
+
+
+async def instances_rss(services: list[ComfyUIService]) -> dict[int, int]:
+    return {s.id: await asyncio.to_thread(process_rss, int(s.pid)) for s in services}
+
+
+def instance_memory_estimate(samples: list[int]) -> int:
+    """
+    新实例的预计占用：现有实例的平均 RSS，没有样本时使用 COMFYUI_INSTANCE_MEMORY_ESTIMATE_MB
+    """
+    samples = [v for v in samples if v > 0]
+    return sum(samples) // len(samples) if samples else int(settings.COMFYUI_INSTANCE_MEMORY_ESTIMATE_MB) << 20
+
+
+async def _busy_instances(client: httpx.AsyncClient, services: list[ComfyUIService]) -> set[int]:
+    """
+    并发查询各实例队列，返回队列非空（正在生成或排队）的实例 id，并刷新其活跃时间
+    """
+    sem = asyncio.Semaphore(max(1, int(settings.COMFYUI_HEARTBEAT_CONCURRENCY)))
+
+    async def probe(s: ComfyUIService) -> int | None:
+        async with sem:
+            return await _queue_remaining(client, s.comfy_url)
 
+    remaining = await asyncio.gather(*(probe(s) for s in services))
+    busy = {s.id for s, n in zip(services, remaining) if n}
+    for sid in busy:
+        touch_instance(sid)
+    return busy
+
+
+async def make_room_for_instance(*, exclude_project_id: int | None = None) -> int:
+    """
+    启动新实例前检查内存预算（COMFYUI_MEMORY_BUDGET_MB），不足时按 LRU 停止空闲实例（忙碌实例不会被停止）。
+    预热池进程的占用计入预算；池中有就绪实例时新实例直接取用，否则按 instance_memory_estimate 预留。
+    """
+    budget = int(settings.COMFYUI_MEMORY_BUDGET_MB) << 20
+    if budget <= 0:
+        return 0
+    from app.services.comfyui_pool import warm_pool_rss
+
+    services = [s for s in await _online_instances() if s.project_id != exclude_project_id]
+    rss = await instances_rss(services)
+    warm = await asyncio.to_thread(warm_pool_rss)
+    extra = sum(warm) if warm else instance_memory_estimate(list(rss.values()))
+    if sum(rss.values()) + extra <= budget:
+        return 0
+    async with make_heartbeat_client() as client:
+        busy = await _busy_instances(client, services)
+    return await _evict_for_budget(services, rss, budget=budget, extra=extra, busy=busy)
+
+
+async def lifecycle_once(client: httpx.AsyncClient) -> int:
+    """
+    一轮调度：刷新各实例活跃时间 -> 停止超过 COMFYUI_IDLE_TTL_SECONDS 的空闲实例 -> 执行内存预算。返回停止的实例数。
+    预热池进程的占用由预热池自行控制（超预算时缩容、不再补齐），这里不会为了保留预热进程而停止项目实例。
+    """
+    services = await _online_instances()
+    if not services:
+        return 0
+
+    busy = await _busy_instances(client, services)
+
+    stopped = 0
+    idle_ttl = int(settings.COMFYUI_IDLE_TTL_SECONDS)
+    alive: list[ComfyUIService] = []
+    now = time.time()
+    for s in services:
+        idle = now - last_activity(s.id)
+        if idle_ttl > 0 and s.id not in busy and idle > idle_ttl:
+            await stop_service(s, reason=f"idle for {int(idle)}s")
+            stopped += 1
+        else:
+            alive.append(s)
+
+    budget = int(settings.COMFYUI_MEMORY_BUDGET_MB) << 20
+    if budget > 0 and alive:
+        rss = await instances_rss(alive)
+        stopped += await _evict_for_budget(alive, rss, budget=budget, busy=busy)
+    return stopped
+
+
+async def lifecycle_loop(stop_event: asyncio.Event) -> None:
+    interval = int(settings.COMFYUI_LIFECYCLE_INTERVAL_SECONDS)
+    if interval <= 0 or (int(settings.COMFYUI_IDLE_TTL_SECONDS) <= 0 and int(settings.COMFYUI_MEMORY_BUDGET_MB) <= 0):
+        return
+
+    async with make_heartbeat_client() as client:
+        while not stop_event.is_set():
+            try:
+                await lifecycle_once(client)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[ComfyUI] lifecycle error: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except TimeoutError:
+                pass
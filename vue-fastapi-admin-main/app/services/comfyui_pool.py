@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+from app.log import logger
+from app.services.comfyui_manager import (
+    ComfyUIConfig,
+    _ensure_instance_links,
+    _instance_dir,
+    _online_instances,
+    _pick_free_port,
+    _reserved_ports,
+    _write_extra_model_paths,
+    instance_memory_estimate,
+    instances_rss,
+    is_healthy,
+    load_comfyui_config,
+    process_rss,
+    spawn_process,
+    stop_pid,
+    wait_until_healthy,
+)
+from app.settings.config import settings
+
+
+@dataclass
+class WarmInstance:
+    port: int
+    comfy_url: str
+    proc: subprocess.Popen
+    base_dir: str
+    log_path: str
+    ready_at: float = field(default_factory=time.monotonic)
+
+
+# 已就绪、等待分配的预热实例（先进先出）
+_pool: list[WarmInstance] = []
+_pool_lock = asyncio.Lock()
+# 已分配给项目的实例：其启动目录（--base-directory）在进程退出前仍被使用，退出后由 maintain_pool_once 清理
+_assigned: list[WarmInstance] = []
+# 最近一次从池中取用实例的时间；用于判断是否需要保持满池
+_last_acquire: float = time.monotonic()
+
+
+def pool_status() -> dict:
+    return {
+        "size": len(_pool),
+        "target": _target_size(),
+        "instances": [
+            {"port": w.port, "pid": w.proc.pid, "idle_seconds": int(time.monotonic() - w.ready_at)} for w in _pool
+        ],
+    }
+
+
+def warm_pool_rss() -> list[int]:
+    """
+    各预热实例（含子进程）的 RSS（字节），计入 COMFYUI_MEMORY_BUDGET_MB 预算
+    """
+    return [process_rss(w.proc.pid) for w in list(_pool)]
+
+
+async def _memory_usage() -> tuple[int, int]:
+    """
+    (项目实例 + 预热实例的总 RSS, 新实例的预计占用)
+    """
+    rss = await instances_rss(await _online_instances())
+    warm = await asyncio.to_thread(warm_pool_rss)
+    return sum(rss.values()) + sum(warm), instance_memory_estimate([*rss.values(), *warm])
+
+
+def _target_size() -> int:
+    size = max(0, int(settings.COMFYUI_WARM_POOL_SIZE))
+    min_size = min(size, max(0, int(settings.COMFYUI_WARM_POOL_MIN_SIZE)))
+    idle_ttl = int(settings.COMFYUI_WARM_POOL_IDLE_TTL_SECONDS)
+    # 超过 idle TTL 没有人取用时缩容到 MIN_SIZE，释放空闲进程占用的内存/显存
+    if idle_ttl > 0 and time.monotonic() - _last_acquire > idle_ttl:
+        return min_size
+    return size
+
+
+def _pool_dir(cfg: ComfyUIConfig, port: int) -> Path:
+    """
+    每次启动使用独立目录：端口可能在旧实例退出、目录尚未清理时被新实例复用
+    """
+    parent = cfg.instance_base_dir / "_pool"
+    parent.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=f"port{port}_", dir=parent))
+
+
+async def _spawn_warm(cfg: ComfyUIConfig) -> WarmInstance | None:
+    port = _pick_free_port(cfg.port_start, cfg.port_end)
+    # 选中后立即预留，之后的 await 期间并发的 start_instance / _spawn_warm 不会选到同一端口
+    _reserved_ports.add(port)
+    comfy_url = f"http://{cfg.internal_host}:{port}"
+    log_path = cfg.log_dir / f"comfy_pool_{port}.log"
+    try:
+        inst_dir = await asyncio.to_thread(_pool_dir, cfg, port)
+        try:
+            proc = await asyncio.to_thread(
+                spawn_process, cfg, port=port, inst_dir=inst_dir, log_path=log_path, project_id=None
+            )
+        except Exception:
+            await asyncio.to_thread(shutil.rmtree, inst_dir, True)
+            raise
+        if await wait_until_healthy(proc, comfy_url, timeout_seconds=cfg.startup_timeout_seconds):
+            return WarmInstance(
+                port=port, comfy_url=comfy_url, proc=proc, base_dir=str(inst_dir), log_path=str(log_path)
+            )
+    finally:
+        _reserved_ports.discard(port)
+    await asyncio.to_thread(stop_pid, proc.pid)
+    await asyncio.to_thread(shutil.rmtree, inst_dir, True)
+    logger.warning(f"[ComfyUI] warm instance failed to start on port {port}")
+    return None
+
+
+async def _retire(w: WarmInstance, *, cleanup_dir: bool = True) -> None:
+    await asyncio.to_thread(stop_pid, w.proc.pid)
+    with suppress(Exception):
+        w.proc.wait(timeout=0)
+    if cleanup_dir:
+        await asyncio.to_thread(shutil.rmtree, w.base_dir, True)
+
+
+async def _assign(w: WarmInstance, cfg: ComfyUIConfig, *, user_id: int, project_id: int) -> str | None:
+    inst_dir = _instance_dir(cfg, user_id, project_id)
+    _ensure_instance_links(cfg, inst_dir)
+    _write_extra_model_paths(cfg, inst_dir)
+    headers = {"X-Platform-Secret": settings.PLATFORM_INTERNAL_SECRET}
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            r = await client.post(
+                f"{w.comfy_url}/internal/platform/assign",
+                json={"base_directory": str(inst_dir.resolve()), "project_id": project_id},
+                headers=headers,
+            )
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"[ComfyUI] warm instance assign failed: {w.comfy_url} ({e})")
+        return None
+    if r.status_code != 200:
+        logger.warning(f"[ComfyUI] warm instance assign rejected: {w.comfy_url} (HTTP {r.status_code})")
+        return None
+    return str(inst_dir)
+
+
+async def acquire_warm_instance(*, user_id: int, project_id: int) -> dict | None:
+    """
+    从预热池取一个已就绪实例并切换到项目目录，返回与 start_instance 相同结构的信息；池为空或分配失败返回 None。
+    """
+    global _last_acquire
+    if int(settings.COMFYUI_WARM_POOL_SIZE) <= 0 or not settings.PLATFORM_INTERNAL_SECRET:
+        return None
+    _last_acquire = time.monotonic()
+    cfg = load_comfyui_config()
+    while True:
+        async with _pool_lock:
+            if not _pool:
+                return None
+            w = _pool.pop(0)
+        if w.proc.poll() is None and await is_healthy(w.comfy_url):
+            base_dir = await _assign(w, cfg, user_id=user_id, project_id=project_id)
+            if base_dir:
+                logger.info(f"[ComfyUI] warm instance {w.comfy_url} assigned to project {project_id}")
+                # assign 只切换 output/temp/input/user，custom_nodes、模型路径与扩展静态目录仍指向启动目录，
+                # 进程退出前不能删除
+                _assigned.append(w)
+                return {
+                    "port": w.port,
+                    "comfy_url": w.comfy_url,
+                    "pid": w.proc.pid,
+                    "base_dir": base_dir,
+                    "log_path": w.log_path,
+                }
+        await _retire(w)
+
+
+async def maintain_pool_once(cfg: ComfyUIConfig) -> None:
+    """
+    删除已分配且已退出实例的启动目录；清理已退出的实例，超出目标容量时回收空闲最久的实例，不足时补齐（逐个启动，避免同时导入拖垮机器）。
+    """
+    exited = [w for w in _assigned if w.proc.poll() is not None]
+    for w in exited:
+        _assigned.remove(w)
+        await asyncio.to_thread(shutil.rmtree, w.base_dir, True)
+
+    async with _pool_lock:
+        dead = [w for w in _pool if w.proc.poll() is not None]
+        for w in dead:
+            _pool.remove(w)
+        surplus = _pool[: max(0, len(_pool) - _target_size())]
+        for w in surplus:
+            _pool.remove(w)
+    for w in dead:
+        logger.warning(f"[ComfyUI] warm instance exited: pid={w.proc.pid}")
+        await _retire(w)
+    for w in surplus:
+        logger.info(f"[ComfyUI] warm instance reaped (idle): {w.comfy_url}")
+        await _retire(w)
+
+    budget = int(settings.COMFYUI_MEMORY_BUDGET_MB) << 20
+    if budget > 0 and _pool:
+        # 超出内存预算时先回收预热实例（它们没有在服务任何项目）
+        used, _ = await _memory_usage()
+        while used > budget:
+            async with _pool_lock:
+                if not _pool:
+                    break
+                w = _pool.pop(0)
+            used -= await asyncio.to_thread(process_rss, w.proc.pid)
+            logger.info(f"[ComfyUI] warm instance reaped (memory budget): {w.comfy_url}")
+            await _retire(w)
+
+    while len(_pool) < _target_size():
+        if budget > 0:
+            used, estimate = await _memory_usage()
+            if used + estimate > budget:
+                logger.debug("[ComfyUI] warm pool not refilled: memory budget reached")
+                return
+        w = await _spawn_warm(cfg)
+        if w is None:
+            return
+        async with _pool_lock:
+            _pool.append(w)
+        logger.info(f"[ComfyUI] warm instance ready: {w.comfy_url} (pool={len(_pool)})")
+
+
+async def warm_pool_loop(stop_event: asyncio.Event) -> None:
+    """
+    后台维持 ComfyUI 预热池；退出时停止所有未分配的预热进程。
+    """
+    if int(settings.COMFYUI_WARM_POOL_SIZE) <= 0:
+        return
+    if not settings.PLATFORM_INTERNAL_SECRET:
+        logger.warning("[ComfyUI] warm pool disabled (PLATFORM_INTERNAL_SECRET is empty)")
+        return
+    try:
+        cfg = load_comfyui_config()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"[ComfyUI] warm pool disabled (config invalid): {e}")
+        return
+
+    interval = max(1, int(settings.COMFYUI_WARM_POOL_CHECK_SECONDS))
+    try:
+        while not stop_event.is_set():
+            try:
+                await maintain_pool_once(cfg)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[ComfyUI] warm pool error: {e}")
+            with suppress(TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+    finally:
+        async with _pool_lock:
+            remaining = list(_pool)
+            _pool.clear()
+        for w in remaining:
+            with suppress(Exception):
+                await _retire(w)
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from starlette.background import BackgroundTask
+from tortoise.expressions import Q
+
+from app.models.admin import User
+from app.models.platform import GenerationLog, Project
+from app.settings.config import settings
+
+EXPORT_FORMATS = ("xlsx", "csv")
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+LOG_EXPORT_COLUMNS = [
+    "id",
+    "timestamp",
+    "user_id",
+    "user",
+    "project_id",
+    "project",
+    "status",
+    "prompt_id",
+    "concurrent_id",
+    "duration_ms",
+    "details",
+]
+
+_XLSX_MAX_CELL_CHARS = 32767
+_FILE_CHUNK_SIZE = 64 * 1024
+
+
+async def iter_generation_log_rows(q: Q, *, batch_size: int = 1000) -> AsyncIterator[list[list[Any]]]:
+    """
+    按主键做 keyset 分批遍历 generation_logs（WHERE id > last_id ORDER BY id LIMIT n），
+    每批只驻留 batch_size 行，适合任意行数的导出。
+    """
+    user_names: dict[int, str] = {}
+    project_names: dict[int, str] = {}
+    last_id = 0
+    while True:
+        rows = (
+            await GenerationLog.filter(q, id__gt=last_id)
+            .order_by("id")
+            .limit(batch_size)
+            .values(
+                "id",
+                "timestamp",
+                "user_id",
+                "project_id",
+                "status",
+                "prompt_id",
+                "concurrent_id",
+                "duration_ms",
+                "details",
+            )
+        )
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+
+        new_users = {r["user_id"] for r in rows} - user_names.keys()
+        if new_users:
+            user_names.update(await User.filter(id__in=new_users).values_list("id", "username"))
+            user_names.update({uid: "" for uid in new_users - user_names.keys()})
+        new_projects = {r["project_id"] for r in rows} - project_names.keys()
+        if new_projects:
+            project_names.update(await Project.filter(id__in=new_projects).values_list("id", "name"))
+            project_names.update({pid: "" for pid in new_projects - project_names.keys()})
+
+        yield [
+            [
+                r["id"],
+                r["timestamp"].strftime(settings.DATETIME_FORMAT) if r["timestamp"] else "",
+                r["user_id"],
+                user_names.get(r["user_id"], ""),
+                r["project_id"],
+                project_names.get(r["project_id"], ""),
+                r["status"],
+                r["prompt_id"] or "",
+                r["concurrent_id"] if r["concurrent_id"] is not None else "",
+                r["duration_ms"] if r["duration_ms"] is not None else "",
+                json.dumps(r["details"], ensure_ascii=False, default=str) if r["details"] is not None else "",
+            ]
+            for r in rows
+        ]
+        if len(rows) < batch_size:
+            return
+
+
+async def iter_static_rows(rows: Iterable[list[Any]], *, batch_size: int = 1000) -> AsyncIterator[list[list[Any]]]:
+    batch: list[list[Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _csv_chunks(header: list[str], batches: AsyncIterator[list[list[Any]]]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # 带 BOM，便于 Excel 直接识别 UTF-8 中文
+    buf.write("\ufeff")
+    writer.writerow(header)
+    yield buf.getvalue().encode("utf-8")
+    async for batch in batches:
+        buf.seek(0)
+        buf.truncate(0)
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _xlsx_value(v: Any) -> Any:
+    if isinstance(v, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", v)[:_XLSX_MAX_CELL_CHARS]
+    if isinstance(v, datetime):
+        return v.strftime(settings.DATETIME_FORMAT)
+    return v
+
+
+def _append_rows(ws, rows: Iterable[list[Any]]) -> None:
+    for row in rows:
+        ws.append([_xlsx_value(v) for v in row])
+
+
+async def _write_xlsx(header: list[str], batches: AsyncIterator[list[list[Any]]], *, title: str) -> str:
+    """
+    使用 openpyxl write-only 模式逐行写入（行数据直接落到临时文件，不在内存中构建整张表），返回生成的 xlsx 路径。
+    事件循环只负责分批查询，每批行的写入与最终保存都在工作线程中执行。
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+    await asyncio.to_thread(_append_rows, ws, [header])
+    async for batch in batches:
+        await asyncio.to_thread(_append_rows, ws, batch)
+
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(wb.save, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _file_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(_FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def export_response(
+    filename: str,
+    fmt: str,
+    header: list[str],
+    batches: AsyncIterator[list[list[Any]]],
+    *,
+    title: str = "export",
+) -> StreamingResponse:
+    """
+    按 fmt 生成流式下载响应：
+    - csv：边查询边编码边发送，内存占用与总行数无关
+    - xlsx：write-only 写入临时文件后分块发送，发送完成删除临时文件
+    """
+    if fmt == "csv":
+        headers = {"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        return StreamingResponse(_csv_chunks(header, batches), headers=headers, media_type=CSV_MEDIA_TYPE)
+
+    path = await _write_xlsx(header, batches, title=title)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.xlsx"',
+        "Content-Length": str(os.path.getsize(path)),
+    }
+    return StreamingResponse(
+        _file_chunks(path),
+        headers=headers,
+        media_type=XLSX_MEDIA_TYPE,
+        background=BackgroundTask(_remove_file, path),
+    )
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from pypika.terms import Function as PypikaFunction
+from tortoise.expressions import Function, Q
+from tortoise.functions import Count, Sum
+
+from app.models.admin import User
+from app.models.platform import GenerationLog, Project
+
+STATUS_SUCCESS = "成功"
+STATUS_FAILED = "失败"
+
+DIMENSIONS = ("day", "project", "user", "status")
+
+
+class _TruncDayFunc(PypikaFunction):
+    """
+    按天截断时间：PostgreSQL 使用 date_trunc('day', ts)，SQLite 使用 DATE(ts)。
+    """
+
+    def __init__(self, term, alias=None):
+        super().__init__("DATE", term, alias=alias)
+
+    def get_function_sql(self, **kwargs: Any) -> str:
+        dialect = kwargs.get("dialect")
+        if dialect is not None and dialect.value == "postgresql":
+            arg_sql = self.get_arg_sql(self.args[0], **kwargs)
+            return f"DATE_TRUNC('day',{arg_sql})"
+        return super().get_function_sql(**kwargs)
+
+
+class TruncDay(Function):
+    database_func = _TruncDayFunc
+
+
+def parse_date(s: str) -> datetime:
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    raise ValueError("invalid date format")
+
+
+def parse_day(s: str | None) -> date | None:
+    """
+    仅当参数是纯日期（YYYY-MM-DD）时返回 date，否则返回 None。
+    """
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def build_log_filter(
+    *,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    project_id: int | None = None,
+    user_id: int | None = None,
+    status: str | None = None,
+) -> Q:
+    q = Q()
+    if start_date:
+        q &= Q(timestamp__gte=parse_date(start_date))
+    if end_date:
+        end_day = parse_day(end_date)
+        if end_day:
+            # 纯日期的结束时间包含当天全天
+            q &= Q(timestamp__lt=datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+        else:
+            q &= Q(timestamp__lte=parse_date(end_date))
+    if project_id is not None:
+        q &= Q(project_id=project_id)
+    if user_id is not None:
+        q &= Q(user_id=user_id)
+    if status:
+        q &= Q(status=status)
+    return q
+
+
+def day_str(v: Any) -> str:
+    if isinstance(v, (datetime, date)):
+        return v.strftime("%Y-%m-%d")
+    return str(v)[:10] if v is not None else ""
+
+
+async def aggregate_generation_logs(dimension: str, q: Q) -> list[dict]:
+    """
+    在数据库侧完成分组聚合（GROUP BY + COUNT），只返回聚合结果行，避免把 generation_logs 整表拉回内存。
+
+    - day: [{date, count, success, failed, total_duration_ms}]
+    - project: [{project_id, project_name, count, success, failed, total_duration_ms}]
+    - user: [{user_id, user_name, count, success, failed, total_duration_ms}]
+    - status: [{status, count}]
+    """
+    if dimension not in DIMENSIONS:
+        return []
+
+    qs = GenerationLog.filter(q)
+    if dimension == "status":
+        rows = await qs.annotate(count=Count("id")).group_by("status").values("status", "count")
+        return [{"status": r["status"], "count": int(r["count"])} for r in sorted(rows, key=lambda r: r["status"])]
+
+    qs = qs.annotate(
+        count=Count("id"),
+        success=Count("id", _filter=Q(status=STATUS_SUCCESS)),
+        failed=Count("id", _filter=Q(status=STATUS_FAILED)),
+        duration=Sum("duration_ms"),
+    )
+
+    if dimension == "day":
+        rows = (
+            await qs.annotate(day=TruncDay("timestamp"))
+            .group_by("day")
+            .values("day", "count", "success", "failed", "duration")
+        )
+        data = [
+            {
+                "date": day_str(r["day"]),
+                "count": int(r["count"]),
+                "success": int(r["success"]),
+                "failed": int(r["failed"]),
+                "total_duration_ms": int(r["duration"] or 0),
+            }
+            for r in rows
+        ]
+        return sorted(data, key=lambda d: d["date"])
+
+    if dimension == "project":
+        rows = await qs.group_by("project_id").values("project_id", "count", "success", "failed", "duration")
+        ids = [int(r["project_id"]) for r in rows]
+        names = dict(await Project.filter(id__in=ids).values_list("id", "name")) if ids else {}
+        data = [
+            {
+                "project_id": int(r["project_id"]),
+                "project_name": names.get(int(r["project_id"]), ""),
+                "count": int(r["count"]),
+                "success": int(r["success"]),
+                "failed": int(r["failed"]),
+                "total_duration_ms": int(r["duration"] or 0),
+            }
+            for r in rows
+        ]
+        return sorted(data, key=lambda d: d["project_id"])
+
+    rows = await qs.group_by("user_id").values("user_id", "count", "success", "failed", "duration")
+    ids = [int(r["user_id"]) for r in rows]
+    names = dict(await User.filter(id__in=ids).values_list("id", "username")) if ids else {}
+    data = [
+        {
+            "user_id": int(r["user_id"]),
+            "user_name": names.get(int(r["user_id"]), ""),
+            "count": int(r["count"]),
+            "success": int(r["success"]),
+            "failed": int(r["failed"]),
+            "total_duration_ms": int(r["duration"] or 0),
+        }
+        for r in rows
+    ]
+    return sorted(data, key=lambda d: d["user_id"])
@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import uuid
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator, Type
+
+from tortoise import Model
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from app.log import logger
+from app.models.admin import AuditLog
+from app.models.platform import GenerationLog, GenerationLogKey
+from app.settings.config import settings
+
+ARCHIVE_FORMATS = ("csv", "parquet", "none")
+_ARCHIVE_BATCH = 5000
+# 所有进程共用的 DDL 锁（pg_advisory_xact_lock 的 key）
+_LOCK_KEY = "log_partitions"
+# 保留策略（归档 + 删除分区）的会话级锁，同一时间只有一个进程执行
+_RETENTION_LOCK_KEY = "log_retention"
+
+# 数据库中已是分区表（pg_class.relkind = 'p'）的表名，由 load_partition_state 在启动和每次维护时从数据库刷新
+_partitioned: set[str] = set()
+
+
+def partitioned_tables() -> list[tuple[Type[Model], str, int]]:
+    """
+    (模型, 分区键字段, 保留月数)。保留月数 <= 0 表示不清理。
+    """
+    return [
+        (GenerationLog, "timestamp", int(settings.GENERATION_LOG_RETENTION_MONTHS)),
+        (AuditLog, "created_at", int(settings.AUDIT_LOG_RETENTION_MONTHS)),
+    ]
+
+
+def month_start(v: datetime | date) -> datetime:
+    return datetime(v.year, v.month, 1)
+
+
+def add_months(v: datetime, n: int) -> datetime:
+    m = v.month - 1 + n
+    return datetime(v.year + m // 12, m % 12 + 1, 1)
+
+
+def iter_months(start: datetime, end: datetime) -> Iterator[datetime]:
+    """
+    [start, end) 内的各月月初
+    """
+    month = month_start(start)
+    while month < end:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(model: Type[Model]) -> bool:
+    return model._meta.db_table in _partitioned
+
+
+def _is_postgres(model: Type[Model]) -> bool:
+    return model._meta.db.capabilities.dialect == "postgres"
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(v: datetime) -> str:
+    return f"'{v:%Y-%m-%d %H:%M:%S}'"
+
+
+async def _relkind(conn: BaseDBAsyncClient, table: str) -> str | None:
+    rows = await conn.execute_query_dict(
+        "SELECT c.relkind::text AS relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = $1 AND n.nspname = current_schema()",
+        [table],
+    )
+    return rows[0]["relkind"] if rows else None
+
+
+async def _move_rows(conn: BaseDBAsyncClient, table: str, legacy: str, where: str) -> int:
+    """
+    把原表中满足 where 的行搬入分区父表，返回行数。
+    generation_logs 的 (project_id, prompt_id) 同时写入 generation_log_keys。
+    """
+    ctes = [f"moved AS (DELETE FROM {_q(legacy)} WHERE {where} RETURNING *)"]
+    if table == GenerationLog._meta.db_table:
+        ctes.append(
+            f"keys AS (INSERT INTO {_q(GenerationLogKey._meta.db_table)} (project_id, prompt_id) "
+            "SELECT DISTINCT project_id, prompt_id FROM moved WHERE prompt_id IS NOT NULL "
+            "ON CONFLICT (project_id, prompt_id) DO NOTHING)"
+        )
+    ctes.append(f"copied AS (INSERT INTO {_q(table)} SELECT * FROM moved RETURNING 1)")
+    rows = await conn.execute_query_dict(f"WITH {', '.join(ctes)} SELECT count(*) AS n FROM copied")
+    return int(rows[0]["n"])
+
+
+async def convert_to_partitioned(model: Type[Model], column: str) -> bool:
+    """
+    把普通表改为按月 RANGE 分区表（由 scripts/partition_logs.py 显式执行，执行前需停止服务）：
+    1. 原表改名为 <表名>_unpartitioned，以 LIKE 建分区父表、默认分区和数据覆盖月份的分区；
+    2. 按月把数据搬入父表，每月一个事务并记录进度，中断后重新执行从剩余月份继续；
+    3. 删除已搬空的原表，在父表上重建索引。分区表的主键/唯一索引必须包含分区键，因此都追加了分区键列。
+    返回是否做了转换（已是分区表时返回 False）。
+    """
+    table = model._meta.db_table
+    legacy = f"{table}_unpartitioned"
+    connection = model._meta.default_connection
+    async with in_transaction(connection) as conn:
+        await conn.execute_query("SELECT pg_advisory_xact_lock(hashtext($1))", [_LOCK_KEY])
+        kind = await _relkind(conn, table)
+        if kind == "r":
+            await conn.execute_script(f"ALTER TABLE {_q(table)} RENAME TO {_q(legacy)}")
+            seq = await conn.execute_query_dict("SELECT pg_get_serial_sequence($1, 'id') AS seq", [legacy])
+            await conn.execute_script(
+                f"CREATE TABLE {_q(table)} "
+                f"(LIKE {_q(legacy)} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING COMMENTS) "
+                f"PARTITION BY RANGE ({_q(column)});"
+                f"ALTER TABLE {_q(table)} ADD PRIMARY KEY (id, {_q(column)});"
+                f"CREATE TABLE {_q(table + '_default')} PARTITION OF {_q(table)} DEFAULT;"
+            )
+            if seq and seq[0]["seq"]:
+                # 自增序列改为归属新表，否则删除原表时会一并删除序列
+                await conn.execute_script(f"ALTER SEQUENCE {seq[0]['seq']} OWNED BY {_q(table)}.id")
+            logger.info(f"[Partition] {table} renamed to {legacy}, copying to monthly partitions on {column}")
+        elif kind != "p" or await _relkind(conn, legacy) is None:
+            return False
+        else:
+            logger.info(f"[Partition] resuming conversion of {table} from {legacy}")
+        bounds = await conn.execute_query_dict(
+            f"SELECT min({_q(column)}) AS lo, max({_q(column)}) AS hi FROM {_q(legacy)}"
+        )
+
+    months = []
+    if bounds and bounds[0]["lo"] is not None:
+        months = list(iter_months(bounds[0]["lo"], add_months(month_start(bounds[0]["hi"]), 1)))
+    total = 0
+    for i, month in enumerate(months, 1):
+        async with in_transaction(connection) as conn:
+            await conn.execute_query("SELECT pg_advisory_xact_lock(hashtext($1))", [_LOCK_KEY])
+            await _create_partition(conn, table, column, month)
+            lo, hi = _literal(month), _literal(add_months(month, 1))
+            n = await _move_rows(conn, table, legacy, f"{_q(column)} >= {lo} AND {_q(column)} < {hi}")
+        total += n
+        logger.info(f"[Partition] {table} {month:%Y-%m}: {n} rows copied ({i}/{len(months)}, {total} in total)")
+
+    async with in_transaction(connection) as conn:
+        await conn.execute_query("SELECT pg_advisory_xact_lock(hashtext($1))", [_LOCK_KEY])
+        # 分区键为 NULL 等不在任何月份内的行进入默认分区
+        total += await _move_rows(conn, table, legacy, "TRUE")
+        indexes = await conn.execute_query_dict(
+            "SELECT i.indexdef, ix.indisprimary, ix.indisunique FROM pg_indexes i "
+            "JOIN pg_class c ON c.relname = i.indexname JOIN pg_index ix ON ix.indexrelid = c.oid "
+            "WHERE i.tablename = $1 AND i.schemaname = current_schema()",
+            [legacy],
+        )
+        await conn.execute_script(f"DROP TABLE {_q(legacy)}")
+        for row in indexes:
+            if row["indisprimary"]:
+                continue
+            ddl = row["indexdef"].replace(f" ON {legacy} ", f" ON {table} ")
+            ddl = re.sub(rf" ON \S*\.{re.escape(legacy)} ", f" ON {_q(table)} ", ddl)
+            if row["indisunique"] and column not in ddl[ddl.rindex("(") :]:
+                ddl = ddl[: ddl.rindex(")")] + f", {_q(column)})"
+            await conn.execute_script(ddl)
+    logger.info(f"[Partition] {table} converted to monthly partitions on {column}: {total} rows")
+    return True
+
+
+async def _create_partition(conn: BaseDBAsyncClient, table: str, column: str, month: datetime) -> bool:
+    """
+    创建 month 所在月的分区（已存在则跳过）。默认分区中落入该月的行先搬入新表再 ATTACH，
+    否则 ATTACH 会因默认分区中存在重叠数据而失败。
+    """
+    name = partition_name(table, month)
+    if await _relkind(conn, name):
+        return False
+    lo, hi = _literal(month), _literal(add_months(month, 1))
+    await conn.execute_script(
+        f"CREATE TABLE {_q(name)} (LIKE {_q(table)} INCLUDING DEFAULTS);"
+        f"WITH moved AS (DELETE FROM {_q(table + '_default')} WHERE {_q(column)} >= {lo} AND {_q(column)} < {hi} "
+        f"RETURNING *) INSERT INTO {_q(name)} SELECT * FROM moved;"
+        f"ALTER TABLE {_q(table)} ATTACH PARTITION {_q(name)} FOR VALUES FROM ({lo}) TO ({hi});"
+    )
+    logger.info(f"[Partition] created {name}")
+    return True
+
+
+async def load_partition_state() -> None:
+    """
+    从数据库读取各日志表当前是否为分区表，写入路径据此选择唯一键的保证方式（见 is_partitioned）。
+    """
+    for model, _, _ in partitioned_tables():
+        table = model._meta.db_table
+        if _is_postgres(model) and await _relkind(model._meta.db, table) == "p":
+            _partitioned.add(table)
+        else:
+            _partitioned.discard(table)
+
+
+async def ensure_partitions() -> None:
+    """
+    读取分区状态；分区开启时为 PostgreSQL 上已是分区表的 generation_logs / auditlog 预建当前月起
+    LOG_PARTITION_PREMAKE_MONTHS 个月的分区。普通表不在启动时转换（耗时且锁表），需执行 make partition-logs；
+    其他数据库不分区，保留策略退化为按月 DELETE。
+    """
+    await load_partition_state()
+    if not settings.LOG_PARTITIONING_ENABLED:
+        return
+    now = month_start(datetime.now())
+    for model, column, _ in partitioned_tables():
+        if not _is_postgres(model):
+            continue
+        table = model._meta.db_table
+        if not is_partitioned(model):
+            logger.info(f"[Partition] {table} is not partitioned yet, run 'make partition-logs' to convert it")
+            continue
+        async with in_transaction(model._meta.default_connection) as conn:
+            await conn.execute_query("SELECT pg_advisory_xact_lock(hashtext($1))", [_LOCK_KEY])
+            for month in iter_months(now, add_months(now, max(0, int(settings.LOG_PARTITION_PREMAKE_MONTHS)) + 1)):
+                await _create_partition(conn, table, column, month)
+
+
+async def claim_prompt_keys(conn: BaseDBAsyncClient, keys: Iterable[tuple[int, str]]) -> set[tuple[int, str]]:
+    """
+    分区表写入 generation_logs 前在同一事务内登记 (project_id, prompt_id)，返回本次新登记的键；
+    已登记的键（日志已存在或正由并发事务写入，后者会等待其提交）不返回。
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return set()
+    rows = await conn.execute_query_dict(
+        f"INSERT INTO {_q(GenerationLogKey._meta.db_table)} (project_id, prompt_id) "
+        "SELECT * FROM unnest($1::bigint[], $2::text[]) ON CONFLICT (project_id, prompt_id) DO NOTHING "
+        "RETURNING project_id, prompt_id",
+        [[k[0] for k in keys], [k[1] for k in keys]],
+    )
+    return {(int(r["project_id"]), r["prompt_id"]) for r in rows}
+
+
+def _archive_value(v: Any) -> Any:
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, ensure_ascii=False)
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+async def _iter_month_rows(model: Type[Model], column: str, month: datetime, fields: list[str]):
+    """
+    按 id 键集分批读取该月的行（带分区键范围条件，分区表上只扫描该月分区）
+    """
+    last_id = None
+    while True:
+        q = model.filter(**{f"{column}__gte": month, f"{column}__lt": add_months(month, 1)})
+        if last_id is not None:
+            q = q.filter(id__gt=last_id)
+        rows = await q.order_by("id").limit(_ARCHIVE_BATCH).values_list(*fields)
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [[_archive_value(v) for v in row] for row in rows]
+
+
+def _parquet_schema(model: Type[Model], fields: list[str]):
+    import pyarrow as pa
+
+    types = []
+    for name in fields:
+        field_type = type(model._meta.fields_map[name]).__name__
+        if field_type in ("IntField", "BigIntField", "SmallIntField"):
+            types.append(pa.int64())
+        elif field_type == "BooleanField":
+            types.append(pa.bool_())
+        elif field_type == "FloatField":
+            types.append(pa.float64())
+        else:
+            # 时间以 ISO 字符串、JSON 以文本保存，与 CSV 归档一致
+            types.append(pa.string())
+    return pa.schema(list(zip(fields, types)))
+
+
+async def archive_month(model: Type[Model], column: str, month: datetime) -> str | None:
+    """
+    把该月数据归档到 LOG_ARCHIVE_DIR/<表名>/<表名>_YYYYMM.csv.gz（或 .parquet），先写临时文件再改名。
+    返回归档文件路径；该月无数据时返回 None。
+    """
+    table = model._meta.db_table
+    fmt = settings.LOG_ARCHIVE_FORMAT
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.warning("[Partition] pyarrow is not installed, archiving as csv.gz instead of parquet")
+            fmt = "csv"
+    directory = os.path.join(settings.LOG_ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{table}_{month:%Y%m}." + ("parquet" if fmt == "parquet" else "csv.gz"))
+    # 临时文件名唯一，多个进程同时归档同一月份时不会互相覆盖
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    fields = ["id", *(name for name in model._meta.fields_db_projection if name != "id")]
+
+    n = 0
+    try:
+        if fmt == "parquet":
+            import pyarrow as pa
+
+            schema = _parquet_schema(model, fields)
+            writer = None
+            try:
+                async for batch in _iter_month_rows(model, column, month, fields):
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+                    columns = list(zip(*batch))
+                    writer.write_table(
+                        pa.Table.from_arrays(
+                            [pa.array(col, type=t) for col, t in zip(columns, schema.types)], schema=schema
+                        )
+                    )
+                    n += len(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(fields)
+                async for batch in _iter_month_rows(model, column, month, fields):
+                    w.writerows(batch)
+                    n += len(batch)
+        if not n:
+            return None
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"[Partition] archived {n} rows of {table} {month:%Y-%m} to {path}")
+    return path
+
+
+async def _drop_month(model: Type[Model], column: str, month: datetime) -> None:
+    """
+    分区表：DETACH 并 DROP 该月分区（默认分区中的残留行按范围删除）；普通表：按范围 DELETE。
+    """
+    table = model._meta.db_table
+    q = model.filter(**{f"{column}__gte": month, f"{column}__lt": add_months(month, 1)})
+    if not is_partitioned(model):
+        await q.delete()
+        return
+    name = partition_name(table, month)
+    async with in_transaction(model._meta.default_connection) as conn:
+        await conn.execute_query("SELECT pg_advisory_xact_lock(hashtext($1))", [_LOCK_KEY])
+        if model is GenerationLog:
+            # 释放该月日志登记的唯一键
+            await conn.execute_script(
+                f"DELETE FROM {_q(GenerationLogKey._meta.db_table)} k USING {_q(table)} l "
+                f"WHERE l.{_q(column)} >= {_literal(month)} AND l.{_q(column)} < {_literal(add_months(month, 1))} "
+                "AND k.project_id = l.project_id AND k.prompt_id = l.prompt_id"
+            )
+        if await _relkind(conn, name):
+            await conn.execute_script(f"ALTER TABLE {_q(table)} DETACH PARTITION {_q(name)}; DROP TABLE {_q(name)};")
+            logger.info(f"[Partition] dropped {name}")
+    await q.delete()
+
+
+async def apply_retention(now: datetime | None = None) -> int:
+    """
+    清理超过保留月数的整月数据：先归档（LOG_ARCHIVE_FORMAT 为 none 时跳过），归档成功后删除。返回清理的月数。
+    PostgreSQL 下持有会话级咨询锁执行，其他进程正在执行时直接跳过。
+    """
+    if all(months <= 0 for _, _, months in partitioned_tables()):
+        return 0
+    if not _is_postgres(GenerationLog):
+        return await _apply_retention(now)
+    async with GenerationLog._meta.db.acquire_connection() as conn:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", _RETENTION_LOCK_KEY):
+            logger.info("[Partition] retention is running in another process, skipped")
+            return 0
+        try:
+            return await _apply_retention(now)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", _RETENTION_LOCK_KEY)
+
+
+async def _apply_retention(now: datetime | None) -> int:
+    cutoff_base = month_start(now or datetime.now())
+    n = 0
+    for model, column, months in partitioned_tables():
+        if months <= 0:
+            continue
+        cutoff = add_months(cutoff_base, -months)
+        oldest = await model.filter(**{f"{column}__lt": cutoff}).order_by(column).first().values_list(column, flat=True)
+        if oldest is None:
+            continue
+        for month in iter_months(oldest, cutoff):
+            try:
+                if settings.LOG_ARCHIVE_FORMAT != "none":
+                    await archive_month(model, column, month)
+                await _drop_month(model, column, month)
+                n += 1
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[Partition] retention of {model._meta.db_table} {month:%Y-%m} failed: {e}")
+                break
+    return n
+
+
+async def maintain_partitions() -> None:
+    await ensure_partitions()
+    await apply_retention()
+
+
+async def partition_maintenance_loop(stop_event: asyncio.Event) -> None:
+    """
+    定期预建未来分区并执行保留策略（启动时 init_db 已完成一次 ensure_partitions）。
+    """
+    interval = int(settings.LOG_PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+    if interval <= 0:
+        return
+    while not stop_event.is_set():
+        try:
+            await maintain_partitions()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"[Partition] maintenance error: {e}")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except TimeoutError:
+            pass
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import time
+from typing import NamedTuple, Optional
+
+from app.models.admin import Api, Role, User
+from app.settings.config import settings
+
+
+class UserPermissions(NamedTuple):
+    user_id: int
+    username: str
+    is_superuser: bool
+    has_roles: bool
+    # (method, path) 集合，path 为路由模板路径
+    apis: frozenset[tuple[str, str]]
+
+
+# 全局版本号：角色、API、角色-API 绑定变更时递增，使所有用户的缓存失效
+_version = 0
+# 用户版本号：用户信息、用户-角色绑定变更时递增
+_user_versions: dict[int, int] = {}
+# user_id -> ((全局版本号, 用户版本号), 过期时间(monotonic), 权限)
+_entries: dict[int, tuple[tuple[int, int], float, UserPermissions]] = {}
+
+
+def _current_version(user_id: int) -> tuple[int, int]:
+    return _version, _user_versions.get(user_id, 0)
+
+
+async def get_user_permissions(user_id: int) -> Optional[UserPermissions]:
+    """
+    查询用户的权限集合（进程内缓存，按版本号失效并受 TTL 限制）。
+    未命中时一次查询用户、一次查询角色、一次查询 API，不再逐个角色查询；用户不存在时返回 None，不做负缓存。
+    TTL 用于限定多进程部署下其他进程变更权限后的最长生效延迟。
+    """
+    now = time.monotonic()
+    # 版本号在查询前记录：加载期间发生的失效不会被这次加载的结果覆盖
+    version = _current_version(user_id)
+    hit = _entries.get(user_id)
+    if hit and hit[0] == version and hit[1] > now:
+        return hit[2]
+
+    user = await User.filter(id=user_id).first().values("id", "username", "is_superuser")
+    if not user:
+        _entries.pop(user_id, None)
+        return None
+    has_roles = await Role.filter(user_roles__id=user_id).exists()
+    rows = await Api.filter(role_apis__user_roles__id=user_id).distinct().values_list("method", "path")
+    permissions = UserPermissions(
+        user_id=user["id"],
+        username=user["username"],
+        is_superuser=user["is_superuser"],
+        has_roles=has_roles,
+        apis=frozenset((str(method), path) for method, path in rows),
+    )
+    if version == _current_version(user_id):
+        _entries[user_id] = (version, now + max(0, int(settings.PERMISSION_CACHE_TTL_SECONDS)), permissions)
+    return permissions
+
+
+def invalidate_permissions(user_id: int | None = None) -> None:
+    """
+    权限相关数据变更后调用：user_id 为空表示角色/API 变更，所有用户失效；否则只失效该用户（用户信息或用户-角色绑定变更）。
+    """
+    global _version
+    if user_id is None:
+        _version += 1
+        _entries.clear()
+    else:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+        _entries.pop(user_id, None)
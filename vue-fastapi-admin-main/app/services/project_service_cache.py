@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable
+
+from app.models.platform import ComfyUIService
+from app.settings.config import settings
+
+# project_id -> (过期时间(monotonic), 服务所属 user_id)
+_owners: dict[int, tuple[float, int]] = {}
+
+
+async def get_project_owners(project_ids: Iterable[int]) -> dict[int, int]:
+    """
+    查询 project_id -> ComfyUI 服务所属 user_id 的映射（进程内 TTL 缓存，未命中的项目一次批量查询）。
+    没有服务记录的项目不出现在结果中，也不做负缓存。
+    """
+    now = time.monotonic()
+    result: dict[int, int] = {}
+    missing: set[int] = set()
+    for project_id in set(project_ids):
+        hit = _owners.get(project_id)
+        if hit and hit[0] > now:
+            result[project_id] = hit[1]
+        else:
+            missing.add(project_id)
+
+    if missing:
+        expires = now + max(0, int(settings.PROJECT_SERVICE_CACHE_TTL_SECONDS))
+        rows = await ComfyUIService.filter(project_id__in=missing).order_by("id").values_list("project_id", "user_id")
+        for project_id, user_id in rows:
+            # 同一项目理论上只有一条服务记录；若有多条，与原 .first() 一致取最早的一条
+            if project_id in missing:
+                missing.discard(project_id)
+                result[project_id] = user_id
+                _owners[project_id] = (expires, user_id)
+    return result
+
+
+async def get_project_owner(project_id: int) -> int | None:
+    return (await get_project_owners([project_id])).get(project_id)
+
+
+def invalidate_project(project_id: int | None = None) -> None:
+    """
+    服务记录创建/删除/变更归属后调用；project_id 为空时清空全部缓存。
+    """
+    if project_id is None:
+        _owners.clear()
+    else:
+        _owners.pop(project_id, None)
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import asyncio
+import shutil
+import time
+from collections import deque
+from typing import Any, Optional
+
+import psutil
+
+from app.log import logger
+from app.models.platform import ComfyUIService
+from app.settings.config import settings
+
+# /server/stats 中随快照返回的最近数据点数（与旧接口一致）
+RECENT_POINTS = 60
+# 降采样历史的桶宽（秒）
+MINUTE = 60
+
+
+class NvidiaSmiProvider:
+    """
+    通过 nvidia-smi 采集 GPU 利用率/显存（异步子进程，超时后结束进程）
+    """
+
+    name = "nvidia-smi"
+
+    def __init__(self, executable: str = "nvidia-smi", timeout: float = 5) -> None:
+        self.executable = executable
+        self.timeout = timeout
+
+    async def sample(self) -> dict:
+        proc = await asyncio.create_subprocess_exec(
+            self.executable,
+            "--query-gpu=utilization.gpu,memory.used,memory.total",
+            "--format=csv,noheader,nounits",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=self.timeout)
+        except TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            return {"available": False, "gpus": []}
+        gpus = []
+        for line in stdout.decode().strip().splitlines():
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) >= 3:
+                gpus.append(
+                    {"utilization": float(parts[0]), "memory_used": float(parts[1]), "memory_total": float(parts[2])}
+                )
+        return {"available": True, "gpus": gpus}
+
+
+class StubGpuProvider:
+    """
+    没有 nvidia-smi 时使用：gpu_count 为 0 返回“不可用”，否则返回确定性的模拟读数（便于开发与测试）
+    """
+
+    name = "stub"
+
+    def __init__(self, gpu_count: int = 0, memory_total: float = 24576) -> None:
+        self.gpu_count = max(0, gpu_count)
+        self.memory_total = memory_total
+        self.ticks = 0
+
+    async def sample(self) -> dict:
+        if not self.gpu_count:
+            return {"available": False, "gpus": []}
+        self.ticks += 1
+        gpus = []
+        for i in range(self.gpu_count):
+            utilization = float((self.ticks * 7 + i * 31) % 101)
+            gpus.append(
+                {
+                    "utilization": utilization,
+                    "memory_used": round(self.memory_total * utilization / 100, 1),
+                    "memory_total": self.memory_total,
+                }
+            )
+        return {"available": True, "gpus": gpus}
+
+
+def make_gpu_provider():
+    """
+    SERVER_METRICS_GPU_PROVIDER：auto（有 nvidia-smi 时使用，否则 stub）/ nvidia-smi / stub
+    """
+    provider = settings.SERVER_METRICS_GPU_PROVIDER
+    timeout = float(settings.SERVER_METRICS_GPU_TIMEOUT_SECONDS)
+    if provider == "nvidia-smi" or (provider == "auto" and shutil.which("nvidia-smi")):
+        return NvidiaSmiProvider(timeout=timeout)
+    return StubGpuProvider(gpu_count=int(settings.SERVER_METRICS_STUB_GPU_COUNT))
+
+
+class _ProcessCpu:
+    """
+    跨采样周期复用 psutil.Process 对象，使 cpu_percent(None) 返回两次采样之间的占用率
+    """
+
+    def __init__(self) -> None:
+        self.procs: dict[int, psutil.Process] = {}
+
+    def _process(self, pid: int) -> psutil.Process:
+        proc = self.procs.get(pid)
+        if proc is None:
+            proc = self.procs[pid] = psutil.Process(pid)
+            proc.cpu_percent(None)
+        return proc
+
+    def sample(self, pids: list[int]) -> dict[int, dict]:
+        """
+        各实例（含子进程）的 RSS（字节）与 CPU 占用率（%），进程不存在的实例不返回
+        """
+        result: dict[int, dict] = {}
+        seen: set[int] = set()
+        for pid in pids:
+            try:
+                root = self._process(pid)
+                tree = [root, *root.children(recursive=True)]
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            rss = 0
+            cpu = 0.0
+            for p in tree:
+                try:
+                    p = self._process(p.pid)
+                    with p.oneshot():
+                        rss += p.memory_info().rss
+                        cpu += p.cpu_percent(None)
+                    seen.add(p.pid)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            result[pid] = {"rss": rss, "cpu": round(cpu, 1)}
+        for pid in list(self.procs):
+            if pid not in seen:
+                del self.procs[pid]
+        return result
+
+
+def _system_sample() -> dict:
+    return {
+        "cpu": float(psutil.cpu_percent(interval=None)),
+        "memory": float(psutil.virtual_memory().percent),
+        "swap": float(psutil.swap_memory().percent),
+        "disk": float(psutil.disk_usage("/").percent),
+    }
+
+
+def _average(points: list[dict]) -> dict:
+    n = len(points)
+    point: dict[str, Any] = {"timestamp": points[-1]["timestamp"]}
+    for key in ("cpu", "memory", "swap", "disk", "instances_rss"):
+        point[key] = round(sum(p[key] for p in points) / n, 2)
+    gpu_points = [p["gpu"]["gpus"] for p in points if p["gpu"]["available"]]
+    gpus = []
+    if gpu_points:
+        for i in range(min(len(g) for g in gpu_points)):
+            gpus.append(
+                {
+                    key: round(sum(g[i][key] for g in gpu_points) / len(gpu_points), 1)
+                    for key in ("utilization", "memory_used", "memory_total")
+                }
+            )
+    point["gpu"] = {"available": bool(gpus), "gpus": gpus}
+    return point
+
+
+class ServerMetricsSampler:
+    """
+    后台按固定间隔采集 CPU/内存/磁盘/GPU 以及各 ComfyUI 实例进程的 RSS/CPU：
+    - 原始数据点写入环形缓冲（SERVER_METRICS_HISTORY_POINTS 个）
+    - 同时按分钟聚合为降采样历史（SERVER_METRICS_MINUTE_POINTS 个）
+    接口直接返回采样时生成的快照与历史列表，不在请求中调用 psutil 或启动子进程。
+    """
+
+    def __init__(self, gpu_provider=None, *, history_points: int = 720, minute_points: int = 1440) -> None:
+        self.gpu_provider = gpu_provider or make_gpu_provider()
+        self.raw: deque[dict] = deque(maxlen=max(RECENT_POINTS, history_points))
+        self.minutes: deque[dict] = deque(maxlen=max(1, minute_points))
+        self.latest: Optional[dict] = None
+        self._bucket: list[dict] = []
+        self._process_cpu = _ProcessCpu()
+        self._views: dict[str, list[dict]] = {}
+        self._lock = asyncio.Lock()
+
+    async def _gpu(self) -> dict:
+        try:
+            return await self.gpu_provider.sample()
+        except Exception as e:  # noqa: BLE001
+            logger.debug(f"[Metrics] gpu sample failed ({self.gpu_provider.name}): {e!r}")
+            return {"available": False, "gpus": []}
+
+    async def sample_once(self) -> dict:
+        async with self._lock:
+            services = await ComfyUIService.filter(status="online", pid__isnull=False).values("id", "project_id", "pid")
+            pids = [int(s["pid"]) for s in services]
+            system, processes, gpu = await asyncio.gather(
+                asyncio.to_thread(_system_sample),
+                asyncio.to_thread(self._process_cpu.sample, pids),
+                self._gpu(),
+            )
+            instances = [
+                {"service_id": s["id"], "project_id": s["project_id"], "pid": s["pid"], **processes[int(s["pid"])]}
+                for s in services
+                if int(s["pid"]) in processes
+            ]
+            point = {
+                "timestamp": int(time.time()),
+                **system,
+                "gpu": gpu,
+                "instances_rss": sum(i["rss"] for i in instances),
+            }
+            self._append(point)
+            self.latest = {**point, "instances": instances}
+            return self.latest
+
+    async def snapshot(self) -> dict:
+        """
+        最近一次采样；后台采样未运行（或尚未完成首次采样）时在请求中采样一次
+        """
+        if self.latest is None or float(settings.SERVER_METRICS_INTERVAL_SECONDS) <= 0:
+            return await self.sample_once()
+        return self.latest
+
+    def _append(self, point: dict) -> None:
+        if self._bucket and self._bucket[0]["timestamp"] // MINUTE != point["timestamp"] // MINUTE:
+            self.minutes.append(_average(self._bucket))
+            self._bucket = []
+        self._bucket.append(point)
+        self.raw.append(point)
+        self._views = {}
+
+    def history(self, resolution: str = "recent") -> list[dict]:
+        """
+        recent：最近 RECENT_POINTS 个原始点；raw：全部原始点；minute：按分钟聚合的历史。
+        每个采样周期内只构建一次，之后的请求直接返回同一个列表。
+        """
+        view = self._views.get(resolution)
+        if view is None:
+            if resolution == "minute":
+                view = list(self.minutes)
+            elif resolution == "raw":
+                view = list(self.raw)
+            else:
+                view = list(self.raw)[-RECENT_POINTS:]
+            self._views[resolution] = view
+        return view
+
+    def max_points(self, resolution: str = "recent") -> int:
+        if resolution == "minute":
+            return self.minutes.maxlen
+        if resolution == "raw":
+            return self.raw.maxlen
+        return RECENT_POINTS
+
+    async def run(self, stop_event: asyncio.Event, interval: float) -> None:
+        while not stop_event.is_set():
+            try:
+                await self.sample_once()
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[Metrics] sample failed: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except TimeoutError:
+                pass
+
+
+server_metrics = ServerMetricsSampler(
+    history_points=int(settings.SERVER_METRICS_HISTORY_POINTS),
+    minute_points=int(settings.SERVER_METRICS_MINUTE_POINTS),
+)
+
+
+async def server_metrics_loop(stop_event: asyncio.Event) -> None:
+    interval = float(settings.SERVER_METRICS_INTERVAL_SECONDS)
+    if interval <= 0:
+        return
+    await server_metrics.run(stop_event, interval)
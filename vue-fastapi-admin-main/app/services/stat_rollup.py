@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F, Q
+from tortoise.functions import Count, Sum
+from tortoise.transactions import in_transaction
+
+from app.log import logger
+from app.models.admin import User
+from app.models.platform import GenerationLog, GenerationLogKey, GenerationStatDaily, Project
+from app.services.generation_stats import DIMENSIONS, STATUS_FAILED, STATUS_SUCCESS, TruncDay, day_str
+from app.services.log_partitions import claim_prompt_keys, is_partitioned, month_start
+from app.settings.config import settings
+
+_END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+def extract_duration_ms(details: Any) -> int | None:
+    """
+    从日志 details 中提取执行耗时（ms）：
+    - 显式字段 duration_ms
+    - ComfyUI history 的 status.messages：execution_start -> execution_success/error/interrupted
+    """
+    if not isinstance(details, dict):
+        return None
+    v = details.get("duration_ms")
+    if isinstance(v, (int, float)) and v >= 0:
+        return int(v)
+
+    status = details.get("status")
+    if not isinstance(status, dict):
+        history = details.get("history")
+        status = history.get("status") if isinstance(history, dict) else None
+    if not isinstance(status, dict):
+        return None
+
+    start = end = None
+    for msg in status.get("messages") or []:
+        if not isinstance(msg, (list, tuple)) or len(msg) < 2 or not isinstance(msg[1], dict):
+            continue
+        event, data = msg[0], msg[1]
+        ts = data.get("timestamp")
+        if not isinstance(ts, (int, float)):
+            continue
+        if event == "execution_start":
+            start = ts
+        elif event in _END_EVENTS:
+            end = ts
+    if start is None or end is None or end < start:
+        return None
+    return int(end - start)
+
+
+def _day_of(ts: datetime) -> date:
+    return ts.date() if isinstance(ts, datetime) else ts
+
+
+async def apply_to_rollup(logs: Iterable[GenerationLog], *, sign: int = 1) -> None:
+    """
+    将新写入的日志增量累加到 generation_stat_daily（按 project/user/day/status 合并后逐组更新）。
+    sign=-1 用于扣除被覆盖（upsert）前的旧日志。
+    """
+    groups: dict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+    for log in logs:
+        key = (int(log.project_id), int(log.user_id), _day_of(log.timestamp), log.status)
+        groups[key][0] += sign
+        groups[key][1] += sign * int(log.duration_ms or 0)
+
+    for (project_id, user_id, day, status), (n, duration) in groups.items():
+        if n == 0:
+            continue
+        key = dict(project_id=project_id, user_id=user_id, day=day, status=status)
+        delta = dict(count=F("count") + n, total_duration_ms=F("total_duration_ms") + duration)
+        if await GenerationStatDaily.filter(**key).update(**delta):
+            if n < 0:
+                await GenerationStatDaily.filter(**key, count__lte=0).delete()
+            continue
+        if n < 0:
+            continue
+        try:
+            # 独立的（嵌套事务时为保存点）事务：冲突只回滚这一条插入，不影响调用方事务
+            async with in_transaction(GenerationStatDaily._meta.default_connection):
+                await GenerationStatDaily.create(**key, count=n, total_duration_ms=duration)
+        except IntegrityError:
+            # 并发下另一请求已创建同 key 行，退回到累加
+            await GenerationStatDaily.filter(**key).update(**delta)
+
+
+_UPSERT_FIELDS = ("timestamp", "status", "concurrent_id", "details", "duration_ms")
+
+
+async def upsert_generation_logs(objs: list[GenerationLog]) -> tuple[int, int]:
+    """
+    按 (project_id, prompt_id) 幂等批量写入生成日志：一次 bulk_create ... ON CONFLICT DO UPDATE，
+    已存在的 prompt_id 覆盖状态/详情，同一批内重复的 prompt_id 以最后一条为准；无 prompt_id 的日志直接插入。
+    日汇总表按“扣除旧值 + 累加新值”修正，与读取旧行、写入在同一事务内完成。返回 (新增条数, 更新条数)。
+    """
+    if not objs:
+        return 0, 0
+
+    latest: dict[tuple[int, str], GenerationLog] = {}
+    anonymous: list[GenerationLog] = []
+    for obj in objs:
+        if obj.duration_ms is None:
+            obj.duration_ms = extract_duration_ms(obj.details)
+        if obj.prompt_id:
+            latest[(int(obj.project_id), obj.prompt_id)] = obj
+        else:
+            anonymous.append(obj)
+    rows = [*latest.values(), *anonymous]
+
+    by_project: dict[int, list[str]] = defaultdict(list)
+    for project_id, prompt_id in latest:
+        by_project[project_id].append(prompt_id)
+
+    partitioned = is_partitioned(GenerationLog)
+    # 读取旧行、写入、修正汇总在同一事务中完成；同一 prompt_id 的并发批次串行执行，避免重复扣除/累加
+    async with in_transaction(GenerationLog._meta.default_connection) as conn:
+        old: list[GenerationLog] = []
+        if by_project:
+            if GenerationLog._meta.db.capabilities.dialect == "postgres":
+                # FOR UPDATE 只能锁住已存在的行，尚未写入的 prompt_id 用事务级咨询锁串行（排序加锁避免死锁）
+                keys = sorted(f"{project_id}:{prompt_id}" for project_id, prompt_id in latest)
+                await conn.execute_query(
+                    "SELECT pg_advisory_xact_lock(hashtext(k)) FROM (SELECT unnest($1::text[]) AS k ORDER BY k) s",
+                    [keys],
+                )
+            if partitioned:
+                # 先登记唯一键：与 bulk_create_generation_logs 并发写入同一 prompt_id 时在此等待其提交，
+                # 下面读取旧行时可见
+                await claim_prompt_keys(conn, latest)
+            q = Q(*(Q(project_id=pid, prompt_id__in=ids) for pid, ids in by_project.items()), join_type=Q.OR)
+            old = (
+                await GenerationLog.filter(q)
+                .select_for_update()
+                .only("id", "project_id", "user_id", "prompt_id", "timestamp", "status", "duration_ms")
+            )
+
+        owners = {(int(o.project_id), o.prompt_id): o.user_id for o in old}
+        if partitioned:
+            # 分区表的唯一键包含分区键，(project_id, prompt_id) 的唯一性由 generation_log_keys 保证（键已在上面登记）：
+            # 已存在的行按 id 批量更新（timestamp 变化时行会移动到对应分区），其余行插入
+            ids = {(int(o.project_id), o.prompt_id): o.id for o in old}
+            existing = [obj for key, obj in latest.items() if key in ids]
+            for obj in existing:
+                obj.id = ids[(int(obj.project_id), obj.prompt_id)]
+            if existing:
+                await GenerationLog.bulk_update(existing, fields=list(_UPSERT_FIELDS))
+            inserts = [obj for obj in rows if not obj.prompt_id or (int(obj.project_id), obj.prompt_id) not in ids]
+            if inserts:
+                await GenerationLog.bulk_create(inserts)
+        else:
+            await GenerationLog.bulk_create(
+                rows, on_conflict=["project_id", "prompt_id"], update_fields=list(_UPSERT_FIELDS)
+            )
+        # 覆盖时保留原 user_id（唯一键冲突的行不会更新 user_id）
+        for key, obj in latest.items():
+            if key in owners:
+                obj.user_id = owners[key]
+        # 汇总修正失败时整批回滚（回调方按 prompt_id 幂等重试），不会留下与日志不一致的汇总
+        await apply_to_rollup(old, sign=-1)
+        await apply_to_rollup(rows)
+    return len(rows) - len(old), len(old)
+
+
+async def create_generation_log(
+    *,
+    user_id: int,
+    project_id: int,
+    timestamp: datetime,
+    status: str,
+    prompt_id: str | None = None,
+    concurrent_id: int | None = None,
+    details: Any = None,
+) -> GenerationLog:
+    """
+    写入一条生成日志，并在同一事务内更新日汇总表。
+    (project_id, prompt_id) 已存在时抛出 IntegrityError（分区表由 generation_log_keys 判断）。
+    """
+    async with in_transaction(GenerationLog._meta.default_connection) as conn:
+        if (
+            prompt_id
+            and is_partitioned(GenerationLog)
+            and not await claim_prompt_keys(conn, [(int(project_id), prompt_id)])
+        ):
+            raise IntegrityError(f"generation log ({project_id}, {prompt_id}) already exists")
+        obj = await GenerationLog.create(
+            user_id=user_id,
+            project_id=project_id,
+            timestamp=timestamp,
+            status=status,
+            prompt_id=prompt_id,
+            concurrent_id=concurrent_id,
+            details=details,
+            duration_ms=extract_duration_ms(details),
+        )
+        # 与日志写入同一事务：汇总更新失败时日志一并回滚，汇总表不会漏计
+        await apply_to_rollup([obj])
+    return obj
+
+
+def _prompt_ids_by_project(objs: Iterable[GenerationLog]) -> dict[int, list[str]]:
+    by_project: dict[int, set[str]] = defaultdict(set)
+    for obj in objs:
+        if obj.prompt_id:
+            by_project[int(obj.project_id)].add(obj.prompt_id)
+    return {pid: list(ids) for pid, ids in by_project.items()}
+
+
+async def _existing_prompt_keys(objs: list[GenerationLog]) -> set[tuple[int, str]]:
+    by_project = _prompt_ids_by_project(objs)
+    if not by_project:
+        return set()
+    q = Q(*(Q(project_id=pid, prompt_id__in=ids) for pid, ids in by_project.items()), join_type=Q.OR)
+    return {
+        (int(pid), prompt_id) for pid, prompt_id in await GenerationLog.filter(q).values_list("project_id", "prompt_id")
+    }
+
+
+async def bulk_create_generation_logs(objs: list[GenerationLog]) -> list[GenerationLog]:
+    """
+    批量写入生成日志（一次 bulk_create），(project_id, prompt_id) 已存在的行被跳过，只把实际写入的行累加到日汇总表，
+    日志与汇总在同一事务内写入。调用方应先按 prompt_id 去重；查询与插入之间被并发写入（ws 批量写入与 history 同步
+    同一实例）抢先写入时，退回逐条写入并跳过冲突行。分区表按 generation_log_keys 的登记结果跳过已存在的行。
+    返回实际写入的日志。
+    """
+    if not objs:
+        return objs
+    for obj in objs:
+        if obj.duration_ms is None:
+            obj.duration_ms = extract_duration_ms(obj.details)
+    async with in_transaction(GenerationLog._meta.default_connection) as conn:
+        if is_partitioned(GenerationLog):
+            # 分区表：先登记唯一键，只写入本次新登记的行
+            claimed = await claim_prompt_keys(
+                conn, ((int(obj.project_id), obj.prompt_id) for obj in objs if obj.prompt_id)
+            )
+            created = []
+            for obj in objs:
+                if obj.prompt_id:
+                    key = (int(obj.project_id), obj.prompt_id)
+                    if key not in claimed:
+                        continue
+                    claimed.discard(key)
+                created.append(obj)
+            if created:
+                await GenerationLog.bulk_create(created)
+        else:
+            created = await _bulk_create_unique(objs)
+        await apply_to_rollup(created)
+    return created
+
+
+async def _bulk_create_unique(objs: list[GenerationLog]) -> list[GenerationLog]:
+    existing = await _existing_prompt_keys(objs)
+    created = [obj for obj in objs if not obj.prompt_id or (int(obj.project_id), obj.prompt_id) not in existing]
+    if not created:
+        return created
+    # 嵌套事务为保存点：唯一键冲突只回滚这一次插入，调用方事务可以继续
+    try:
+        async with in_transaction(GenerationLog._meta.default_connection):
+            await GenerationLog.bulk_create(created)
+    except IntegrityError:
+        rows, created = created, []
+        for obj in rows:
+            try:
+                async with in_transaction(GenerationLog._meta.default_connection):
+                    await obj.save(force_create=True)
+            except IntegrityError:
+                continue
+            created.append(obj)
+    return created
+
+
+async def delete_generation_logs(q: Q, *, batch_size: int = 1000) -> int:
+    """
+    删除匹配 q 的生成日志，并从日汇总表中扣除（分批读取后按 id 删除）。返回删除条数。
+    """
+    n = 0
+    while True:
+        async with in_transaction(GenerationLog._meta.default_connection):
+            logs = await (
+                GenerationLog.filter(q)
+                .order_by("id")
+                .limit(batch_size)
+                .only("id", "project_id", "user_id", "prompt_id", "timestamp", "status", "duration_ms")
+            )
+            if not logs:
+                return n
+            await GenerationLog.filter(id__in=[log.id for log in logs]).delete()
+            if is_partitioned(GenerationLog):
+                for project_id, prompt_ids in _prompt_ids_by_project(logs).items():
+                    await GenerationLogKey.filter(project_id=project_id, prompt_id__in=prompt_ids).delete()
+            await apply_to_rollup(logs, sign=-1)
+        n += len(logs)
+
+
+async def rebuild_rollup(*, start_day: date | None = None, end_day: date | None = None) -> int:
+    """
+    由 generation_logs 重建 [start_day, end_day] 区间的日汇总（为空表示全量）。返回写入的汇总行数。
+    开启保留策略（GENERATION_LOG_RETENTION_MONTHS > 0）时，已归档月份的日志不在表中，重建区间从最早仍有日志的月份开始，
+    不会清掉已归档月份的汇总。
+    """
+    if int(settings.GENERATION_LOG_RETENTION_MONTHS) > 0:
+        oldest = await GenerationLog.all().order_by("timestamp").first().values_list("timestamp", flat=True)
+        if oldest is None:
+            logger.warning("[Stats] no generation logs left under the retention policy, rollup rebuild skipped")
+            return 0
+        kept_from = month_start(oldest).date()
+        if start_day is None or start_day < kept_from:
+            logger.info(f"[Stats] rollup before {kept_from} covers archived logs and is kept")
+            start_day = kept_from
+        if end_day is not None and end_day < start_day:
+            return 0
+    log_q = Q()
+    stat_q = Q()
+    if start_day:
+        log_q &= Q(timestamp__gte=datetime.combine(start_day, datetime.min.time()))
+        stat_q &= Q(day__gte=start_day)
+    if end_day:
+        log_q &= Q(timestamp__lt=datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+        stat_q &= Q(day__lte=end_day)
+
+    rows = (
+        await GenerationLog.filter(log_q)
+        .annotate(d=TruncDay("timestamp"), n=Count("id"), dur=Sum("duration_ms"))
+        .group_by("project_id", "user_id", "d", "status")
+        .values("project_id", "user_id", "d", "status", "n", "dur")
+    )
+    objs = [
+        GenerationStatDaily(
+            project_id=int(r["project_id"]),
+            user_id=int(r["user_id"]),
+            day=date.fromisoformat(day_str(r["d"])),
+            status=r["status"],
+            count=int(r["n"]),
+            total_duration_ms=int(r["dur"] or 0),
+        )
+        for r in rows
+    ]
+    async with in_transaction(GenerationStatDaily._meta.default_connection):
+        await GenerationStatDaily.filter(stat_q).delete()
+        if objs:
+            await GenerationStatDaily.bulk_create(objs, batch_size=1000)
+    return len(objs)
+
+
+async def ensure_rollup() -> None:
+    """
+    启动时检查：汇总表为空但已有日志（例如升级后首次启动）时执行一次全量回填。
+    """
+    if await GenerationStatDaily.exists() or not await GenerationLog.exists():
+        return
+    n = await rebuild_rollup()
+    logger.info(f"[Stats] generation_stat_daily backfilled: {n} rows")
+
+
+async def aggregate_rollup(
+    dimension: str,
+    *,
+    start_day: date | None = None,
+    end_day: date | None = None,
+    project_id: int | None = None,
+    user_id: int | None = None,
+    status: str | None = None,
+) -> list[dict]:
+    """
+    基于日汇总表的统计聚合，复杂度 O(天数 × 分组数)，返回结构与 aggregate_generation_logs 一致。
+    """
+    if dimension not in DIMENSIONS:
+        return []
+
+    q = Q()
+    if start_day:
+        q &= Q(day__gte=start_day)
+    if end_day:
+        q &= Q(day__lte=end_day)
+    if project_id is not None:
+        q &= Q(project_id=project_id)
+    if user_id is not None:
+        q &= Q(user_id=user_id)
+    if status:
+        q &= Q(status=status)
+
+    qs = GenerationStatDaily.filter(q)
+    if dimension == "status":
+        rows = await qs.annotate(n=Sum("count")).group_by("status").values("status", "n")
+        return [{"status": r["status"], "count": int(r["n"] or 0)} for r in sorted(rows, key=lambda r: r["status"])]
+
+    qs = qs.annotate(
+        n=Sum("count"),
+        ok=Sum("count", _filter=Q(status=STATUS_SUCCESS)),
+        fail=Sum("count", _filter=Q(status=STATUS_FAILED)),
+        dur=Sum("total_duration_ms"),
+    )
+
+    def counts(r: dict) -> dict:
+        return {
+            "count": int(r["n"] or 0),
+            "success": int(r["ok"] or 0),
+            "failed": int(r["fail"] or 0),
+            "total_duration_ms": int(r["dur"] or 0),
+        }
+
+    if dimension == "day":
+        rows = await qs.group_by("day").values("day", "n", "ok", "fail", "dur")
+        return sorted(({"date": day_str(r["day"]), **counts(r)} for r in rows), key=lambda d: d["date"])
+
+    if dimension == "project":
+        rows = await qs.group_by("project_id").values("project_id", "n", "ok", "fail", "dur")
+        ids = [int(r["project_id"]) for r in rows]
+        names = dict(await Project.filter(id__in=ids).values_list("id", "name")) if ids else {}
+        data = [
+            {"project_id": int(r["project_id"]), "project_name": names.get(int(r["project_id"]), ""), **counts(r)}
+            for r in rows
+        ]
+        return sorted(data, key=lambda d: d["project_id"])
+
+    rows = await qs.group_by("user_id").values("user_id", "n", "ok", "fail", "dur")
+    ids = [int(r["user_id"]) for r in rows]
+    names = dict(await User.filter(id__in=ids).values_list("id", "username")) if ids else {}
+    data = [{"user_id": int(r["user_id"]), "user_name": names.get(int(r["user_id"]), ""), **counts(r)} for r in rows]
+    return sorted(data, key=lambda d: d["user_id"])
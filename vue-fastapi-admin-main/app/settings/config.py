@@ -55,12 +55,79 @@ class Settings(BaseSettings):
     COMFYUI_LOG_DIR: str = os.path.join("runtime", "comfy_logs")
     COMFYUI_STARTUP_TIMEOUT_SECONDS: int = 60
     COMFYUI_HEARTBEAT_INTERVAL_SECONDS: int = 30
+    # 心跳并发探活上限 / 单次探活超时
+    COMFYUI_HEARTBEAT_CONCURRENCY: int = 32
+    COMFYUI_HEARTBEAT_TIMEOUT_SECONDS: float = 2.5
+    # 状态未变化时 last_heartbeat 的落库间隔（实时值见 /server/comfyui_heartbeat）
+    COMFYUI_HEARTBEAT_PERSIST_SECONDS: int = 300
     COMFYUI_FORCE_CPU: bool = False
+    # 预热池：保持 N 个已启动、未分配的 ComfyUI 实例，open_comfy 时直接分配（0 表示关闭，需配置 PLATFORM_INTERNAL_SECRET）
+    COMFYUI_WARM_POOL_SIZE: int = 0
+    # 超过 IDLE_TTL 无人取用时缩容到 MIN_SIZE
+    COMFYUI_WARM_POOL_MIN_SIZE: int = 0
+    COMFYUI_WARM_POOL_IDLE_TTL_SECONDS: int = 1800
+    COMFYUI_WARM_POOL_CHECK_SECONDS: int = 10
+    # 生命周期调度：实例空闲（队列为空且无新 history）超过 TTL 自动停止（0 表示不回收）
+    COMFYUI_IDLE_TTL_SECONDS: int = 0
+    # 所有实例进程 RSS 总预算（MB，0 表示不限制）；超出或启动新实例前不足时按 LRU 停止空闲实例
+    COMFYUI_MEMORY_BUDGET_MB: int = 0
+    # 没有运行中实例可参考时，新实例的内存占用估算
+    COMFYUI_INSTANCE_MEMORY_ESTIMATE_MB: int = 4096
+    COMFYUI_LIFECYCLE_INTERVAL_SECONDS: int = 60
     COMFYUI_HISTORY_SYNC_INTERVAL_SECONDS: int = 10
+    # history 同步时并发拉取的实例数上限（共用一个 keep-alive 连接池）
+    COMFYUI_HISTORY_SYNC_CONCURRENCY: int = 16
+    # 订阅实例 /ws 事件近实时写入生成日志；开启后 history 轮询降级为 COMFYUI_HISTORY_SYNC_FALLBACK_SECONDS 兜底
+    COMFYUI_EVENT_INGEST_ENABLED: bool = True
+    # 事件微批窗口（ms）：窗口内多个实例/事件合并为一次 history 增量拉取与批量写入
+    COMFYUI_EVENT_FLUSH_MS: int = 200
+    # 重新加载在线实例列表（新增/下线 ws 订阅）的间隔
+    COMFYUI_EVENT_REFRESH_SECONDS: int = 5
+    COMFYUI_HISTORY_SYNC_FALLBACK_SECONDS: int = 300
 
     # ComfyUI -> 平台回调（可选）
     PLATFORM_INTERNAL_SECRET: str = ""
     PLATFORM_CALLBACK_URL: str = "http://127.0.0.1:9999/api/internal/comfy/callback"
+    # 回调中 project_id -> 服务所属用户 的进程内缓存时间（秒）
+    PROJECT_SERVICE_CACHE_TTL_SECONDS: int = 60
+    # DependPermission 使用的用户权限集合进程内缓存时间（秒）；本进程内的角色/API/用户变更会立即失效，
+    # 该值只限定多进程部署时其他进程变更的最长生效延迟
+    PERMISSION_CACHE_TTL_SECONDS: int = 60
+
+    # 审计日志：请求路径只入队，后台按批写入；队列满时丢弃新记录
+    AUDIT_LOG_QUEUE_SIZE: int = 10000
+    AUDIT_LOG_BATCH_SIZE: int = 200
+    AUDIT_LOG_FLUSH_INTERVAL_MS: int = 1000
+    # 是否记录请求体 / 响应体，以及单个 body 记录的最大字节数（超出部分截断）
+    AUDIT_LOG_CAPTURE_REQUEST_BODY: bool = True
+    AUDIT_LOG_CAPTURE_RESPONSE_BODY: bool = True
+    AUDIT_LOG_MAX_BODY_BYTES: int = 64 * 1024
+
+    # 批量回调单次最多接受的事件数
+    CALLBACK_BATCH_MAX_EVENTS: int = 1000
+
+    # /stats 在按天对齐的查询上使用 generation_stat_daily 日汇总表（关闭则直接聚合 generation_logs）
+    STATS_USE_ROLLUP: bool = True
+
+    # /server/stats 后台采样：间隔（秒，<=0 表示关闭后台采样，改为请求时采样）、原始点与按分钟聚合点的保留个数
+    SERVER_METRICS_INTERVAL_SECONDS: float = 5
+    SERVER_METRICS_HISTORY_POINTS: int = 720
+    SERVER_METRICS_MINUTE_POINTS: int = 1440
+    # GPU 采集：auto（有 nvidia-smi 时使用，否则 stub）/ nvidia-smi / stub；stub 模拟的 GPU 数量（0 表示无 GPU）
+    SERVER_METRICS_GPU_PROVIDER: str = "auto"
+    SERVER_METRICS_GPU_TIMEOUT_SECONDS: float = 5
+    SERVER_METRICS_STUB_GPU_COUNT: int = 0
+
+    # generation_logs / auditlog 按月分区（仅 PostgreSQL，启动时转换并预建未来分区）
+    LOG_PARTITIONING_ENABLED: bool = True
+    LOG_PARTITION_PREMAKE_MONTHS: int = 3
+    LOG_PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 6 * 3600
+    # 保留月数（不含当月），超出的整月数据先归档再删除（分区表为 DETACH + DROP）；0 表示永久保留
+    GENERATION_LOG_RETENTION_MONTHS: int = 0
+    AUDIT_LOG_RETENTION_MONTHS: int = 0
+    # 归档格式：csv（csv.gz）/ parquet（需安装 pyarrow）/ none（不归档直接删除）
+    LOG_ARCHIVE_FORMAT: str = "csv"
+    LOG_ARCHIVE_DIR: str = os.path.join(BASE_DIR, "archive")
 
     TORTOISE_ORM: dict = {}
     DATETIME_FORMAT: str = "%Y-%m-%d %H:%M:%S"
@@ -0,0 +1,134 @@
+"""
+审计日志写入基准：对比「每个请求内联 AuditLog.create」与「入队 + 后台 bulk_create」，
+统计请求路径上的数据库查询次数、平均耗时以及后台写入全部记录所需的查询次数。
+
+用法（在 vue-fastapi-admin-main 目录下执行）：
+    python benchmarks/bench_audit_log.py --requests 1000
+    python benchmarks/bench_audit_log.py --db postgres --requests 1000   # 读取 POSTGRES_* 配置
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from tortoise import Tortoise  # noqa: E402
+
+from app.core.middlewares import HttpAuditLogMiddleware  # noqa: E402
+from app.models.admin import AuditLog  # noqa: E402
+from app.services.audit_log_writer import AuditLogWriter  # noqa: E402
+from app.settings.config import settings  # noqa: E402
+
+
+def _db_url(db: str, sqlite_path: str) -> str:
+    if db == "postgres":
+        return (
+            f"postgres://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
+            f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+        )
+    return f"sqlite://{sqlite_path}"
+
+
+class _InlineWriter:
+    """旧路径：在请求内直接写入一条记录"""
+
+    def __init__(self) -> None:
+        self.pending: list[asyncio.Task] = []
+
+    def submit(self, record: dict) -> bool:
+        # 旧中间件在返回响应前 await AuditLog.create，这里在 tee 结束时同步等待同样的写入
+        self.pending.append(asyncio.ensure_future(AuditLog.create(**record)))
+        return True
+
+
+class _QueryCounter:
+    """包装当前连接的 execute_* 方法以统计查询次数"""
+
+    METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+
+    def __init__(self) -> None:
+        self.count = 0
+        conn = Tortoise.get_connection("default")
+        for name in self.METHODS:
+            setattr(conn, name, self._wrap(getattr(conn, name)))
+
+    def _wrap(self, fn):
+        async def wrapper(*args, **kwargs):
+            self.count += 1
+            return await fn(*args, **kwargs)
+
+        return wrapper
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI(middleware=[Middleware(HttpAuditLogMiddleware, methods=["GET", "POST"], exclude_paths=[])])
+
+    @app.post("/items/{item_id}", tags=["bench"], summary="bench")
+    async def item(item_id: int, body: dict) -> dict:
+        return {"code": 200, "data": {"id": item_id, **body}}
+
+    return app
+
+
+async def _run(label: str, client: httpx.AsyncClient, counter: _QueryCounter, writer, requests: int) -> None:
+    import app.core.middlewares as middlewares
+
+    middlewares.audit_log_writer = writer
+    start_count = counter.count
+    t0 = time.perf_counter()
+    for i in range(requests):
+        resp = await client.post(f"/items/{i}", json={"name": f"item-{i}", "tags": ["a", "b"]})
+        assert resp.status_code == 200, resp.text
+        if isinstance(writer, _InlineWriter):
+            await asyncio.gather(*writer.pending)
+            writer.pending.clear()
+    elapsed = time.perf_counter() - t0
+    request_queries = counter.count - start_count
+
+    t1 = time.perf_counter()
+    if isinstance(writer, AuditLogWriter):
+        await writer.flush()
+    flush_elapsed = time.perf_counter() - t1
+    print(
+        f"{label:<8} {request_queries / requests:>6.2f} queries/request in request path  "
+        f"{elapsed / requests * 1000:>7.3f} ms/request  "
+        f"flush {counter.count - start_count - request_queries} queries / {flush_elapsed * 1000:.1f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--sqlite-path", default="/tmp/bench_audit_log.sqlite3")
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    await Tortoise.init(db_url=_db_url(args.db, args.sqlite_path), modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas(safe=True)
+    try:
+        counter = _QueryCounter()
+        transport = httpx.ASGITransport(app=_build_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"--- {args.db}, {args.requests} requests ---")
+            await _run("inline", client, counter, _InlineWriter(), args.requests)
+            await _run(
+                "batched",
+                client,
+                counter,
+                AuditLogWriter(queue_size=args.requests, batch_size=settings.AUDIT_LOG_BATCH_SIZE),
+                args.requests,
+            )
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+DependPermission 鉴权路径基准：对比「每次请求查询用户 + 角色 + 逐个角色查询 API」与「进程内缓存的权限集合」，
+统计每个请求的数据库查询次数与平均耗时。
+
+用法（在 vue-fastapi-admin-main 目录下执行）：
+    python benchmarks/bench_permission.py --roles 3 --apis-per-role 50 --requests 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import httpx  # noqa: E402
+import jwt  # noqa: E402
+from fastapi import Depends, FastAPI, HTTPException, Request  # noqa: E402
+from tortoise import Tortoise  # noqa: E402
+
+from app.core.dependency import AuthControl, DependPermission  # noqa: E402
+from app.models.admin import Api, Role, User  # noqa: E402
+from app.settings.config import settings  # noqa: E402
+
+ROUTE = "/items/{item_id}"
+
+
+async def _legacy_has_permission(request: Request, current_user: User = Depends(AuthControl.is_authed)) -> None:
+    """缓存之前的 PermissionControl.has_permission"""
+    if current_user.is_superuser:
+        return
+    method = request.method
+    path = request.scope["route"].path_format
+    roles: list[Role] = await current_user.roles
+    if not roles:
+        raise HTTPException(status_code=403, detail="The user is not bound to a role")
+    apis = [await role.apis for role in roles]
+    permission_apis = list(set((api.method, api.path) for api in sum(apis, [])))
+    if (method, path) not in permission_apis:
+        raise HTTPException(status_code=403, detail=f"Permission denied method:{method} path:{path}")
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+
+    async def item(item_id: int) -> dict:
+        return {"id": item_id}
+
+    app.add_api_route("/legacy" + ROUTE, item, dependencies=[Depends(_legacy_has_permission)])
+    app.add_api_route("/cached" + ROUTE, item, dependencies=[DependPermission])
+    return app
+
+
+async def _seed(roles: int, apis_per_role: int) -> str:
+    user = await User.create(username="bench", email="bench@example.com", password="-")
+    for r in range(roles):
+        role = await Role.create(name=f"bench-{r}")
+        apis = [
+            await Api.create(method="GET", path=f"/bench/{r}/{i}", summary="bench", tags="bench")
+            for i in range(apis_per_role)
+        ]
+        await role.apis.add(*apis)
+        await user.roles.add(role)
+    # 被测接口只授权给最后一个角色，旧路径需要遍历全部角色
+    for prefix in ("/legacy", "/cached"):
+        api = await Api.create(method="GET", path=prefix + ROUTE, summary="bench", tags="bench")
+        await role.apis.add(api)
+    payload = {"user_id": user.id, "exp": datetime.now(timezone.utc) + timedelta(hours=1)}
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+class _QueryCounter:
+    """包装当前连接的 execute_* 方法以统计查询次数"""
+
+    METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+
+    def __init__(self) -> None:
+        self.count = 0
+        conn = Tortoise.get_connection("default")
+        for name in self.METHODS:
+            setattr(conn, name, self._wrap(getattr(conn, name)))
+
+    def _wrap(self, fn):
+        async def wrapper(*args, **kwargs):
+            self.count += 1
+            return await fn(*args, **kwargs)
+
+        return wrapper
+
+
+async def _run(client: httpx.AsyncClient, counter: _QueryCounter, prefix: str, token: str, requests: int) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    # 预热一次（缓存路径的首个请求会加载权限集合）
+    resp = await client.get(f"{prefix}/items/0", headers=headers)
+    assert resp.status_code == 200, resp.text
+    start_count = counter.count
+    t0 = time.perf_counter()
+    for i in range(requests):
+        resp = await client.get(f"{prefix}/items/{i}", headers=headers)
+        assert resp.status_code == 200, resp.text
+    elapsed = time.perf_counter() - t0
+    queries = (counter.count - start_count) / requests
+    print(f"{prefix:<10} {queries:>8.2f} queries/request  {elapsed / requests * 1000:>8.3f} ms/request")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roles", type=int, default=3)
+    parser.add_argument("--apis-per-role", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+    try:
+        token = await _seed(args.roles, args.apis_per_role)
+        counter = _QueryCounter()
+        transport = httpx.ASGITransport(app=_build_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"--- {args.roles} roles x {args.apis_per_role} apis, {args.requests} requests ---")
+            await _run(client, counter, "/legacy", token, args.requests)
+            await _run(client, counter, "/cached", token, args.requests)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+/stats 聚合路径基准：对比「全量拉取 + Python Counter」与「数据库侧 GROUP BY」。
+
+用法（在 vue-fastapi-admin-main 目录下执行）：
+    python benchmarks/bench_stats.py --db sqlite --rows 1000000
+    python benchmarks/bench_stats.py --db postgres --rows 1000000   # 读取 POSTGRES_* 配置
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from tortoise import Tortoise  # noqa: E402
+
+from app.settings.config import settings  # noqa: E402
+
+STATUSES = ("成功", "成功", "成功", "失败", "未知")
+
+
+def _db_url(db: str, sqlite_path: str) -> str:
+    if db == "postgres":
+        return (
+            f"postgres://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
+            f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+        )
+    return f"sqlite://{sqlite_path}"
+
+
+async def _seed(rows: int, *, projects: int, users: int, days: int, batch: int) -> None:
+    from app.models.platform import GenerationLog
+
+    existing = await GenerationLog.all().count()
+    if existing >= rows:
+        print(f"[seed] reuse existing {existing} rows")
+        return
+
+    rnd = random.Random(42)
+    start = datetime.now() - timedelta(days=days)
+    t0 = time.perf_counter()
+    for offset in range(existing, rows, batch):
+        objs = []
+        for i in range(offset, min(rows, offset + batch)):
+            objs.append(
+                GenerationLog(
+                    user_id=rnd.randint(1, users),
+                    project_id=rnd.randint(1, projects),
+                    timestamp=start + timedelta(seconds=rnd.randint(0, days * 86400)),
+                    status=rnd.choice(STATUSES),
+                    prompt_id=f"bench-{i}",
+                    details={"prompt_id": f"bench-{i}", "history": {"outputs": {"9": {"images": [{"x": "y" * 64}]}}}},
+                )
+            )
+        await GenerationLog.bulk_create(objs)
+    print(f"[seed] {rows - existing} rows in {time.perf_counter() - t0:.1f}s")
+
+
+async def _legacy_day(q) -> list[dict]:
+    from app.models.platform import GenerationLog
+
+    rows = await GenerationLog.filter(q).all()
+    counter = Counter([r.timestamp.strftime("%Y-%m-%d") for r in rows])
+    return [{"date": k, "count": counter[k]} for k in sorted(counter.keys())]
+
+
+async def _legacy_project(q) -> list[dict]:
+    from app.models.platform import GenerationLog
+
+    rows = await GenerationLog.filter(q).all()
+    counter = Counter([r.project_id for r in rows])
+    return [{"project_id": k, "count": counter[k]} for k in sorted(counter.keys())]
+
+
+async def _timeit(label: str, fn, repeat: int) -> list[dict]:
+    best = float("inf")
+    result: list[dict] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = await fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<28} {best * 1000:>10.1f} ms  ({len(result)} groups)")
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--sqlite-path", default="/tmp/bench_stats.sqlite3")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过旧路径（行数很大时内存占用高）")
+    args = parser.parse_args()
+
+    await Tortoise.init(db_url=_db_url(args.db, args.sqlite_path), modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas(safe=True)
+    try:
+        await _seed(args.rows, projects=args.projects, users=args.users, days=args.days, batch=args.batch)
+
+        from app.services.generation_stats import aggregate_generation_logs, build_log_filter
+
+        q = build_log_filter()
+        print(f"--- {args.db}, {args.rows} rows ---")
+        for dimension, legacy in (("day", _legacy_day), ("project", _legacy_project)):
+            new = await _timeit(
+                f"sql group by [{dimension}]", lambda: aggregate_generation_logs(dimension, q), args.repeat
+            )
+            if not args.skip_legacy:
+                old = await _timeit(f"python counter [{dimension}]", lambda: legacy(q), args.repeat)
+                assert [r["count"] for r in old] == [r["count"] for r in new], "aggregate mismatch"
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
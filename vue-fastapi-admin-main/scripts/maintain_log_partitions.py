@@ -0,0 +1,48 @@
+"""
+generation_logs / auditlog 分区维护：预建未来分区（PostgreSQL），并按保留月数归档、清理过期月份。
+
+用法（在 vue-fastapi-admin-main 目录下执行）：
+    python scripts/maintain_log_partitions.py
+    python scripts/maintain_log_partitions.py --generation-log-months 12 --audit-log-months 6 --format parquet
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from tortoise import Tortoise  # noqa: E402
+
+from app.log import logger  # noqa: E402
+from app.services.log_partitions import ARCHIVE_FORMATS, apply_retention, ensure_partitions  # noqa: E402
+from app.settings.config import settings  # noqa: E402
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="分区维护与日志保留策略")
+    parser.add_argument("--generation-log-months", type=int, default=None, help="覆盖 GENERATION_LOG_RETENTION_MONTHS")
+    parser.add_argument("--audit-log-months", type=int, default=None, help="覆盖 AUDIT_LOG_RETENTION_MONTHS")
+    parser.add_argument("--format", choices=ARCHIVE_FORMATS, default=None, help="覆盖 LOG_ARCHIVE_FORMAT")
+    args = parser.parse_args()
+    if args.generation_log_months is not None:
+        settings.GENERATION_LOG_RETENTION_MONTHS = args.generation_log_months
+    if args.audit_log_months is not None:
+        settings.AUDIT_LOG_RETENTION_MONTHS = args.audit_log_months
+    if args.format is not None:
+        settings.LOG_ARCHIVE_FORMAT = args.format
+
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+    try:
+        await ensure_partitions()
+        n = await apply_retention()
+        logger.info(f"[Partition] retention applied: {n} months removed")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+"""
+将 generation_logs / auditlog 转为按月 RANGE 分区表（仅 PostgreSQL）。
+
+数据按月搬迁并输出进度，中断后重新执行会从剩余月份继续。执行前需停止服务，完成后再启动。
+
+用法（在 vue-fastapi-admin-main 目录下执行）：
+    python scripts/partition_logs.py
+    python scripts/partition_logs.py --table generation_logs
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from tortoise import Tortoise  # noqa: E402
+
+from app.log import logger  # noqa: E402
+from app.services.log_partitions import convert_to_partitioned, ensure_partitions, partitioned_tables  # noqa: E402
+from app.settings.config import settings  # noqa: E402
+
+
+async def main() -> None:
+    tables = [model._meta.db_table for model, _, _ in partitioned_tables()]
+    parser = argparse.ArgumentParser(description="将日志表转为按月分区表")
+    parser.add_argument("--table", choices=tables, default=None, help="只转换指定表（默认全部）")
+    args = parser.parse_args()
+
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+    try:
+        for model, column, _ in partitioned_tables():
+            table = model._meta.db_table
+            if args.table and table != args.table:
+                continue
+            if model._meta.db.capabilities.dialect != "postgres":
+                logger.warning(f"[Partition] {table}: only PostgreSQL supports partitioning, skipped")
+                continue
+            if not await convert_to_partitioned(model, column):
+                logger.info(f"[Partition] {table} is already partitioned")
+        await ensure_partitions()
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
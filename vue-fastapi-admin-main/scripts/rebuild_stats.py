@@ -0,0 +1,41 @@
+"""
+由 generation_logs 重建 generation_stat_daily 日汇总表。
+
+用法（在 vue-fastapi-admin-main 目录下执行）：
+    python scripts/rebuild_stats.py                                 # 全量重建
+    python scripts/rebuild_stats.py --start 2025-01-01 --end 2025-01-31
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from tortoise import Tortoise  # noqa: E402
+
+from app.log import logger  # noqa: E402
+from app.services.stat_rollup import rebuild_rollup  # noqa: E402
+from app.settings.config import settings  # noqa: E402
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="重建 generation_stat_daily 日汇总表")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="开始日期 YYYY-MM-DD（默认全量）")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="结束日期 YYYY-MM-DD（默认全量）")
+    args = parser.parse_args()
+
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+    try:
+        n = await rebuild_rollup(start_day=args.start, end_day=args.end)
+        logger.info(f"[Stats] generation_stat_daily rebuilt: {n} rows")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())